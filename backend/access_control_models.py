@@ -0,0 +1,100 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+from enum import Enum
+import uuid
+
+# Enums
+class SubscriptionType(str, Enum):
+    FREE = "free"
+    MONTHLY = "monthly"
+    PER_VISIT = "per_visit"
+    TEASER = "teaser"
+
+class AccessLevel(str, Enum):
+    FULL = "full"
+    TEASER = "teaser"
+    BLOCKED = "blocked"
+
+class BlockReason(str, Enum):
+    HARASSMENT = "harassment"
+    BAD_LANGUAGE = "bad_language"
+    INAPPROPRIATE_BEHAVIOR = "inappropriate_behavior"
+    SPAM = "spam"
+    OTHER = "other"
+
+# Location Models
+class Location(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    country: str
+    country_code: str
+    state: Optional[str] = None
+    state_code: Optional[str] = None
+    city: Optional[str] = None
+    zip_code: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class LocationPreference(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    performer_id: str
+    location_type: str  # "country", "state", "city", "zip_code"
+    location_value: str  # e.g., "US", "CA", "Los Angeles", "90210"
+    is_allowed: bool  # True for allowed, False for blocked
+    subscription_type: SubscriptionType
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Teaser Models
+class TeaserSettings(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    performer_id: str
+    enabled: bool = True
+    duration_seconds: int = Field(default=30, ge=5, le=300)  # 5 seconds to 5 minutes
+    message: Optional[str] = "Preview time expired! Subscribe to continue viewing my profile."
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TeaserSession(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    performer_id: str
+    user_id: str
+    user_ip: str
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime
+    is_active: bool = True
+
+# User Blocking Models
+class BlockedUser(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    performer_id: str
+    blocked_user_id: str
+    blocked_user_ip: Optional[str] = None
+    reason: BlockReason
+    notes: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Access Control Models
+class AccessRequest(BaseModel):
+    performer_id: str
+    user_id: Optional[str] = None
+    user_ip: str
+    location: Location
+
+class AccessResponse(BaseModel):
+    access_level: AccessLevel
+    allowed: bool
+    reason: str
+    teaser_remaining_seconds: Optional[int] = None
+    subscription_required: Optional[SubscriptionType] = None
+    message: Optional[str] = None
+
+class BulkAccessRequest(BaseModel):
+    performer_ids: List[str] = Field(..., min_length=1, description="Performers to check access for")
+    user_id: Optional[str] = None
+    user_ip: Optional[str] = None
+    location: Optional[Location] = None
+
+class LocationBatchRequest(BaseModel):
+    ips: List[str] = Field(..., min_length=1, max_length=1000, description="IP addresses to resolve")
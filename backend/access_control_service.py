@@ -0,0 +1,355 @@
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from fastapi import Request
+from access_control_models import (
+    SubscriptionType, AccessLevel, Location, LocationPreference, TeaserSettings,
+    TeaserSession, BlockedUser, AccessRequest, AccessResponse, BulkAccessRequest
+)
+from teaser_session_service import TeaserSessionStore
+from stamped_cache import StampedCache
+
+# Upper bound for a single bulk access check (one search results grid)
+MAX_BULK_ACCESS_CHECKS = 100
+
+# Compiled location rules are kept per performer for a bounded time; writes
+# through the location preference routes invalidate entries immediately
+LOCATION_RULE_CACHE_SIZE = 10000
+LOCATION_RULE_CACHE_TTL_SECONDS = 300
+LOCATION_RULE_TYPES = ("country", "state", "city", "zip_code")
+
+# Returned when an address is not covered by the GeoIP database
+UNKNOWN_LOCATION = Location(country="Unknown", country_code="XX")
+
+
+class CompiledLocationRules:
+    """A performer's location preferences compiled into lookup tables keyed by location type"""
+
+    def __init__(self, preferences: List[Dict[str, Any]]):
+        self.has_preferences = bool(preferences)
+        self.tables = {location_type: {} for location_type in LOCATION_RULE_TYPES}
+
+        for order, pref in enumerate(preferences):
+            pref_obj = LocationPreference(**pref)
+            table = self.tables.get(pref_obj.location_type)
+            if table is None:
+                continue
+            key = self._normalize(pref_obj.location_type, pref_obj.location_value)
+            # Keep the first preference per key - the original scan stopped at the first match
+            table.setdefault(key, (order, pref_obj.location_type, pref_obj.location_value,
+                                   pref_obj.is_allowed, pref_obj.subscription_type))
+
+    @staticmethod
+    def _normalize(location_type: str, value: Optional[str]) -> Optional[str]:
+        """Zip codes match exactly, everything else case-insensitively"""
+        if value is None:
+            return None
+        return value if location_type == "zip_code" else value.lower()
+
+    def match(self, user_location: Location) -> Optional[tuple]:
+        """Return the earliest-created preference matching any part of the location"""
+        location_values = {
+            "country": user_location.country_code,
+            "state": user_location.state_code,
+            "city": user_location.city,
+            "zip_code": user_location.zip_code
+        }
+
+        best = None
+        for location_type, value in location_values.items():
+            key = self._normalize(location_type, value)
+            if key is None:
+                continue
+            rule = self.tables[location_type].get(key)
+            if rule and (best is None or rule[0] < best[0]):
+                best = rule
+        return best
+
+
+class LocationRuleCache:
+    """Bounded TTL cache of compiled location rules per performer"""
+
+    def __init__(self, db, maxsize: int = LOCATION_RULE_CACHE_SIZE, ttl: int = LOCATION_RULE_CACHE_TTL_SECONDS):
+        self.db = db
+        self._cache = StampedCache(maxsize, ttl)
+
+    async def get(self, performer_id: str) -> CompiledLocationRules:
+        """Get compiled rules for one performer"""
+        return (await self.get_many([performer_id]))[performer_id]
+
+    async def get_many(self, performer_ids: List[str]) -> Dict[str, CompiledLocationRules]:
+        """Get compiled rules for many performers, loading all misses in one query"""
+        results = {}
+        missing = []
+        for performer_id in performer_ids:
+            rules = self._cache.get(performer_id)
+            if rules is None:
+                missing.append(performer_id)
+            else:
+                results[performer_id] = rules
+
+        if missing:
+            generation = self._cache.generation()
+            preference_docs = await self.db.location_preferences.find(
+                {"performer_id": {"$in": missing}}
+            ).to_list(None)
+
+            grouped = {performer_id: [] for performer_id in missing}
+            for doc in preference_docs:
+                grouped[doc["performer_id"]].append(doc)
+
+            for performer_id, preferences in grouped.items():
+                rules = CompiledLocationRules(preferences)
+                self._cache.put(performer_id, generation, rules)
+                results[performer_id] = rules
+
+        return results
+
+    def invalidate(self, performer_id: str):
+        """Drop a performer's compiled rules after their preferences change"""
+        self._cache.invalidate(performer_id)
+
+
+class AccessControlService:
+    def __init__(self, db, geoip_resolver):
+        self.db = db
+        self.geoip = geoip_resolver
+        self.location_rules = LocationRuleCache(db)
+        self.teaser_sessions = TeaserSessionStore(db)
+
+    def detect_location(self, ip_address: str) -> Location:
+        """Resolve an IP address with the offline GeoIP database"""
+        # Handle localhost/development IPs
+        if ip_address in ["127.0.0.1", "::1", "localhost"]:
+            ip_address = "192.168.1.100"  # Development address range in the bundled GeoIP data
+
+        return self.geoip.resolve(ip_address) or UNKNOWN_LOCATION
+
+    async def get_user_location(self, request: Request) -> Location:
+        """Get user location from IP address"""
+        return self.detect_location(request.client.host)
+
+    # =============================================================================
+    # RULE LOADING
+    # =============================================================================
+
+    async def load_access_rules(self, performer_ids: List[str], user_id: Optional[str], user_ip: str) -> Dict[str, Dict[str, Any]]:
+        """Fetch blocks, location rules and teaser settings for performers in one concurrent round trip"""
+        block_conditions = [{"blocked_user_ip": user_ip}]
+        if user_id:
+            block_conditions.append({"blocked_user_id": user_id})
+
+        performer_filter = {"performer_id": {"$in": performer_ids}}
+        blocked_docs, location_rules, teaser_docs = await asyncio.gather(
+            self.db.blocked_users.find({**performer_filter, "$or": block_conditions}).to_list(None),
+            self.location_rules.get_many(performer_ids),
+            self.db.teaser_settings.find(performer_filter).to_list(None)
+        )
+
+        rules = {
+            performer_id: {"blocked": [], "location_rules": location_rules[performer_id], "teaser_settings": None}
+            for performer_id in performer_ids
+        }
+        for doc in blocked_docs:
+            rules[doc["performer_id"]]["blocked"].append(doc)
+        for doc in teaser_docs:
+            rules[doc["performer_id"]]["teaser_settings"] = doc
+
+        return rules
+
+    # =============================================================================
+    # IN-MEMORY EVALUATION
+    # =============================================================================
+
+    def evaluate_blocked(self, blocked_docs: List[Dict[str, Any]], user_id: Optional[str], user_ip: str) -> tuple[bool, str]:
+        """Check loaded block records, user ID blocks taking precedence over IP blocks"""
+        if user_id:
+            for doc in blocked_docs:
+                if doc.get("blocked_user_id") == user_id:
+                    return True, f"User blocked: {BlockedUser(**doc).reason.value}"
+
+        for doc in blocked_docs:
+            if doc.get("blocked_user_ip") == user_ip:
+                return True, f"IP blocked: {BlockedUser(**doc).reason.value}"
+
+        return False, ""
+
+    def evaluate_location(self, location_rules: CompiledLocationRules, user_location: Location) -> tuple[bool, SubscriptionType, str]:
+        """Match compiled location rules against the user's location"""
+        if not location_rules.has_preferences:
+            # No preferences set - default to free access globally
+            return True, SubscriptionType.FREE, "Global access allowed"
+
+        rule = location_rules.match(user_location)
+        if rule:
+            _, location_type, location_value, is_allowed, subscription_type = rule
+            if is_allowed:
+                return True, subscription_type, f"Access allowed for {location_type}: {location_value}"
+            else:
+                return False, None, f"Access blocked for {location_type}: {location_value}"
+
+        # No matching preferences found - default behavior
+        return False, None, "Location not in allowed regions"
+
+    def evaluate_rules(self, rules: Dict[str, Any], user_id: Optional[str], user_ip: str,
+                       location: Location) -> tuple[Optional[AccessResponse], Optional[SubscriptionType]]:
+        """Decide access from loaded rules; returns no response when a teaser session must be consulted"""
+        # 1. Check if user is blocked
+        is_blocked, block_reason = self.evaluate_blocked(rules["blocked"], user_id, user_ip)
+        if is_blocked:
+            return AccessResponse(
+                access_level=AccessLevel.BLOCKED,
+                allowed=False,
+                reason=block_reason,
+                message="You are blocked from accessing this profile."
+            ), None
+
+        # 2. Check location access
+        location_allowed, subscription_type, location_reason = self.evaluate_location(rules["location_rules"], location)
+        if not location_allowed:
+            return AccessResponse(
+                access_level=AccessLevel.BLOCKED,
+                allowed=False,
+                reason=location_reason,
+                message="This profile is not available in your location."
+            ), None
+
+        # 3. Handle subscription types
+        if subscription_type == SubscriptionType.FREE:
+            return AccessResponse(
+                access_level=AccessLevel.FULL,
+                allowed=True,
+                reason="Free access granted",
+                message="Welcome! Enjoy full access to this profile."
+            ), subscription_type
+
+        if subscription_type == SubscriptionType.TEASER:
+            return None, subscription_type
+
+        # MONTHLY or PER_VISIT
+        # TODO: Check if user has active subscription/payment
+        # For now, return subscription required
+        return AccessResponse(
+            access_level=AccessLevel.BLOCKED,
+            allowed=False,
+            reason="Subscription required",
+            subscription_required=subscription_type,
+            message=f"This profile requires a {subscription_type.value} subscription."
+        ), subscription_type
+
+    def _teaser_response(self, teaser_session: Optional[TeaserSession]) -> AccessResponse:
+        """Build the access response for a teaser-gated profile"""
+        if teaser_session and teaser_session.expires_at > datetime.utcnow():
+            remaining_seconds = int((teaser_session.expires_at - datetime.utcnow()).total_seconds())
+            return AccessResponse(
+                access_level=AccessLevel.TEASER,
+                allowed=True,
+                reason="Teaser access active",
+                teaser_remaining_seconds=remaining_seconds,
+                message=f"Preview mode - {remaining_seconds} seconds remaining"
+            )
+
+        return AccessResponse(
+            access_level=AccessLevel.BLOCKED,
+            allowed=False,
+            reason="Teaser expired",
+            subscription_required=SubscriptionType.MONTHLY,
+            message="Preview time expired! Subscribe to continue viewing this profile."
+        )
+
+    # =============================================================================
+    # SINGLE-RULE CHECKS
+    # =============================================================================
+
+    async def check_location_access(self, performer_id: str, user_location: Location) -> tuple[bool, SubscriptionType, str]:
+        """Check if user's location is allowed to access performer's profile"""
+        location_rules = await self.location_rules.get(performer_id)
+        return self.evaluate_location(location_rules, user_location)
+
+    async def check_user_blocked(self, performer_id: str, user_id: Optional[str], user_ip: str) -> tuple[bool, str]:
+        """Check if user is blocked by the performer"""
+        block_conditions = [{"blocked_user_ip": user_ip}]
+        if user_id:
+            block_conditions.append({"blocked_user_id": user_id})
+
+        blocked_docs = await self.db.blocked_users.find({
+            "performer_id": performer_id,
+            "$or": block_conditions
+        }).to_list(None)
+        return self.evaluate_blocked(blocked_docs, user_id, user_ip)
+
+    async def get_or_create_teaser_session(self, performer_id: str, user_id: Optional[str], user_ip: str,
+                                           teaser_settings: Optional[Dict[str, Any]] = None) -> Optional[TeaserSession]:
+        """Get existing teaser session or create new one"""
+        # Get teaser settings unless the caller already loaded them
+        if teaser_settings is None:
+            teaser_settings = await self.db.teaser_settings.find_one({"performer_id": performer_id})
+        if not teaser_settings or not teaser_settings.get("enabled", False):
+            return None
+
+        settings = TeaserSettings(**teaser_settings)
+        return await self.teaser_sessions.get_or_start(performer_id, user_id, user_ip, settings.duration_seconds)
+
+    # =============================================================================
+    # ACCESS CHECKS
+    # =============================================================================
+
+    async def check_profile_access(self, access_request: AccessRequest) -> AccessResponse:
+        """Main access control logic"""
+        performer_id = access_request.performer_id
+        user_id = access_request.user_id
+        user_ip = access_request.user_ip
+
+        rules = (await self.load_access_rules([performer_id], user_id, user_ip))[performer_id]
+        access_response, _ = self.evaluate_rules(rules, user_id, user_ip, access_request.location)
+        if access_response:
+            return access_response
+
+        # Teaser access - check/create teaser session
+        teaser_session = await self.get_or_create_teaser_session(
+            performer_id, user_id, user_ip, rules["teaser_settings"] or {}
+        )
+        return self._teaser_response(teaser_session)
+
+    async def check_bulk_profile_access(self, bulk_request: BulkAccessRequest) -> Dict[str, AccessResponse]:
+        """Check one viewer against many performers without starting teaser sessions"""
+        performer_ids = list(dict.fromkeys(bulk_request.performer_ids))
+        if len(performer_ids) > MAX_BULK_ACCESS_CHECKS:
+            raise ValueError(f"At most {MAX_BULK_ACCESS_CHECKS} performers can be checked at once")
+
+        user_id = bulk_request.user_id
+        user_ip = bulk_request.user_ip
+
+        all_rules = await self.load_access_rules(performer_ids, user_id, user_ip)
+
+        results = {}
+        teaser_performer_ids = []
+        for performer_id in performer_ids:
+            access_response, _ = self.evaluate_rules(all_rules[performer_id], user_id, user_ip, bulk_request.location)
+            if access_response:
+                results[performer_id] = access_response
+            else:
+                teaser_performer_ids.append(performer_id)
+
+        if teaser_performer_ids:
+            # Look up the viewer's teaser sessions for all teaser-gated performers at once
+            sessions = await self.teaser_sessions.get_many(teaser_performer_ids, user_id, user_ip)
+
+            for performer_id in teaser_performer_ids:
+                settings_doc = all_rules[performer_id]["teaser_settings"]
+                if performer_id in sessions:
+                    results[performer_id] = self._teaser_response(sessions[performer_id])
+                elif settings_doc and settings_doc.get("enabled", False):
+                    # Preview not started yet - viewing the profile will start the timer
+                    duration_seconds = TeaserSettings(**settings_doc).duration_seconds
+                    results[performer_id] = AccessResponse(
+                        access_level=AccessLevel.TEASER,
+                        allowed=True,
+                        reason="Teaser available",
+                        teaser_remaining_seconds=duration_seconds,
+                        message=f"Preview available - {duration_seconds} seconds"
+                    )
+                else:
+                    results[performer_id] = self._teaser_response(None)
+
+        return {performer_id: results[performer_id] for performer_id in performer_ids}
@@ -6,6 +6,7 @@ from typing import Optional, Dict, Any, List
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import os
+from daily_metrics_service import DailyMetricsRollup, shared_daily_metrics
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -16,8 +17,9 @@ ALGORITHM = "HS256"
 ADMIN_ACCESS_TOKEN_EXPIRE_MINUTES = 60  # Longer session for admins
 
 class AdminAuthService:
-    def __init__(self, db):
+    def __init__(self, db, daily_metrics: Optional[DailyMetricsRollup] = None):
         self.db = db
+        self.daily_metrics = daily_metrics or shared_daily_metrics
         
     async def create_admin_user(self, admin_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new admin user (super admin only)"""
@@ -75,6 +77,7 @@ class AdminAuthService:
             
             # Insert admin into database
             await self.db.users.insert_one(admin_user_data)
+            self.daily_metrics.record_registration("admin")
             
             return {
                 "success": True,
@@ -134,6 +137,7 @@ class AdminAuthService:
                 {"id": admin['id']},
                 {"$set": {"lastSeen": datetime.utcnow()}}
             )
+            self.daily_metrics.record_active(admin['id'])
             
             # Create admin response (remove sensitive data)
             admin_response = {
@@ -1,11 +1,20 @@
-import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional, Dict, Any, List
-from collections import defaultdict
+from admin_summary_service import PlatformSummary
+from ledger_service import TransactionLedger
+from daily_metrics_service import DailyMetricsRollup, shared_daily_metrics, ANALYTICS_PERIODS
+from member_dashboard_cache import shared_dashboard_cache
+from expert_discovery_service import expert_discovery_fields
+from zip_centroid_service import ZipCentroidTable
 
 class AdminManagementService:
-    def __init__(self, db):
+    def __init__(self, db, daily_metrics: Optional[DailyMetricsRollup] = None,
+                 zip_centroids: Optional[ZipCentroidTable] = None):
         self.db = db
+        self.zip_centroids = zip_centroids
+        self.summary = PlatformSummary(db)
+        self.ledger = TransactionLedger(db)
+        self.daily_metrics = daily_metrics or shared_daily_metrics
     
     # =============================================================================
     # USER MANAGEMENT
@@ -161,6 +170,7 @@ class AdminManagementService:
             )
             
             if result.modified_count > 0:
+                shared_dashboard_cache.invalidate(user_id)
                 # If suspending user, invalidate their sessions
                 if status == "suspended":
                     await self.db.member_sessions.update_many(
@@ -198,6 +208,7 @@ class AdminManagementService:
             )
             
             if result.modified_count > 0:
+                shared_dashboard_cache.invalidate(user_id)
                 return {
                     "success": True,
                     "message": f"User {verification_type} verification completed"
@@ -296,7 +307,13 @@ class AdminManagementService:
     async def approve_expert(self, expert_id: str, admin_notes: str = None) -> Dict[str, Any]:
         """Approve expert application"""
         try:
+            expert = await self.db.users.find_one({"id": expert_id, "userType": "expert"}, {"_id": 0})
+            if not expert:
+                return {"success": False, "message": "Expert not found"}
+            
+            # Approval makes the expert discoverable; fill in the fields discovery sorts, filters and searches on
             update_data = {
+                **expert_discovery_fields(expert, self.zip_centroids),
                 "accountStatus": "active",
                 "isVerified": True,
                 "approvedAt": datetime.utcnow(),
@@ -355,39 +372,24 @@ class AdminManagementService:
     async def get_financial_overview(self) -> Dict[str, Any]:
         """Get financial dashboard overview"""
         try:
-            # Get credit transactions summary
-            credit_pipeline = [
-                {"$group": {
-                    "_id": "$transactionType",
-                    "total_amount": {"$sum": "$amount"},
-                    "count": {"$sum": 1}
-                }}
-            ]
-            
-            credit_stats = await self.db.credit_transactions.aggregate(credit_pipeline).to_list(100)
-            
-            # Get payout requests summary
-            payout_pipeline = [
-                {"$group": {
-                    "_id": "$status",
-                    "total_amount": {"$sum": "$amount"},
-                    "count": {"$sum": 1}
-                }}
-            ]
-            
-            payout_stats = await self.db.payout_requests.aggregate(payout_pipeline).to_list(100)
+            summary = await self.summary.get()
+            credit_stats = summary["credits_by_type"]
+            payout_stats = summary["payouts_by_status"]
+            user_types = summary["users"]["by_type"]
             
             # Calculate totals
-            total_credits_issued = sum(stat["total_amount"] for stat in credit_stats if stat["_id"] in ["earned_referral", "earned_signup_bonus"])
-            total_credits_spent = abs(sum(stat["total_amount"] for stat in credit_stats if stat["_id"] == "spent_purchase"))
-            total_payouts_requested = sum(stat["total_amount"] for stat in payout_stats)
-            total_payouts_completed = sum(stat["total_amount"] for stat in payout_stats if stat["_id"] == "completed")
+            total_credits_issued = sum(stat["total_amount"] for txn_type, stat in credit_stats.items() if txn_type in ["earned_referral", "earned_signup_bonus"])
+            total_credits_spent = abs(sum(stat["total_amount"] for txn_type, stat in credit_stats.items() if txn_type == "spent_purchase"))
+            total_payouts_requested = sum(stat["total_amount"] for stat in payout_stats.values())
+            total_payouts_completed = sum(stat["total_amount"] for status, stat in payout_stats.items() if status == "completed")
             
             # Get user counts
-            total_members = await self.db.users.count_documents({"userType": "member"})
-            total_experts = await self.db.users.count_documents({"userType": "expert"})
-            active_members = await self.db.users.count_documents({"userType": "member", "accountStatus": "active"})
-            active_experts = await self.db.users.count_documents({"userType": "expert", "accountStatus": "active"})
+            members = user_types.get("member", {"total": 0, "by_status": {}})
+            experts = user_types.get("expert", {"total": 0, "by_status": {}})
+            total_members = members["total"]
+            total_experts = experts["total"]
+            active_members = members["by_status"].get("active", 0)
+            active_experts = experts["by_status"].get("active", 0)
             
             return {
                 "success": True,
@@ -411,57 +413,27 @@ class AdminManagementService:
                     "metrics": {
                         "member_conversion_rate": (active_members / max(total_members, 1)) * 100,
                         "expert_approval_rate": (active_experts / max(total_experts, 1)) * 100
-                    }
+                    },
+                    "computed_at": summary["computed_at"]
                 }
             }
             
         except Exception as e:
             return {"success": False, "message": f"Failed to get financial overview: {str(e)}"}
     
-    async def get_transaction_history(self, transaction_type: str = "all", limit: int = 100) -> Dict[str, Any]:
+    async def get_transaction_history(self, transaction_type: str = "all", limit: int = 100,
+                                      cursor: Optional[str] = None, start_date: Optional[datetime] = None,
+                                      end_date: Optional[datetime] = None) -> Dict[str, Any]:
         """Get transaction history"""
         try:
-            transactions = []
-            
-            # Get credit transactions
-            if transaction_type in ["all", "credits"]:
-                credit_cursor = self.db.credit_transactions.find({}).sort("createdAt", -1).limit(limit)
-                credit_transactions = await credit_cursor.to_list(limit)
-                
-                for txn in credit_transactions:
-                    transactions.append({
-                        "id": txn['id'],
-                        "type": "credit",
-                        "user_id": txn['userId'],
-                        "amount": txn['amount'],
-                        "description": txn['description'],
-                        "status": txn.get('status', 'completed'),
-                        "created_at": txn['createdAt']
-                    })
-            
-            # Get payout requests
-            if transaction_type in ["all", "payouts"]:
-                payout_cursor = self.db.payout_requests.find({}).sort("createdAt", -1).limit(limit)
-                payout_requests = await payout_cursor.to_list(limit)
-                
-                for payout in payout_requests:
-                    transactions.append({
-                        "id": payout['id'],
-                        "type": "payout",
-                        "user_id": payout['expertId'],
-                        "amount": -payout['amount'],  # Negative for outgoing
-                        "description": f"Payout request - {payout.get('description', 'Expert earnings')}",
-                        "status": payout['status'],
-                        "created_at": payout['createdAt']
-                    })
-            
-            # Sort by created_at
-            transactions.sort(key=lambda x: x['created_at'], reverse=True)
+            page = await self.ledger.page(transaction_type, limit, cursor, start_date, end_date)
             
             return {
                 "success": True,
-                "transactions": transactions[:limit],
-                "total": len(transactions)
+                "transactions": page["transactions"],
+                "total": len(page["transactions"]),
+                "next_cursor": page["next_cursor"],
+                "has_more": page["has_more"]
             }
             
         except Exception as e:
@@ -474,51 +446,29 @@ class AdminManagementService:
     async def get_platform_analytics(self, period: str = "30d") -> Dict[str, Any]:
         """Get platform analytics and metrics"""
         try:
-            # Calculate date range
-            if period == "7d":
-                start_date = datetime.utcnow() - timedelta(days=7)
-            elif period == "30d":
-                start_date = datetime.utcnow() - timedelta(days=30)
-            elif period == "90d":
-                start_date = datetime.utcnow() - timedelta(days=90)
-            else:
-                start_date = datetime.utcnow() - timedelta(days=30)
+            if period not in ANALYTICS_PERIODS:
+                period = "30d"
             
-            # User growth metrics
-            total_users = await self.db.users.count_documents({})
-            new_users = await self.db.users.count_documents({"createdAt": {"$gte": start_date}})
+            summary = await self.summary.get()
+            rollup = await self.daily_metrics.get_range(ANALYTICS_PERIODS[period])
+            user_stats = summary["users"]
+            user_types = user_stats["by_type"]
             
-            # User breakdown by type
-            member_count = await self.db.users.count_documents({"userType": "member"})
-            expert_count = await self.db.users.count_documents({"userType": "expert"})
-            admin_count = await self.db.users.count_documents({"userType": "admin"})
+            # User growth metrics
+            total_users = user_stats["total"]
+            new_users = rollup["totals"]["registrations_total"]
             
             # Active users (seen in last 30 days)
-            active_users = await self.db.users.count_documents({
-                "lastSeen": {"$gte": datetime.utcnow() - timedelta(days=30)}
-            })
-            
-            # Expert categories breakdown
-            category_pipeline = [
-                {"$match": {"userType": "expert"}},
-                {"$group": {"_id": "$expertiseCategory", "count": {"$sum": 1}}}
-            ]
-            category_stats = await self.db.users.aggregate(category_pipeline).to_list(100)
-            
-            # Daily user registrations (last 30 days)
-            daily_pipeline = [
-                {"$match": {"createdAt": {"$gte": start_date}}},
-                {"$group": {
-                    "_id": {
-                        "year": {"$year": "$createdAt"},
-                        "month": {"$month": "$createdAt"},
-                        "day": {"$dayOfMonth": "$createdAt"}
-                    },
-                    "count": {"$sum": 1}
-                }},
-                {"$sort": {"_id": 1}}
+            active_users = user_stats["active"]["active_30d"]
+            
+            # Daily user registrations within the period
+            daily_registrations = [
+                {
+                    "_id": {"year": day["date"].year, "month": day["date"].month, "day": day["date"].day},
+                    "count": day["registrations_total"]
+                }
+                for day in rollup["series"] if day["registrations_total"]
             ]
-            daily_registrations = await self.db.users.aggregate(daily_pipeline).to_list(100)
             
             return {
                 "success": True,
@@ -530,13 +480,16 @@ class AdminManagementService:
                         "growth_rate": (new_users / max(total_users - new_users, 1)) * 100
                     },
                     "user_breakdown": {
-                        "members": member_count,
-                        "experts": expert_count,
-                        "admins": admin_count
+                        "members": user_types.get("member", {}).get("total", 0),
+                        "experts": user_types.get("expert", {}).get("total", 0),
+                        "admins": user_types.get("admin", {}).get("total", 0)
                     },
-                    "expert_categories": category_stats,
+                    "expert_categories": user_stats["expert_categories"],
                     "daily_registrations": daily_registrations,
-                    "period": period
+                    "daily_metrics": rollup["series"],
+                    "period_totals": rollup["totals"],
+                    "period": period,
+                    "computed_at": summary["computed_at"]
                 }
             }
             
@@ -546,21 +499,17 @@ class AdminManagementService:
     async def get_user_engagement_metrics(self) -> Dict[str, Any]:
         """Get user engagement metrics"""
         try:
-            # Mock engagement data - in a real system this would track actual user actions
-            now = datetime.utcnow()
-            
-            # Calculate activity periods
-            last_24h = now - timedelta(hours=24)
-            last_7d = now - timedelta(days=7)
-            last_30d = now - timedelta(days=30)
+            summary = await self.summary.get()
+            user_stats = summary["users"]
+            rollup = await self.daily_metrics.get_range(ANALYTICS_PERIODS["30d"])
             
             # Users active in different periods
-            active_24h = await self.db.users.count_documents({"lastSeen": {"$gte": last_24h}})
-            active_7d = await self.db.users.count_documents({"lastSeen": {"$gte": last_7d}})
-            active_30d = await self.db.users.count_documents({"lastSeen": {"$gte": last_30d}})
+            active_24h = user_stats["active"]["active_24h"]
+            active_7d = user_stats["active"]["active_7d"]
+            active_30d = user_stats["active"]["active_30d"]
             
             # Total users for retention calculation
-            total_users = await self.db.users.count_documents({})
+            total_users = user_stats["total"]
             
             return {
                 "success": True,
@@ -572,7 +521,11 @@ class AdminManagementService:
                         "daily": (active_24h / max(total_users, 1)) * 100,
                         "weekly": (active_7d / max(total_users, 1)) * 100,
                         "monthly": (active_30d / max(total_users, 1)) * 100
-                    }
+                    },
+                    "daily_active_series": [
+                        {"day": day["day"], "active_users": day["active_users"]} for day in rollup["series"]
+                    ],
+                    "computed_at": summary["computed_at"]
                 }
             }
             
@@ -0,0 +1,136 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger(__name__)
+
+ADMIN_SUMMARY_REFRESH_SECONDS = int(os.environ.get("ADMIN_SUMMARY_REFRESH_SECONDS", "300"))
+SUMMARY_ID = "platform"
+
+# Distinct-user activity windows (daily series come from the daily_metrics rollups)
+ACTIVITY_WINDOWS = {"active_24h": timedelta(hours=24), "active_7d": timedelta(days=7), "active_30d": timedelta(days=30)}
+
+
+def _count_since(field: str, since: datetime) -> Dict[str, Any]:
+    return {"$sum": {"$cond": [{"$gte": [f"${field}", since]}, 1, 0]}}
+
+
+class PlatformSummary:
+    """Admin dashboard figures computed with one aggregation per collection and kept as a materialized document"""
+
+    def __init__(self, db, refresh_seconds: int = ADMIN_SUMMARY_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self._summary: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await self.db.users.create_index(
+            [("userType", ASCENDING), ("accountStatus", ASCENDING)], name="user_type_status"
+        )
+        await self.db.users.create_index([("createdAt", DESCENDING)], name="user_created")
+        await self.db.users.create_index([("lastSeen", DESCENDING)], name="user_last_seen")
+        await self.db.credit_transactions.create_index([("createdAt", DESCENDING)], name="credit_txn_created")
+        await self.db.payout_requests.create_index([("createdAt", DESCENDING)], name="payout_created")
+
+    async def _user_stats(self, now: datetime) -> Dict[str, Any]:
+        totals_group = {
+            "_id": {"userType": "$userType", "accountStatus": "$accountStatus"},
+            "count": {"$sum": 1},
+            **{name: _count_since("lastSeen", now - window) for name, window in ACTIVITY_WINDOWS.items()}
+        }
+        results = await self.db.users.aggregate([
+            {"$facet": {
+                "totals": [{"$group": totals_group}],
+                "expert_categories": [
+                    {"$match": {"userType": "expert"}},
+                    {"$group": {"_id": "$expertiseCategory", "count": {"$sum": 1}}}
+                ]
+            }}
+        ]).to_list(1)
+        facets = results[0] if results else {}
+
+        counters = ["count"] + list(ACTIVITY_WINDOWS)
+        overall = {name: 0 for name in counters}
+        by_type: Dict[str, Dict[str, int]] = {}
+        for bucket in facets.get("totals", []):
+            user_type = bucket["_id"].get("userType") or "unknown"
+            status = bucket["_id"].get("accountStatus") or "unknown"
+            type_stats = by_type.setdefault(user_type, {"total": 0, "by_status": {}})
+            type_stats["total"] += bucket["count"]
+            type_stats["by_status"][status] = type_stats["by_status"].get(status, 0) + bucket["count"]
+            for name in counters:
+                overall[name] += bucket.get(name, 0)
+
+        return {
+            "total": overall["count"],
+            "active": {name: overall[name] for name in ACTIVITY_WINDOWS},
+            "by_type": by_type,
+            "expert_categories": facets.get("expert_categories", [])
+        }
+
+    async def _grouped_amounts(self, collection, field: str) -> Dict[str, Dict[str, Any]]:
+        buckets = await collection.aggregate([
+            {"$group": {"_id": f"${field}", "total_amount": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+        ]).to_list(100)
+        return {str(bucket["_id"]): {"total_amount": bucket["total_amount"], "count": bucket["count"]} for bucket in buckets}
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Recompute the summary and store it for other workers and restarts"""
+        now = datetime.utcnow()
+        users, credits, payouts = await asyncio.gather(
+            self._user_stats(now),
+            self._grouped_amounts(self.db.credit_transactions, "transactionType"),
+            self._grouped_amounts(self.db.payout_requests, "status")
+        )
+        summary = {
+            "_id": SUMMARY_ID,
+            "computed_at": now,
+            "users": users,
+            "credits_by_type": credits,
+            "payouts_by_status": payouts
+        }
+        await self.db.admin_summaries.replace_one({"_id": SUMMARY_ID}, summary, upsert=True)
+        self._summary = summary
+        return summary
+
+    def _is_fresh(self, summary: Optional[Dict[str, Any]]) -> bool:
+        return bool(summary) and datetime.utcnow() - summary["computed_at"] < timedelta(seconds=self.refresh_seconds)
+
+    async def get(self) -> Dict[str, Any]:
+        """Latest summary: in memory, else the stored document, else computed now"""
+        if self._is_fresh(self._summary):
+            return self._summary
+        async with self._lock:
+            if self._is_fresh(self._summary):
+                return self._summary
+            stored = await self.db.admin_summaries.find_one({"_id": SUMMARY_ID})
+            if self._is_fresh(stored):
+                self._summary = stored
+                return stored
+            return await self.refresh()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to refresh admin summary: {str(e)}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -263,4 +263,11 @@ class ShoppingCart(BaseModel):
     # Timestamps
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
-    lastModifiedAt: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    lastModifiedAt: datetime = Field(default_factory=datetime.utcnow)
+# Bulk Referral Processing Models
+class ReferralSignup(BaseModel):
+    affiliateCode: str = Field(..., description="Affiliate code the new user signed up with")
+    newUserId: str = Field(..., description="User ID of the referred member")
+
+class BulkReferralSignupRequest(BaseModel):
+    signups: List[ReferralSignup] = Field(..., min_length=1, max_length=5000, description="Signups to process together")
@@ -1,18 +1,29 @@
 import uuid
 import hashlib
 import secrets
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
+from pymongo.errors import DuplicateKeyError
 from affiliate_credits_models import (
     AffiliateProgram, ReferralTracking, CreditAccount, CreditTransaction,
     ExpertPayoutAccount, PayoutRequest, PayoutHistory, ShoppingCart, CartItem,
     AffiliateStatus, CreditTransactionType, CreditTransactionStatus,
     PayoutStatus, PayoutMethod
 )
+from daily_metrics_service import DailyMetricsRollup, shared_daily_metrics, day_key
+from credit_ledger import CreditLedger
+from referral_click_service import AffiliateCodeFilter, ReferralClickIngestor, shared_affiliate_codes
+from affiliate_stats_service import AffiliateStatsProjection, CLICK_WINDOWS
+from member_dashboard_cache import shared_dashboard_cache
 
 class AffiliateService:
-    def __init__(self, db):
+    def __init__(self, db, click_ingestor: Optional[ReferralClickIngestor] = None,
+                 codes: Optional[AffiliateCodeFilter] = None):
         self.db = db
+        self.click_ingestor = click_ingestor
+        self.codes = codes or shared_affiliate_codes
+        self.stats = AffiliateStatsProjection(db)
         
     async def create_affiliate_account(self, member_id: str) -> AffiliateProgram:
         """Create a new affiliate account for a member"""
@@ -27,6 +38,9 @@ class AffiliateService:
         )
         
         await self.db.affiliate_programs.insert_one(affiliate_account.dict())
+        self.codes.add(affiliate_code, member_id)
+        await self.stats.create(affiliate_account.dict())
+        shared_dashboard_cache.invalidate(member_id)
         return affiliate_account
     
     async def get_affiliate_account(self, member_id: str) -> Optional[AffiliateProgram]:
@@ -38,6 +52,13 @@ class AffiliateService:
     
     async def track_referral_click(self, affiliate_code: str, ip_address: str, user_agent: str, referrer_url: str) -> ReferralTracking:
         """Track when someone clicks on a referral link"""
+        if self.click_ingestor is not None:
+            # Validated in memory and written in batches with the hourly click counters
+            tracking = await self.click_ingestor.track(affiliate_code, ip_address, user_agent, referrer_url)
+            if tracking is None:
+                raise Exception("Invalid affiliate code")
+            return tracking
+
         # Find the affiliate account
         affiliate_account = await self.db.affiliate_programs.find_one({"affiliateCode": affiliate_code})
         if not affiliate_account:
@@ -52,6 +73,7 @@ class AffiliateService:
         )
         
         await self.db.referral_tracking.insert_one(tracking.dict())
+        await self.stats.record_clicks({tracking.referrerId: Counter({day_key(tracking.createdAt): 1})})
         return tracking
     
     async def process_referral_signup(self, affiliate_code: str, new_user_id: str) -> bool:
@@ -65,23 +87,33 @@ class AffiliateService:
         if not tracking_data:
             return False
         
-        # Update tracking record
-        await self.db.referral_tracking.update_one(
-            {"id": tracking_data["id"]},
-            {
-                "$set": {
-                    "referredUserId": new_user_id,
-                    "hasSignedUp": True,
-                    "signupDate": datetime.utcnow(),
-                    "creditsAwarded": 10.0,  # Default referral bonus
-                    "updatedAt": datetime.utcnow()
-                }
-            }
+        program = await self.db.affiliate_programs.find_one(
+            {"affiliateCode": affiliate_code}, {"_id": 0, "referralBonus": 1}
         )
+        bonus = (program or {}).get("referralBonus")
+        if bonus is None:
+            bonus = 10.0  # Default referral bonus
+        
+        # Update tracking record
+        signup = {
+            "referredUserId": new_user_id,
+            "hasSignedUp": True,
+            "signupDate": datetime.utcnow(),
+            "creditsAwarded": bonus,
+            "updatedAt": datetime.utcnow()
+        }
+        try:
+            await self.db.referral_tracking.update_one(
+                {"id": tracking_data["id"]},
+                {"$set": signup}
+            )
+        except DuplicateKeyError:
+            # The user was already credited as someone's referral
+            return False
         
         # Award credits to the referrer
         credit_service = CreditService(self.db)
-        await credit_service.award_referral_credits(tracking_data["referrerId"], 10.0, new_user_id)
+        await credit_service.award_referral_credits(tracking_data["referrerId"], bonus, new_user_id)
         
         # Update affiliate account stats
         await self.db.affiliate_programs.update_one(
@@ -89,7 +121,7 @@ class AffiliateService:
             {
                 "$inc": {
                     "totalReferrals": 1,
-                    "totalCreditsEarned": 10.0
+                    "totalCreditsEarned": bonus
                 },
                 "$set": {
                     "updatedAt": datetime.utcnow(),
@@ -97,30 +129,18 @@ class AffiliateService:
                 }
             }
         )
+        await self.stats.record_referrals([{**tracking_data, **signup}])
         
         return True
     
     async def get_referral_stats(self, member_id: str) -> Dict[str, Any]:
         """Get referral statistics for a member"""
         try:
-            affiliate_account = await self.get_affiliate_account(member_id)
-            if not affiliate_account:
+            # One read of the maintained projection instead of the account plus a referral scan
+            stats = await self.stats.get(member_id)
+            if not stats:
                 return {"error": "No affiliate account found"}
-            
-            # Get recent referrals
-            recent_referrals = await self.db.referral_tracking.find({
-                "referrerId": member_id,
-                "hasSignedUp": True
-            }).sort("signupDate", -1).limit(10).to_list(10)
-            
-            return {
-                "affiliate_code": affiliate_account.affiliateCode,
-                "referral_link": affiliate_account.referralLink,
-                "total_referrals": affiliate_account.totalReferrals,
-                "total_credits_earned": affiliate_account.totalCreditsEarned,
-                "recent_referrals": recent_referrals,
-                "status": affiliate_account.status
-            }
+            return stats
         except Exception as e:
             # Log the error and return a safe response
             print(f"Error getting referral stats: {str(e)}")
@@ -130,7 +150,10 @@ class AffiliateService:
                 "referral_link": None,
                 "total_referrals": 0,
                 "total_credits_earned": 0.0,
+                "total_clicks": 0,
+                "conversion_rate": 0.0,
                 "recent_referrals": [],
+                "clicks": {window: 0 for window in CLICK_WINDOWS},
                 "status": "inactive"
             }
     
@@ -142,8 +165,11 @@ class AffiliateService:
         return f"REF{hash_object.hexdigest()[:8].upper()}"
 
 class CreditService:
-    def __init__(self, db):
+    def __init__(self, db, daily_metrics: Optional[DailyMetricsRollup] = None,
+                 ledger: Optional[CreditLedger] = None):
         self.db = db
+        self.daily_metrics = daily_metrics or shared_daily_metrics
+        self.ledger = ledger or CreditLedger(db)
     
     async def create_credit_account(self, user_id: str) -> CreditAccount:
         """Create a new credit account for a user"""
@@ -153,7 +179,11 @@ class CreditService:
             return CreditAccount(**existing)
         
         credit_account = CreditAccount(userId=user_id)
-        await self.db.credit_accounts.insert_one(credit_account.dict())
+        try:
+            await self.db.credit_accounts.insert_one(credit_account.dict())
+        except DuplicateKeyError:
+            # Created concurrently (accounts are unique per user)
+            return await self.get_credit_account(user_id)
         return credit_account
     
     async def get_credit_account(self, user_id: str) -> Optional[CreditAccount]:
@@ -172,9 +202,6 @@ class CreditService:
     
     async def award_referral_credits(self, user_id: str, amount: float, referred_user_id: str) -> CreditTransaction:
         """Award credits for a successful referral"""
-        # Ensure credit account exists
-        await self.create_credit_account(user_id)
-        
         # Create credit transaction
         transaction = CreditTransaction(
             userId=user_id,
@@ -186,26 +213,15 @@ class CreditService:
             relatedType="referral"
         )
         
-        await self.db.credit_transactions.insert_one(transaction.dict())
-        
-        # Update credit account balance
-        await self.db.credit_accounts.update_one(
-            {"userId": user_id},
-            {
-                "$inc": {
-                    "totalCredits": amount,
-                    "lifetimeEarned": amount
-                },
-                "$set": {"updatedAt": datetime.utcnow()}
-            }
-        )
+        # Credit the balance (creating the account if needed) and record the transaction in one update
+        await self.ledger.credit(user_id, amount, transaction.dict(), CreditAccount(userId=user_id).dict())
+        self.daily_metrics.record_credit_transaction(amount)
         
         return transaction
     
     async def use_credits_for_purchase(self, user_id: str, amount: float, order_id: str, description: str) -> bool:
         """Use credits for a purchase"""
-        account = await self.get_credit_account(user_id)
-        if not account or account.totalCredits < amount:
+        if amount <= 0:
             return False
         
         # Create debit transaction
@@ -219,19 +235,11 @@ class CreditService:
             relatedType="purchase"
         )
         
-        await self.db.credit_transactions.insert_one(transaction.dict())
-        
-        # Update credit account balance
-        await self.db.credit_accounts.update_one(
-            {"userId": user_id},
-            {
-                "$inc": {
-                    "totalCredits": -amount,
-                    "lifetimeSpent": amount
-                },
-                "$set": {"updatedAt": datetime.utcnow()}
-            }
-        )
+        # Debit only if the balance covers it; concurrent purchases cannot overdraw
+        account = await self.ledger.debit(user_id, amount, transaction.dict())
+        if account is None:
+            return False
+        self.daily_metrics.record_credit_transaction(-amount)
         
         return True
     
@@ -241,6 +249,12 @@ class CreditService:
             "userId": user_id
         }).sort("createdAt", -1).limit(limit).to_list(limit)
         
+        # Include transactions already applied to the balance but not yet relayed from the outbox
+        stored_ids = {t["id"] for t in transactions}
+        pending = [t for t in await self.ledger.pending_transactions(user_id) if t["id"] not in stored_ids]
+        if pending:
+            transactions = sorted(transactions + pending, key=lambda t: t["createdAt"], reverse=True)[:limit]
+        
         return [CreditTransaction(**t) for t in transactions]
     
     async def calculate_max_credits_usable(self, total_amount: float, max_percentage: float = 0.5) -> float:
@@ -248,8 +262,9 @@ class CreditService:
         return total_amount * max_percentage
 
 class PayoutService:
-    def __init__(self, db):
+    def __init__(self, db, daily_metrics: Optional[DailyMetricsRollup] = None):
         self.db = db
+        self.daily_metrics = daily_metrics or shared_daily_metrics
     
     async def create_payout_account(self, expert_id: str, account_data: Dict[str, Any]) -> ExpertPayoutAccount:
         """Create a new payout account for an expert"""
@@ -293,6 +308,7 @@ class PayoutService:
         )
         
         await self.db.payout_requests.insert_one(payout_request.dict())
+        self.daily_metrics.record_payout_requested(amount)
         return payout_request
     
     async def get_payout_requests(self, expert_id: str, status: Optional[PayoutStatus] = None) -> List[PayoutRequest]:
@@ -351,6 +367,9 @@ class PayoutService:
             }
         )
         
+        if payout_request.get("status") != PayoutStatus.COMPLETED.value:
+            self.daily_metrics.record_payout_completed(payout_request["amount"])
+        
         # Create history record
         history = PayoutHistory(
             payoutRequestId=request_id,
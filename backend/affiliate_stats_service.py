@@ -0,0 +1,176 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from credit_ledger import APPLIED_BATCHES_FIELD, APPLIED_BATCH_HISTORY
+from daily_metrics_service import day_key
+
+RECENT_REFERRALS_LIMIT = 10
+# Daily click buckets kept on each stats document
+CLICK_HISTORY_DAYS = 30
+# Stale buckets are dropped a week at a time as new clicks arrive
+CLICK_PRUNE_DAYS = 7
+# Click totals shown in referral stats, in days including today
+CLICK_WINDOWS = {"today": 1, "last_7d": 7, "last_30d": 30}
+
+
+def _recent_entry(tracking: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": tracking["id"],
+        "affiliateCode": tracking["affiliateCode"],
+        "referredUserId": tracking["referredUserId"],
+        "creditsAwarded": tracking["creditsAwarded"],
+        "clickedAt": tracking.get("createdAt"),
+        "signupDate": tracking["signupDate"]
+    }
+
+
+class AffiliateStatsProjection:
+    """Per-affiliate stats document (_id = member id) kept current as clicks and referrals are recorded"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        await self.db.affiliate_stats.create_index([("affiliateCode", ASCENDING)], name="affiliate_stats_code")
+
+    async def create(self, program: Dict[str, Any]):
+        """Start an empty projection for a new affiliate account"""
+        await self.db.affiliate_stats.update_one(
+            {"_id": program["memberId"]},
+            {
+                "$set": {
+                    "affiliateCode": program["affiliateCode"],
+                    "referralLink": program["referralLink"],
+                    "status": program["status"],
+                    "updatedAt": datetime.utcnow()
+                },
+                "$setOnInsert": {
+                    "totalReferrals": 0,
+                    "totalCreditsEarned": 0.0,
+                    "totalClicks": 0,
+                    "clicksByDay": {},
+                    "recentReferrals": []
+                }
+            },
+            upsert=True
+        )
+
+    async def _bulk_upsert(self, updates: List[UpdateOne]):
+        try:
+            await self.db.affiliate_stats.bulk_write(updates, ordered=False)
+        except BulkWriteError as e:
+            # A batch-guarded upsert collides with the existing document when that batch was already recorded
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    async def record_clicks(self, clicks: Dict[str, Counter]):
+        """Add clicks, given as member id -> {day: count}"""
+        if not clicks:
+            return
+        today = datetime.utcnow()
+        stale = {
+            f"clicksByDay.{day_key(today - timedelta(days=age))}": ""
+            for age in range(CLICK_HISTORY_DAYS, CLICK_HISTORY_DAYS + CLICK_PRUNE_DAYS)
+        }
+        # Members without a projection get a partial one; it has no affiliateCode, so the first read rebuilds it
+        await self._bulk_upsert([
+            UpdateOne({"_id": member_id}, {
+                "$inc": {
+                    "totalClicks": sum(days.values()),
+                    **{f"clicksByDay.{day}": count for day, count in days.items()}
+                },
+                "$unset": {field: "" for field in stale if field.split(".", 1)[1] not in days},
+                "$setOnInsert": {"totalReferrals": 0, "totalCreditsEarned": 0.0, "recentReferrals": []}
+            }, upsert=True)
+            for member_id, days in clicks.items()
+        ])
+
+    async def record_referrals(self, referrals: List[Dict[str, Any]], batch_id: Optional[str] = None):
+        """Add signed-up referrals; with a batch id, re-recording the same batch is a no-op"""
+        by_member: Dict[str, List[Dict[str, Any]]] = {}
+        for tracking in referrals:
+            by_member.setdefault(tracking["referrerId"], []).append(_recent_entry(tracking))
+        if not by_member:
+            return
+        now = datetime.utcnow()
+        updates = []
+        for member_id, entries in by_member.items():
+            query: Dict[str, Any] = {"_id": member_id}
+            push: Dict[str, Any] = {
+                "recentReferrals": {
+                    "$each": entries,
+                    "$sort": {"signupDate": -1},
+                    "$slice": RECENT_REFERRALS_LIMIT
+                }
+            }
+            if batch_id:
+                query[APPLIED_BATCHES_FIELD] = {"$ne": batch_id}
+                push[APPLIED_BATCHES_FIELD] = {"$each": [batch_id], "$slice": -APPLIED_BATCH_HISTORY}
+            updates.append(UpdateOne(query, {
+                "$inc": {
+                    "totalReferrals": len(entries),
+                    "totalCreditsEarned": sum(entry["creditsAwarded"] for entry in entries)
+                },
+                "$set": {"updatedAt": now},
+                "$push": push,
+                "$setOnInsert": {"totalClicks": 0, "clicksByDay": {}}
+            }, upsert=True))
+        await self._bulk_upsert(updates)
+
+    async def rebuild(self, member_id: str) -> Optional[Dict[str, Any]]:
+        """Build the projection from affiliate_programs and referral_tracking, for accounts that predate it"""
+        program = await self.db.affiliate_programs.find_one({"memberId": member_id}, {"_id": 0})
+        if not program:
+            return None
+        code = program["affiliateCode"]
+        since = datetime.utcnow() - timedelta(days=CLICK_HISTORY_DAYS - 1)
+        daily = await self.db.referral_tracking.aggregate([
+            {"$match": {"affiliateCode": code, "createdAt": {"$gte": since}}},
+            {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$createdAt"}}, "clicks": {"$sum": 1}}}
+        ]).to_list(None)
+        recent = await self.db.referral_tracking.find(
+            {"referrerId": member_id, "hasSignedUp": True}, {"_id": 0}
+        ).sort("signupDate", -1).limit(RECENT_REFERRALS_LIMIT).to_list(RECENT_REFERRALS_LIMIT)
+        stats = {
+            "affiliateCode": code,
+            "referralLink": program["referralLink"],
+            "status": program["status"],
+            "totalReferrals": program.get("totalReferrals", 0),
+            "totalCreditsEarned": program.get("totalCreditsEarned", 0.0),
+            "totalClicks": await self.db.referral_tracking.count_documents({"affiliateCode": code}),
+            "clicksByDay": {bucket["_id"]: bucket["clicks"] for bucket in daily},
+            "recentReferrals": [_recent_entry(tracking) for tracking in recent],
+            "updatedAt": datetime.utcnow()
+        }
+        # Overwrites any partial projection; increments recorded after this keep applying on top
+        await self.db.affiliate_stats.update_one({"_id": member_id}, {"$set": stats}, upsert=True)
+        return stats
+
+    async def get(self, member_id: str) -> Optional[Dict[str, Any]]:
+        """Referral stats for a member from a single read by _id"""
+        stats = await self.db.affiliate_stats.find_one({"_id": member_id})
+        if stats is None or "affiliateCode" not in stats:
+            stats = await self.rebuild(member_id)
+            if stats is None:
+                return None
+
+        today = datetime.utcnow()
+        clicks_by_day = stats.get("clicksByDay") or {}
+        clicks = {
+            window: sum(clicks_by_day.get(day_key(today - timedelta(days=age)), 0) for age in range(days))
+            for window, days in CLICK_WINDOWS.items()
+        }
+        total_clicks = stats["totalClicks"]
+        return {
+            "affiliate_code": stats["affiliateCode"],
+            "referral_link": stats["referralLink"],
+            "total_referrals": stats["totalReferrals"],
+            "total_credits_earned": stats["totalCreditsEarned"],
+            "total_clicks": total_clicks,
+            "conversion_rate": round(stats["totalReferrals"] / total_clicks, 4) if total_clicks else 0.0,
+            "recent_referrals": stats["recentReferrals"],
+            "clicks": clicks,
+            "status": stats["status"]
+        }
@@ -234,6 +234,7 @@ class PerformerSearch(BaseModel):
     # Pagination
     page: int = Field(1, description="Page number", ge=1)
     limit: int = Field(20, description="Results per page", ge=1, le=100)
+    cursor: Optional[str] = Field(None, description="Continuation token from a previous page; replaces page")
 
 
 class TrialStatus(str, Enum):
@@ -9,14 +9,15 @@ from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from cryptography.fernet import Fernet
-import httpx
 from api_key_models import APIKeyType
+from http_client import OutboundHTTPClient, shared_http_client
 
 
 class CalendarIntegrationService:
-    def __init__(self, api_key_service, db):
+    def __init__(self, api_key_service, db, http_client: Optional[OutboundHTTPClient] = None):
         self.api_key_service = api_key_service
         self.db = db
+        self.http_client = http_client or shared_http_client
         self.cipher = self._get_cipher()
     
     def _get_cipher(self):
@@ -327,10 +328,11 @@ class CalendarIntegrationService:
 
 
 class MicrosoftCalendarService:
-    def __init__(self, api_key_service, db, cipher):
+    def __init__(self, api_key_service, db, cipher, http_client: Optional[OutboundHTTPClient] = None):
         self.api_key_service = api_key_service
         self.db = db
         self.cipher = cipher
+        self.http_client = http_client or shared_http_client
     
     async def get_access_token(self, user_id: str) -> Optional[str]:
         """Get Microsoft Graph access token for user"""
@@ -379,19 +381,19 @@ class MicrosoftCalendarService:
                 "Content-Type": "application/json"
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://graph.microsoft.com/v1.0/me/events",
-                    json=event_data,
-                    headers=headers
-                )
+            response = await self.http_client.post(
+                "microsoft_graph",
+                "https://graph.microsoft.com/v1.0/me/events",
+                json=event_data,
+                headers=headers
+            )
                 
-                if response.status_code == 201:
-                    event = response.json()
-                    return event['id']
-                else:
-                    print(f"Microsoft Graph API error: {response.text}")
-                    return None
+            if response.status_code == 201:
+                event = response.json()
+                return event['id']
+            else:
+                print(f"Microsoft Graph API error: {response.text}")
+                return None
             
         except Exception as error:
             print(f"Error creating Outlook event: {error}")
@@ -0,0 +1,87 @@
+import os
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Dict, Any
+from pymongo import UpdateOne
+from periodic_flusher import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+VIEW_COUNTER_FLUSH_SECONDS = float(os.environ.get("VIEW_COUNTER_FLUSH_SECONDS", "5"))
+VIEW_COUNTER_MAX_PENDING = int(os.environ.get("VIEW_COUNTER_MAX_PENDING", "5000"))
+
+
+class CounterBuffer(PeriodicFlusher):
+    """Write-behind counter: increments accumulate in memory and are flushed as one bulk_write of $inc ops"""
+
+    def __init__(self, collection, key_field: str, counter_field: str,
+                 flush_seconds: float = VIEW_COUNTER_FLUSH_SECONDS,
+                 max_pending: int = VIEW_COUNTER_MAX_PENDING):
+        self.collection = collection
+        self.key_field = key_field
+        self.counter_field = counter_field
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending: Counter = Counter()
+        self._pending_total = 0
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flushed_total = 0
+        self._flush_count = 0
+        self._failed_flushes = 0
+        self._last_flush_at: Optional[datetime] = None
+
+    @property
+    def pending_total(self) -> int:
+        """Increments accepted but not yet written"""
+        return self._pending_total
+
+    def add(self, key: str, amount: int = 1):
+        self._pending[key] += amount
+        self._pending_total += amount
+        if self._pending_total >= self.max_pending and not self._flush_lock.locked():
+            asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Write all pending increments; failed batches are returned to the buffer"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, total = self._pending, self._pending_total
+            self._pending, self._pending_total = Counter(), 0
+
+            now = datetime.utcnow()
+            operations = [
+                UpdateOne(
+                    {self.key_field: key},
+                    {"$inc": {self.counter_field: amount}, "$set": {"updated_at": now}}
+                )
+                for key, amount in batch.items()
+            ]
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except Exception as e:
+                self._failed_flushes += 1
+                self._pending.update(batch)
+                self._pending_total += total
+                logger.error(f"Failed to flush {total} buffered {self.counter_field} increments: {str(e)}")
+                return 0
+
+            self._flushed_total += total
+            self._flush_count += 1
+            self._last_flush_at = now
+            return total
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "pending_increments": self._pending_total,
+            "pending_keys": len(self._pending),
+            "flushed_increments": self._flushed_total,
+            "flushes": self._flush_count,
+            "failed_flushes": self._failed_flushes,
+            "last_flush_at": self._last_flush_at,
+            "flush_seconds": self.flush_seconds,
+            "max_pending": self.max_pending
+        }
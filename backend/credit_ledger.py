@@ -0,0 +1,216 @@
+import os
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from member_dashboard_cache import MemberDashboardCache, shared_dashboard_cache
+from periodic_flusher import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+CREDIT_OUTBOX_FLUSH_SECONDS = float(os.environ.get("CREDIT_OUTBOX_FLUSH_SECONDS", "1"))
+CREDIT_OUTBOX_BATCH_SIZE = int(os.environ.get("CREDIT_OUTBOX_BATCH_SIZE", "500"))
+
+# Transactions applied to a balance but not yet copied into credit_transactions
+OUTBOX_FIELD = "pendingTransactions"
+# Recent batch ids applied to an account, so a re-run batch is not credited twice
+APPLIED_BATCHES_FIELD = "appliedBatches"
+APPLIED_BATCH_HISTORY = 50
+DUPLICATE_KEY_ERROR = 11000
+
+
+class CreditLedger(PeriodicFlusher):
+    """Balance changes as single conditional updates, with their transaction records relayed from an outbox"""
+
+    def __init__(self, db, flush_seconds: float = CREDIT_OUTBOX_FLUSH_SECONDS,
+                 batch_size: int = CREDIT_OUTBOX_BATCH_SIZE,
+                 dashboard_cache: Optional[MemberDashboardCache] = None):
+        self.db = db
+        # Balance changes show on the member dashboard
+        self.dashboard_cache = dashboard_cache or shared_dashboard_cache
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        # user_id -> transactions waiting to be relayed, in the order they were applied
+        self._queue: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._queued = 0
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._counts = {"debits": 0, "rejected_debits": 0, "credits": 0, "relayed": 0, "failed_relays": 0}
+
+    async def ensure_indexes(self):
+        await self.db.credit_transactions.create_index([("id", ASCENDING)], unique=True, name="credit_txn_id")
+        await self.db.credit_accounts.create_index([("userId", ASCENDING)], unique=True, name="credit_account_user")
+
+    def _enqueue(self, user_id: str, transaction: Dict[str, Any]):
+        self._queue[user_id].append(transaction)
+        self._queued += 1
+        if self._task is not None and self._queued >= self.batch_size and not self._flush_lock.locked():
+            asyncio.get_running_loop().create_task(self.flush())
+
+    async def debit(self, user_id: str, amount: float, transaction: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Take `amount` from the balance only if it covers it; returns the updated account or None"""
+        now = datetime.utcnow()
+        account = await self.db.credit_accounts.find_one_and_update(
+            {"userId": user_id, "totalCredits": {"$gte": amount}},
+            {
+                "$inc": {"totalCredits": -amount, "lifetimeSpent": amount},
+                "$set": {"updatedAt": now},
+                "$push": {OUTBOX_FIELD: transaction}
+            },
+            projection={OUTBOX_FIELD: 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if account is None:
+            self._counts["rejected_debits"] += 1
+            return None
+        self._counts["debits"] += 1
+        self.dashboard_cache.invalidate(user_id)
+        await self._record(user_id, transaction)
+        return account
+
+    async def credit(self, user_id: str, amount: float, transaction: Dict[str, Any],
+                     account_defaults: Dict[str, Any]) -> Dict[str, Any]:
+        """Add `amount` to the balance, creating the account from `account_defaults` if needed"""
+        now = datetime.utcnow()
+        on_insert = {
+            key: value for key, value in account_defaults.items()
+            if key not in ("totalCredits", "lifetimeEarned", "updatedAt", "_id")
+        }
+        update = {
+            "$inc": {"totalCredits": amount, "lifetimeEarned": amount},
+            "$set": {"updatedAt": now},
+            "$setOnInsert": on_insert,
+            "$push": {OUTBOX_FIELD: transaction}
+        }
+        try:
+            account = await self.db.credit_accounts.find_one_and_update(
+                {"userId": user_id}, update, projection={OUTBOX_FIELD: 0},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent first credit created the account; this update now matches it
+            account = await self.db.credit_accounts.find_one_and_update(
+                {"userId": user_id}, update, projection={OUTBOX_FIELD: 0},
+                return_document=ReturnDocument.AFTER
+            )
+        self._counts["credits"] += 1
+        self.dashboard_cache.invalidate(user_id)
+        await self._record(user_id, transaction)
+        return account
+
+    async def credit_many(self, batch_id: str, credits: Dict[str, List[Dict[str, Any]]],
+                          account_defaults: Callable[[str], Dict[str, Any]]) -> int:
+        """Apply a batch of credit transactions with one upsert per user; re-running a batch is a no-op"""
+        now = datetime.utcnow()
+        updates = []
+        for user_id, transactions in credits.items():
+            amount = sum(txn["amount"] for txn in transactions)
+            on_insert = {
+                key: value for key, value in account_defaults(user_id).items()
+                if key not in ("totalCredits", "lifetimeEarned", "updatedAt", "_id")
+            }
+            updates.append((
+                {"userId": user_id, APPLIED_BATCHES_FIELD: {"$ne": batch_id}},
+                {
+                    "$inc": {"totalCredits": amount, "lifetimeEarned": amount},
+                    "$set": {"updatedAt": now},
+                    "$setOnInsert": on_insert,
+                    "$push": {
+                        OUTBOX_FIELD: {"$each": transactions},
+                        APPLIED_BATCHES_FIELD: {"$each": [batch_id], "$slice": -APPLIED_BATCH_HISTORY}
+                    }
+                }
+            ))
+
+        try:
+            await self.db.credit_accounts.bulk_write(
+                [UpdateOne(query, update, upsert=True) for query, update in updates], ordered=False
+            )
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            # An upsert collides with an existing account when it was created concurrently (apply it now)
+            # or already has this batch (the retry matches nothing)
+            await self.db.credit_accounts.bulk_write(
+                [UpdateOne(*updates[error["index"]]) for error in errors], ordered=False
+            )
+
+        self._counts["credits"] += sum(len(transactions) for transactions in credits.values())
+        self.dashboard_cache.invalidate_many(credits)
+        for user_id, transactions in credits.items():
+            for transaction in transactions:
+                self._enqueue(user_id, transaction)
+        if self._task is None:
+            await self.flush()
+        return len(updates)
+
+    async def _record(self, user_id: str, transaction: Dict[str, Any]):
+        self._enqueue(user_id, transaction)
+        if self._task is None:
+            # No relay running (e.g. a short-lived service instance): write the record now
+            await self.flush()
+
+    async def pending_transactions(self, user_id: str) -> List[Dict[str, Any]]:
+        """Transactions already applied to the balance whose records have not been relayed yet"""
+        account = await self.db.credit_accounts.find_one({"userId": user_id}, {"_id": 0, OUTBOX_FIELD: 1})
+        return (account or {}).get(OUTBOX_FIELD) or []
+
+    async def recover(self) -> int:
+        """Queue outbox entries left behind by a previous process"""
+        cursor = self.db.credit_accounts.find(
+            {f"{OUTBOX_FIELD}.0": {"$exists": True}}, {"_id": 0, "userId": 1, OUTBOX_FIELD: 1}
+        )
+        recovered = 0
+        async for account in cursor:
+            queued_ids = {txn["id"] for txn in self._queue.get(account["userId"], [])}
+            for transaction in account[OUTBOX_FIELD]:
+                if transaction["id"] not in queued_ids:
+                    self._enqueue(account["userId"], transaction)
+                    recovered += 1
+        return recovered
+
+    async def flush(self) -> int:
+        """Copy queued transactions into credit_transactions, then clear them from their accounts' outboxes"""
+        async with self._flush_lock:
+            if not self._queue:
+                return 0
+            batch, self._queue, self._queued = self._queue, defaultdict(list), 0
+            transactions = [txn for user_txns in batch.values() for txn in user_txns]
+            try:
+                try:
+                    # Records carry their own id, so re-relaying after a crash only hits duplicates
+                    await self.db.credit_transactions.insert_many(
+                        [dict(txn) for txn in transactions], ordered=False
+                    )
+                except BulkWriteError as e:
+                    if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                        raise
+                await self.db.credit_accounts.bulk_write([
+                    UpdateOne(
+                        {"userId": user_id},
+                        {"$pull": {OUTBOX_FIELD: {"id": {"$in": [txn["id"] for txn in user_txns]}}}}
+                    )
+                    for user_id, user_txns in batch.items()
+                ], ordered=False)
+            except Exception as e:
+                self._counts["failed_relays"] += 1
+                for user_id, user_txns in batch.items():
+                    self._queue[user_id][:0] = user_txns
+                    self._queued += len(user_txns)
+                logger.error(f"Failed to relay {len(transactions)} credit transactions: {str(e)}")
+                return 0
+
+            self._counts["relayed"] += len(transactions)
+            return len(transactions)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._counts,
+            "queued": self._queued,
+            "flush_seconds": self.flush_seconds,
+            "batch_size": self.batch_size
+        }
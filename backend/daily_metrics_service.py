@@ -0,0 +1,304 @@
+import os
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Set, Tuple
+from pymongo import ASCENDING, UpdateOne
+from periodic_flusher import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+DAILY_METRICS_FLUSH_SECONDS = float(os.environ.get("DAILY_METRICS_FLUSH_SECONDS", "10"))
+# Longest range served from the rollups; also how far back missing days are backfilled
+DAILY_METRICS_MAX_DAYS = 90
+# Analytics periods served from the rollups, in days
+ANALYTICS_PERIODS = {"7d": 7, "30d": 30, "90d": 90}
+# Per-user activity markers only need to outlive the day they count towards
+ACTIVE_MARKER_TTL_SECONDS = 2 * 24 * 3600
+
+# Counters kept on every daily_metrics document (registrations are nested per userType)
+DAILY_COUNTERS = (
+    "registrations_total", "active_users",
+    "credits_issued", "credits_spent", "credit_transactions",
+    "payouts_requested", "payouts_requested_amount",
+    "payouts_completed", "payouts_completed_amount"
+)
+
+
+def day_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+def _day_expression(field: str) -> Dict[str, Any]:
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": f"${field}"}}
+
+
+def _empty_day(day: str) -> Dict[str, Any]:
+    return {
+        "_id": day,
+        "date": datetime.strptime(day, "%Y-%m-%d"),
+        "registrations": {},
+        **{name: 0 for name in DAILY_COUNTERS}
+    }
+
+
+class DailyMetricsRollup(PeriodicFlusher):
+    """Per-day platform counters in daily_metrics, incremented from events and flushed in batches"""
+
+    def __init__(self, db=None, flush_seconds: float = DAILY_METRICS_FLUSH_SECONDS):
+        self.db = db
+        self.flush_seconds = flush_seconds
+        self._pending: Counter = Counter()
+        self._pending_active: Set[Tuple[str, str]] = set()
+        self._seen_active: Dict[str, Set[str]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._counts = {"flushes": 0, "failed_flushes": 0, "backfilled_days": 0}
+
+    def bind(self, db):
+        """Attach the database; events recorded before this are ignored"""
+        self.db = db
+
+    def _add(self, field: str, amount: float = 1, moment: Optional[datetime] = None):
+        if self.db is None:
+            return
+        self._pending[(day_key(moment or datetime.utcnow()), field)] += amount
+
+    def record_registration(self, user_type: str, moment: Optional[datetime] = None):
+        self._add(f"registrations.{user_type or 'unknown'}", 1, moment)
+        self._add("registrations_total", 1, moment)
+
+    def record_credit_transaction(self, amount: float, moment: Optional[datetime] = None):
+        """Positive amounts count as credits issued, negative ones as credits spent"""
+        if amount >= 0:
+            self._add("credits_issued", amount, moment)
+        else:
+            self._add("credits_spent", -amount, moment)
+        self._add("credit_transactions", 1, moment)
+
+    def record_payout_requested(self, amount: float, moment: Optional[datetime] = None):
+        self._add("payouts_requested", 1, moment)
+        self._add("payouts_requested_amount", amount, moment)
+
+    def record_payout_completed(self, amount: float, moment: Optional[datetime] = None):
+        self._add("payouts_completed", 1, moment)
+        self._add("payouts_completed_amount", amount, moment)
+
+    def record_active(self, user_id: str, moment: Optional[datetime] = None):
+        """Count a user once per day, across workers, towards active_users"""
+        if self.db is None or not user_id:
+            return
+        moment = moment or datetime.utcnow()
+        day = day_key(moment)
+        seen = self._seen_active.get(day)
+        if seen is None:
+            # Activity only arrives for the current day, so older days can be forgotten
+            previous_day = day_key(moment - timedelta(days=1))
+            self._seen_active = {d: users for d, users in self._seen_active.items() if d >= previous_day}
+            seen = self._seen_active[day] = set()
+        if user_id in seen:
+            return
+        seen.add(user_id)
+        self._pending_active.add((day, user_id))
+
+    async def ensure_indexes(self):
+        await self.db.daily_active_users.create_index(
+            [("created_at", ASCENDING)], expireAfterSeconds=ACTIVE_MARKER_TTL_SECONDS, name="daily_active_expiry"
+        )
+
+    async def _flush_active(self, active: Set[Tuple[str, str]]):
+        # One marker per (day, user): only markers this worker inserted count as newly active
+        now = datetime.utcnow()
+        result = await self.db.daily_active_users.bulk_write([
+            UpdateOne(
+                {"_id": f"{day}:{user_id}"},
+                {"$setOnInsert": {"day": day, "user_id": user_id, "created_at": now}},
+                upsert=True
+            )
+            for day, user_id in active
+        ], ordered=False)
+        inserted = Counter(active_id.split(":", 1)[0] for active_id in result.upserted_ids.values())
+        for day, count in inserted.items():
+            self._pending[(day, "active_users")] += count
+
+    async def flush(self) -> int:
+        """Write pending increments as one upsert per day; failed batches are returned to the buffer"""
+        async with self._flush_lock:
+            active, self._pending_active = self._pending_active, set()
+            if active:
+                try:
+                    await self._flush_active(active)
+                except Exception as e:
+                    self._pending_active |= active
+                    logger.error(f"Failed to record {len(active)} daily active users: {str(e)}")
+
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, Counter()
+            by_day: Dict[str, Dict[str, float]] = {}
+            for (day, field), amount in batch.items():
+                by_day.setdefault(day, {})[field] = amount
+
+            now = datetime.utcnow()
+            operations = [
+                UpdateOne(
+                    {"_id": day},
+                    {
+                        "$inc": increments,
+                        "$set": {"updated_at": now},
+                        "$setOnInsert": {"date": datetime.strptime(day, "%Y-%m-%d")}
+                    },
+                    upsert=True
+                )
+                for day, increments in by_day.items()
+            ]
+            try:
+                await self.db.daily_metrics.bulk_write(operations, ordered=False)
+            except Exception as e:
+                self._counts["failed_flushes"] += 1
+                self._pending.update(batch)
+                logger.error(f"Failed to flush daily metrics for {len(by_day)} days: {str(e)}")
+                return 0
+
+            self._counts["flushes"] += 1
+            return len(by_day)
+
+    async def _aggregate_by_day(self, collection, date_field: str, match: Dict[str, Any],
+                                group: Dict[str, Any]) -> List[Dict[str, Any]]:
+        key = {"day": _day_expression(date_field), **group.get("_id", {})}
+        accumulators = {name: value for name, value in group.items() if name != "_id"}
+        return await collection.aggregate([
+            {"$match": match},
+            {"$group": {"_id": key, **accumulators}}
+        ]).to_list(None)
+
+    async def backfill(self, days: int = DAILY_METRICS_MAX_DAYS) -> int:
+        """Build documents for past days that have none, from the source collections"""
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        wanted = [day_key(today - timedelta(days=offset)) for offset in range(days, 0, -1)]
+        existing = {
+            doc["_id"] async for doc in self.db.daily_metrics.find({"_id": {"$in": wanted}}, {"_id": 1})
+        }
+        missing = [day for day in wanted if day not in existing]
+        if not missing:
+            return 0
+
+        start = datetime.strptime(missing[0], "%Y-%m-%d")
+        in_range = {"$gte": start, "$lt": today}
+        docs = {day: _empty_day(day) for day in missing}
+
+        registrations, credits, requested, completed = await asyncio.gather(
+            self._aggregate_by_day(self.db.users, "createdAt", {"createdAt": in_range}, {
+                "_id": {"userType": "$userType"}, "count": {"$sum": 1}
+            }),
+            self._aggregate_by_day(self.db.credit_transactions, "createdAt", {"createdAt": in_range}, {
+                "issued": {"$sum": {"$cond": [{"$gte": ["$amount", 0]}, "$amount", 0]}},
+                "spent": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, {"$subtract": [0, "$amount"]}, 0]}},
+                "count": {"$sum": 1}
+            }),
+            self._aggregate_by_day(self.db.payout_requests, "createdAt", {"createdAt": in_range}, {
+                "amount": {"$sum": "$amount"}, "count": {"$sum": 1}
+            }),
+            self._aggregate_by_day(self.db.payout_requests, "completedAt", {"completedAt": in_range}, {
+                "amount": {"$sum": "$amount"}, "count": {"$sum": 1}
+            })
+        )
+        for bucket in registrations:
+            doc = docs.get(bucket["_id"]["day"])
+            if doc:
+                user_type = bucket["_id"].get("userType") or "unknown"
+                doc["registrations"][user_type] = doc["registrations"].get(user_type, 0) + bucket["count"]
+                doc["registrations_total"] += bucket["count"]
+        for bucket in credits:
+            doc = docs.get(bucket["_id"]["day"])
+            if doc:
+                doc.update(credits_issued=bucket["issued"], credits_spent=bucket["spent"],
+                           credit_transactions=bucket["count"])
+        for bucket in requested:
+            doc = docs.get(bucket["_id"]["day"])
+            if doc:
+                doc.update(payouts_requested=bucket["count"], payouts_requested_amount=bucket["amount"])
+        for bucket in completed:
+            doc = docs.get(bucket["_id"]["day"])
+            if doc:
+                doc.update(payouts_completed=bucket["count"], payouts_completed_amount=bucket["amount"])
+
+        # Past activity is not recoverable from lastSeen alone, so backfilled days carry no active_users
+        now = datetime.utcnow()
+        await self.db.daily_metrics.bulk_write([
+            UpdateOne({"_id": day}, {"$setOnInsert": {**doc, "backfilled": True, "updated_at": now}}, upsert=True)
+            for day, doc in docs.items()
+        ], ordered=False)
+        self._counts["backfilled_days"] += len(docs)
+        return len(docs)
+
+    async def get_range(self, days: int) -> Dict[str, Any]:
+        """Daily series and totals for the last `days` days including today, read from at most 90 documents"""
+        days = max(1, min(days, DAILY_METRICS_MAX_DAYS))
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        day_list = [day_key(today - timedelta(days=offset)) for offset in range(days - 1, -1, -1)]
+        stored = {
+            doc["_id"]: doc
+            async for doc in self.db.daily_metrics.find({"_id": {"$gte": day_list[0]}}).sort("_id", ASCENDING).limit(days)
+        }
+
+        series = []
+        totals = _empty_day(day_list[0])
+        for day in day_list:
+            doc = _empty_day(day)
+            source = stored.get(day, {})
+            doc["registrations"] = dict(source.get("registrations", {}))
+            for name in DAILY_COUNTERS:
+                doc[name] = source.get(name, 0)
+            series.append(doc)
+        by_day = {doc["_id"]: doc for doc in series}
+
+        # Increments still waiting for the next flush are included so the figures are current
+        for (day, field), amount in list(self._pending.items()):
+            doc = by_day.get(day)
+            if doc is None:
+                continue
+            if field.startswith("registrations."):
+                user_type = field.split(".", 1)[1]
+                doc["registrations"][user_type] = doc["registrations"].get(user_type, 0) + amount
+            else:
+                doc[field] = doc.get(field, 0) + amount
+
+        for doc in series:
+            for user_type, count in doc["registrations"].items():
+                totals["registrations"][user_type] = totals["registrations"].get(user_type, 0) + count
+            for name in DAILY_COUNTERS:
+                totals[name] += doc[name]
+        # Daily active counts do not add up to distinct users over the range
+        del totals["active_users"]
+        del totals["_id"], totals["date"]
+
+        return {
+            "days": days,
+            "start": day_list[0],
+            "end": day_list[-1],
+            "totals": totals,
+            "series": [{**{k: v for k, v in doc.items() if k != "_id"}, "day": doc["_id"]} for doc in series]
+        }
+
+    def start(self):
+        # An unbound instance has nowhere to write to
+        if self.db is not None:
+            super().start()
+
+    async def stop(self):
+        if self.db is not None:
+            await super().stop()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._counts,
+            "pending_counters": len(self._pending),
+            "pending_active": len(self._pending_active),
+            "flush_seconds": self.flush_seconds
+        }
+
+
+# Shared by every service instance so ad hoc services record into the same buffer
+shared_daily_metrics = DailyMetricsRollup()
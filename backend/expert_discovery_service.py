@@ -0,0 +1,347 @@
+from typing import Optional, Dict, Any, List
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, UpdateOne
+from api_key_models import ExpertiseCategory
+from text_search import build_search_tokens, query_tokens
+from keyset_pagination import encode_cursor, decode_cursor, keyset_filter
+from zip_centroid_service import ZipCentroidTable, geo_point, METERS_PER_KM, METERS_PER_MILE
+
+# Experts are user accounts; only active ones are discoverable
+EXPERT_QUERY = {"userType": "expert", "accountStatus": "active"}
+
+# experienceLevel filter -> inclusive years-of-experience band
+EXPERIENCE_BANDS = {
+    'entry': (0, 2),
+    'intermediate': (3, 7),
+    'experienced': (8, 15),
+    'expert': (16, 100)
+}
+
+# sortBy -> (field, direction); ties are broken on id in the same direction
+SORT_OPTIONS = {
+    'rating': ("averageRating", DESCENDING),
+    'price_low': ("consultationRate", ASCENDING),
+    'price_high': ("consultationRate", DESCENDING),
+    'experience': ("yearsOfExperience", DESCENDING)
+}
+DEFAULT_SORT = ("id", ASCENDING)
+
+# Sort and filter fields are backfilled on expert documents and set when an expert is approved or edited;
+# discovery still matches documents written without them (missing values are pinned as None below)
+DISCOVERY_FIELD_DEFAULTS = {"averageRating": 0.0, "consultationRate": 0.0, "yearsOfExperience": 0, "isOnline": False}
+
+# Unfiltered equality fields are pinned to every possible value so MongoDB can merge
+# the per-value index ranges in sort order instead of sorting in memory
+CATEGORY_VALUES = [category.value for category in ExpertiseCategory] + [None]
+ONLINE_VALUES = [True, False, None]
+
+MAX_DISCOVERY_LIMIT = 100
+BACKFILL_BATCH_SIZE = 1000
+
+# Location search radius is in miles
+DEFAULT_RADIUS_MILES = 25
+FEATURED_MIN_RATING = 4.8
+FEATURED_LIMIT = 3
+
+# Case-insensitive matching for city/state lookups
+LOCATION_COLLATION = {"locale": "en", "strength": 2}
+
+DISCOVERY_PREFIX = [
+    ("userType", ASCENDING), ("accountStatus", ASCENDING),
+    ("expertiseCategory", ASCENDING), ("isOnline", ASCENDING)
+]
+DISCOVERY_INDEXES = {
+    # yearsOfExperience trails the sort keys so the experience band is filtered from the index
+    "expert_discover_default": DISCOVERY_PREFIX + [("id", ASCENDING), ("yearsOfExperience", ASCENDING)],
+    "expert_discover_rating": DISCOVERY_PREFIX + [("averageRating", DESCENDING), ("id", DESCENDING),
+                                                  ("yearsOfExperience", ASCENDING)],
+    "expert_discover_rate": DISCOVERY_PREFIX + [("consultationRate", ASCENDING), ("id", ASCENDING),
+                                                ("yearsOfExperience", ASCENDING)],
+    "expert_discover_experience": DISCOVERY_PREFIX + [("yearsOfExperience", DESCENDING), ("id", DESCENDING)]
+}
+
+# Expert fields that feed searchTokens; bump the version when the derivation changes
+EXPERT_SEARCH_SOURCE_FIELDS = ("displayName", "firstName", "lastName", "title", "specializations", "bio")
+SEARCH_FIELDS_VERSION = 1
+
+
+def expert_search_fields(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Search tokens for an expert user: names and specializations by prefix, bio by whole word"""
+    return {
+        "searchTokens": build_search_tokens(
+            [user.get("displayName"), user.get("firstName"), user.get("lastName"),
+             user.get("title"), user.get("specializations")],
+            [user.get("bio")]
+        ),
+        "searchVersion": SEARCH_FIELDS_VERSION
+    }
+
+
+def expert_discovery_fields(user: Dict[str, Any], zip_centroids: Optional[ZipCentroidTable] = None) -> Dict[str, Any]:
+    """Discovery defaults, search tokens and coordinates an expert document is missing"""
+    fields = {field: default for field, default in DISCOVERY_FIELD_DEFAULTS.items() if user.get(field) is None}
+    if user.get("searchVersion") != SEARCH_FIELDS_VERSION:
+        fields.update(expert_search_fields(user))
+    location = user.get("location")
+    if zip_centroids and user.get("geo") is None and isinstance(location, dict):
+        point = zip_centroids.point(location.get("zipCode"), location.get("city"), location.get("state"))
+        if point:
+            fields["geo"] = point
+    return fields
+
+
+class ExpertDiscoveryService:
+    """Expert discovery over the users collection with index-backed filters and keyset pagination"""
+
+    def __init__(self, db, zip_centroids: Optional[ZipCentroidTable] = None):
+        self.db = db
+        self.zip_centroids = zip_centroids
+
+    async def ensure_indexes(self):
+        """Backfill discovery fields and create the discovery indexes"""
+        for field, default in DISCOVERY_FIELD_DEFAULTS.items():
+            await self.db.users.update_many(
+                {"userType": "expert", field: None},
+                {"$set": {field: default}}
+            )
+
+        for name, keys in DISCOVERY_INDEXES.items():
+            await self.db.users.create_index(keys, name=name)
+
+        await self.db.users.create_index(
+            [("userType", ASCENDING), ("accountStatus", ASCENDING), ("location.zipCode", ASCENDING)],
+            name="expert_location_zip"
+        )
+        await self.db.users.create_index(
+            [("userType", ASCENDING), ("accountStatus", ASCENDING), ("location.city", ASCENDING),
+             ("location.state", ASCENDING)],
+            name="expert_location_city", collation=LOCATION_COLLATION
+        )
+        await self.db.users.create_index(
+            [("userType", ASCENDING), ("accountStatus", ASCENDING), ("location.state", ASCENDING)],
+            name="expert_location_state", collation=LOCATION_COLLATION
+        )
+        await self.db.users.create_index(
+            [("userType", ASCENDING), ("accountStatus", ASCENDING), ("isVerified", ASCENDING),
+             ("averageRating", DESCENDING)],
+            name="expert_featured"
+        )
+        await self.db.users.create_index(
+            [("geo", GEOSPHERE), ("userType", ASCENDING), ("accountStatus", ASCENDING)],
+            name="expert_geo"
+        )
+        await self.db.users.create_index(
+            [("userType", ASCENDING), ("accountStatus", ASCENDING), ("searchTokens", ASCENDING)],
+            name="expert_search_tokens"
+        )
+        await self.backfill_geo()
+        await self.backfill_search_tokens()
+
+    async def backfill_search_tokens(self):
+        """Index expert names, specializations and bios for text search"""
+        projection = {"_id": 0, "id": 1, **{field: 1 for field in EXPERT_SEARCH_SOURCE_FIELDS}}
+        cursor = self.db.users.find({"userType": "expert", "searchVersion": {"$ne": SEARCH_FIELDS_VERSION}}, projection)
+        operations = []
+        async for doc in cursor:
+            operations.append(UpdateOne({"id": doc["id"]}, {"$set": expert_search_fields(doc)}))
+            if len(operations) >= BACKFILL_BATCH_SIZE:
+                await self.db.users.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.db.users.bulk_write(operations, ordered=False)
+
+    async def backfill_geo(self):
+        """Place experts that have a location but no coordinates at their zip or city centroid"""
+        if not self.zip_centroids:
+            return
+
+        cursor = self.db.users.find(
+            {"userType": "expert", "geo": None, "location": {"$type": "object"}},
+            {"_id": 0, "id": 1, "location": 1}
+        )
+        operations = []
+        async for doc in cursor:
+            point = self.location_point(doc["location"])
+            if point:
+                operations.append(UpdateOne({"id": doc["id"]}, {"$set": {"geo": point}}))
+            if len(operations) >= BACKFILL_BATCH_SIZE:
+                await self.db.users.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.db.users.bulk_write(operations, ordered=False)
+
+    def location_point(self, location: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """GeoJSON point for a user location dict ({city, state, zipCode})"""
+        if not self.zip_centroids or not isinstance(location, dict):
+            return None
+        return self.zip_centroids.point(location.get("zipCode"), location.get("city"), location.get("state"))
+
+    # =============================================================================
+    # DISCOVERY
+    # =============================================================================
+
+    def build_discovery_query(self, category: Optional[str] = None, status: Optional[str] = None,
+                              experience_level: Optional[str] = None, search: Optional[str] = None) -> Dict[str, Any]:
+        """Translate discovery filters into a query shaped for the discovery indexes"""
+        query = dict(EXPERT_QUERY)
+        query["expertiseCategory"] = category if category and category != 'all' else {"$in": CATEGORY_VALUES}
+
+        if status == 'online':
+            query["isOnline"] = True
+        elif status == 'offline':
+            query["isOnline"] = False
+        else:
+            query["isOnline"] = {"$in": ONLINE_VALUES}
+
+        if experience_level in EXPERIENCE_BANDS:
+            min_exp, max_exp = EXPERIENCE_BANDS[experience_level]
+            query["yearsOfExperience"] = {"$gte": min_exp, "$lte": max_exp}
+
+        tokens = query_tokens(search)
+        if tokens:
+            query["searchTokens"] = {"$all": tokens}
+
+        return query
+
+    async def discover_experts(self, category: Optional[str] = None, status: Optional[str] = None,
+                               experience_level: Optional[str] = None, sort_by: Optional[str] = None,
+                               limit: int = 50, cursor: Optional[str] = None,
+                               search: Optional[str] = None) -> Dict[str, Any]:
+        """Return one page of experts and the cursor for the next page"""
+        limit = max(1, min(limit, MAX_DISCOVERY_LIMIT))
+        sort_field, direction = SORT_OPTIONS.get(sort_by, DEFAULT_SORT)
+
+        query = self.build_discovery_query(category, status, experience_level, search)
+        if cursor:
+            value, expert_id = decode_cursor(cursor, sort_field)
+            query = {"$and": [query, keyset_filter(sort_field, direction, value, expert_id)]}
+
+        sort = [(sort_field, direction)]
+        if sort_field != "id":
+            sort.append(("id", direction))
+
+        # Fetch one extra document to learn whether another page exists
+        docs = await self.db.users.find(query, {"_id": 0}).sort(sort).limit(limit + 1).to_list(limit + 1)
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+
+        next_cursor = None
+        if has_more:
+            last = docs[-1]
+            next_cursor = encode_cursor(sort_field, last.get(sort_field), last["id"])
+
+        return {
+            "experts": [self._format_expert(doc) for doc in docs],
+            "next_cursor": next_cursor
+        }
+
+    async def search_by_location(self, zip_code: Optional[str] = None, city: Optional[str] = None,
+                                 state: Optional[str] = None, category: Optional[str] = None,
+                                 radius_miles: Optional[float] = DEFAULT_RADIUS_MILES,
+                                 limit: int = 50) -> Dict[str, Any]:
+        """Find experts within a radius of a zip code or city, nearest first"""
+        query = dict(EXPERT_QUERY)
+        if category:
+            query["expertiseCategory"] = category
+        limit = max(1, min(limit, MAX_DISCOVERY_LIMIT))
+
+        origin = None
+        if self.zip_centroids and (zip_code or city):
+            origin = self.zip_centroids.lookup(zip_code, city, state)
+
+        if origin:
+            geo_near = {
+                "near": geo_point(origin["latitude"], origin["longitude"]),
+                "distanceField": "distance_m",
+                "spherical": True,
+                "key": "geo",
+                "query": query
+            }
+            if radius_miles:
+                geo_near["maxDistance"] = radius_miles * METERS_PER_MILE
+            docs = await self.db.users.aggregate([
+                {"$geoNear": geo_near},
+                {"$limit": limit},
+                {"$project": {"_id": 0}}
+            ]).to_list(limit)
+        else:
+            # Locations outside the centroid table fall back to exact matching
+            collation = None
+            if zip_code:
+                query["location.zipCode"] = zip_code
+            elif city or state:
+                if city:
+                    query["location.city"] = city
+                if state:
+                    query["location.state"] = state
+                collation = LOCATION_COLLATION
+            docs = await self.db.users.find(query, {"_id": 0}, collation=collation).sort(
+                [("averageRating", DESCENDING), ("id", DESCENDING)]
+            ).limit(limit).to_list(limit)
+
+        results = []
+        for doc in docs:
+            expert = self._format_expert(doc)
+            distance_m = doc.get("distance_m")
+            results.append({
+                "id": expert["id"],
+                "name": expert["name"],
+                "specialty": expert["specialty"],
+                "location": {
+                    "city": expert["location"]["city"],
+                    "state": expert["location"]["state"],
+                    "zip": expert["location"]["zipCode"]
+                },
+                "distance": round(distance_m / METERS_PER_MILE, 1) if distance_m is not None else None,
+                "distance_km": round(distance_m / METERS_PER_KM, 1) if distance_m is not None else None,
+                "hourly_rate": expert["consultationRate"]
+            })
+        return {"experts": results, "origin": origin}
+
+    async def get_featured_experts(self, limit: int = FEATURED_LIMIT) -> List[Dict[str, Any]]:
+        """Highest-rated verified experts"""
+        docs = await self.db.users.find(
+            {**EXPERT_QUERY, "isVerified": True, "averageRating": {"$gte": FEATURED_MIN_RATING}},
+            {"_id": 0}
+        ).sort("averageRating", DESCENDING).limit(limit).to_list(limit)
+
+        return [
+            {
+                "id": doc.get("id"),
+                "name": self._expert_name(doc),
+                "title": doc.get("title"),
+                "category": doc.get("expertiseCategory"),
+                "rating": doc.get("averageRating", 0.0),
+                "consultations": doc.get("totalConsultations", 0),
+                "rate": doc.get("consultationRate", 0.0),
+                "image": doc.get("profileImage")
+            }
+            for doc in docs
+        ]
+
+    @staticmethod
+    def _expert_name(doc: Dict[str, Any]) -> str:
+        return doc.get("displayName") or f"{doc.get('firstName') or ''} {doc.get('lastName') or ''}".strip()
+
+    def _format_expert(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape an expert user document for discovery results"""
+        location = doc.get("location") if isinstance(doc.get("location"), dict) else {}
+        specializations = doc.get("specializations") or []
+        return {
+            "id": doc.get("id"),
+            "name": self._expert_name(doc),
+            "category": doc.get("expertiseCategory"),
+            "specialty": doc.get("specialty") or (specializations[0] if specializations else None),
+            "location": {
+                "city": location.get("city"),
+                "state": location.get("state"),
+                "zipCode": location.get("zipCode")
+            },
+            "experienceLevel": doc.get("expertiseLevel"),
+            "yearsOfExperience": doc.get("yearsOfExperience", 0),
+            "isOnline": doc.get("isOnline", False),
+            "rating": doc.get("averageRating", 0.0),
+            "consultationRate": doc.get("consultationRate", 0.0),
+            "profileImage": doc.get("profileImage"),
+            "credentials": doc.get("credentials", []),
+            "availableFor": doc.get("availableFor", [])
+        }
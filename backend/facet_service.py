@@ -0,0 +1,103 @@
+import asyncio
+import time
+from collections import Counter
+from enum import Enum
+from typing import Optional, Dict, Any, List
+
+# Profiles counted in the search sidebar
+VISIBLE_QUERY = {"show_in_search": True, "account_status": "active"}
+
+# Filter option key -> (profile field, whether the field is an array)
+FACET_FIELDS = {
+    "genders": ("gender", False),
+    "sexual_preferences": ("sexual_preference", False),
+    "ethnicities": ("ethnicity", False),
+    "body_types": ("body_type", False),
+    "hair_colors": ("hair_color", False),
+    "eye_colors": ("eye_color", False),
+    "languages": ("languages", True),
+    "specialties": ("specialties", True)
+}
+FACET_SOURCE_FIELDS = tuple(field for field, _ in FACET_FIELDS.values()) + tuple(VISIBLE_QUERY)
+
+# Most common values offered per facet
+FACET_VALUE_LIMIT = 50
+# Incremental updates keep counts current; a periodic full recount corrects any drift
+FACET_REFRESH_SECONDS = 900
+
+
+class PerformerFacetCounts:
+    """Per-value counts for the search filter sidebar, computed in one $facet pass and updated on writes"""
+
+    def __init__(self, db, refresh_seconds: int = FACET_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self._counts: Optional[Dict[str, Counter]] = None
+        self._computed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _is_visible(doc: Optional[Dict[str, Any]]) -> bool:
+        return bool(doc) and all(doc.get(field) == value for field, value in VISIBLE_QUERY.items())
+
+    @staticmethod
+    def _values(doc: Dict[str, Any], field: str, is_array: bool) -> List[Any]:
+        value = doc.get(field)
+        values = (value or []) if is_array else [value]
+        # Model dumps hold Enum members; count them under the stored value, as refresh() does
+        return [item.value if isinstance(item, Enum) else item for item in values if item]
+
+    async def refresh(self):
+        """Recount every facet with a single aggregation"""
+        facets = {}
+        for key, (field, is_array) in FACET_FIELDS.items():
+            stages = [{"$unwind": f"${field}"}] if is_array else []
+            stages.append({"$group": {"_id": f"${field}", "count": {"$sum": 1}}})
+            facets[key] = stages
+
+        results = await self.db.performer_profiles.aggregate([
+            {"$match": VISIBLE_QUERY},
+            {"$facet": facets}
+        ]).to_list(1)
+        buckets = results[0] if results else {}
+
+        self._counts = {
+            key: Counter({bucket["_id"]: bucket["count"] for bucket in buckets.get(key, []) if bucket["_id"]})
+            for key in FACET_FIELDS
+        }
+        self._computed_at = time.monotonic()
+
+    async def get(self) -> Dict[str, Counter]:
+        """Current counts, recounting when missing or past the refresh interval"""
+        if self._counts is None or time.monotonic() - self._computed_at > self.refresh_seconds:
+            async with self._lock:
+                if self._counts is None or time.monotonic() - self._computed_at > self.refresh_seconds:
+                    await self.refresh()
+        return self._counts
+
+    def apply_change(self, old_doc: Optional[Dict[str, Any]], new_doc: Optional[Dict[str, Any]]):
+        """Move counts from a profile's previous state to its new state"""
+        if self._counts is None:
+            return
+        for key, (field, is_array) in FACET_FIELDS.items():
+            counts = self._counts[key]
+            if self._is_visible(old_doc):
+                for value in self._values(old_doc, field, is_array):
+                    counts[value] -= 1
+                    if counts[value] <= 0:
+                        del counts[value]
+            if self._is_visible(new_doc):
+                for value in self._values(new_doc, field, is_array):
+                    counts[value] += 1
+
+    async def get_options(self) -> Dict[str, Any]:
+        """Option lists (alphabetical) and per-value counts for every facet"""
+        counts = await self.get()
+        options = {}
+        facet_counts = {}
+        for key, counter in counts.items():
+            top = counter.most_common(FACET_VALUE_LIMIT)
+            options[key] = sorted(str(value) for value, _ in top)
+            facet_counts[key] = {str(value): count for value, count in sorted(top, key=lambda item: str(item[0]))}
+        options["facet_counts"] = facet_counts
+        return options
@@ -0,0 +1,77 @@
+import os
+import re
+import mimetypes
+from typing import Optional, Tuple, AsyncIterator
+import aiofiles
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) byte range of a single-range header, None to send the whole file"""
+    if not range_header:
+        return None
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        # Malformed or multi-range requests fall back to the full file
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), file_size - 1) if last else file_size - 1
+    else:
+        # Suffix range: the final N bytes
+        start = max(file_size - int(last), 0)
+        end = file_size - 1
+    if start >= file_size or start > end:
+        raise ValueError("Requested range not satisfiable")
+    return start, end
+
+
+async def iter_file_range(path: str, start: int, end: int,
+                          chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read bytes start..end (inclusive) of a file in fixed-size chunks"""
+    async with aiofiles.open(path, 'rb') as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(path: str, range_header: Optional[str] = None,
+                         filename: Optional[str] = None) -> StreamingResponse:
+    """Stream a local file, honouring a Range header with a 206 partial response"""
+    file_size = os.path.getsize(path)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {"Accept-Ranges": "bytes"}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    try:
+        byte_range = parse_range_header(range_header, file_size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{file_size}"})
+
+    if byte_range is None:
+        start, end, status_code = 0, file_size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
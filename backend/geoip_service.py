@@ -0,0 +1,239 @@
+import os
+import sys
+import csv
+import socket
+import json
+import mmap
+import struct
+import bisect
+import ipaddress
+from typing import Optional, Dict, Any, List, Tuple
+from cachetools import LRUCache
+from access_control_models import Location
+
+# Compiled database layout (columnar so each column can be bisected directly
+# from the memory map):
+#   header       - magic, IPv4 and IPv6 range counts, offset and length of the location table
+#   v4 starts    - uint32 (little-endian) start address of each IPv4 range, sorted ascending
+#   v4 ends      - uint32 end address of each IPv4 range
+#   v4 indexes   - uint32 index into the location table for each IPv4 range
+#   v6 starts    - 16-byte big-endian start address of each IPv6 range, sorted ascending
+#   v6 ends      - 16-byte big-endian end address of each IPv6 range
+#   v6 indexes   - uint32 index into the location table for each IPv6 range
+#   locations    - JSON array of the distinct locations referenced by the ranges
+GEOIP_MAGIC = b"EXGEOIP3"
+HEADER_FORMAT = "<8sIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+COLUMN_ITEM_SIZE = 4
+V6_ITEM_SIZE = 16
+
+LOCATION_FIELDS = ["country", "country_code", "state", "state_code", "city", "zip_code", "latitude", "longitude"]
+
+
+def _ip_to_int(value: str) -> Optional[Tuple[int, int]]:
+    """Convert an IP address to (version, integer); IPv4-mapped IPv6 addresses count as IPv4"""
+    value = value.strip()
+    try:
+        return 4, struct.unpack("!I", socket.inet_pton(socket.AF_INET, value))[0]
+    except OSError:
+        pass
+    if value.isdigit():
+        return 4, int(value)
+    try:
+        ip = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.version, int(ip)
+
+
+class _V6Column:
+    """Sequence of 128-bit integers over a column of 16-byte big-endian addresses, for bisect"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+
+    def __len__(self) -> int:
+        return len(self._view) // V6_ITEM_SIZE
+
+    def __getitem__(self, index: int) -> int:
+        offset = index * V6_ITEM_SIZE
+        return int.from_bytes(self._view[offset:offset + V6_ITEM_SIZE], "big")
+
+    def release(self):
+        self._view.release()
+
+
+def compile_geoip_csv(csv_path: str, db_path: str) -> int:
+    """Compile a CSV of IP ranges into the sorted binary lookup file; returns the number of ranges"""
+    locations: List[Dict[str, Any]] = []
+    location_index: Dict[tuple, int] = {}
+    records: Dict[int, List[tuple]] = {4: [], 6: []}
+
+    with open(csv_path, newline="") as f:
+        for row in csv.DictReader(f):
+            start = _ip_to_int(row["start_ip"])
+            end = _ip_to_int(row["end_ip"])
+            if start is None or end is None or start[0] != end[0] or end[1] < start[1]:
+                raise ValueError(f"Invalid IP range: {row['start_ip']} - {row['end_ip']}")
+
+            location = {}
+            for field in LOCATION_FIELDS:
+                value = (row.get(field) or "").strip()
+                if field in ("latitude", "longitude"):
+                    location[field] = float(value) if value else None
+                else:
+                    location[field] = value or None
+
+            key = tuple(location[field] for field in LOCATION_FIELDS)
+            if key not in location_index:
+                location_index[key] = len(locations)
+                locations.append(location)
+            records[start[0]].append((start[1], end[1], location_index[key]))
+
+    for version, ranges in records.items():
+        ranges.sort()
+        for previous, current in zip(ranges, ranges[1:]):
+            if current[0] <= previous[1]:
+                start_ip = ipaddress.IPv4Address(current[0]) if version == 4 else ipaddress.IPv6Address(current[0])
+                raise ValueError(f"Overlapping IP ranges starting at {start_ip}")
+
+    v4, v6 = records[4], records[6]
+    location_blob = json.dumps(locations).encode("utf-8")
+    locations_offset = (HEADER_SIZE + len(v4) * COLUMN_ITEM_SIZE * 3
+                        + len(v6) * (V6_ITEM_SIZE * 2 + COLUMN_ITEM_SIZE))
+
+    # Write to a temporary file and swap it in so readers never see a partial database
+    tmp_path = f"{db_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack(HEADER_FORMAT, GEOIP_MAGIC, len(v4), len(v6), locations_offset, len(location_blob)))
+        for column in range(3):
+            f.write(struct.pack(f"<{len(v4)}I", *(record[column] for record in v4)))
+        for column in range(2):
+            f.write(b"".join(record[column].to_bytes(V6_ITEM_SIZE, "big") for record in v6))
+        f.write(struct.pack(f"<{len(v6)}I", *(record[2] for record in v6)))
+        f.write(location_blob)
+    os.replace(tmp_path, db_path)
+
+    return len(v4) + len(v6)
+
+
+class GeoIPResolver:
+    """Offline IP-to-location lookups against a memory-mapped range table"""
+
+    def __init__(self, csv_path: str, db_path: str, cache_size: int = 10000):
+        self.csv_path = csv_path
+        self.db_path = db_path
+        self.cache = LRUCache(maxsize=cache_size) if cache_size else None
+        self._file = None
+        self._mmap = None
+        self._view = None
+        self._starts = None
+        self._ends = None
+        self._indexes = None
+        self._v6_starts = None
+        self._v6_ends = None
+        self._v6_indexes = None
+        self._locations: List[Location] = []
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._mmap is not None
+
+    def open(self, _recompiled: bool = False):
+        """Compile the CSV if the binary file is missing or stale, then memory-map it"""
+        if os.path.exists(self.csv_path) and (
+            not os.path.exists(self.db_path)
+            or os.path.getmtime(self.db_path) < os.path.getmtime(self.csv_path)
+        ):
+            compile_geoip_csv(self.csv_path, self.db_path)
+
+        self.close()
+        self._file = open(self.db_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic = self._mmap[:len(GEOIP_MAGIC)]
+        if magic != GEOIP_MAGIC:
+            self.close()
+            if not _recompiled and os.path.exists(self.csv_path):
+                # Built by an older layout version; rebuild from the source CSV
+                compile_geoip_csv(self.csv_path, self.db_path)
+                return self.open(_recompiled=True)
+            raise ValueError(f"{self.db_path} is not a compiled GeoIP database")
+        _, count, v6_count, locations_offset, locations_length = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+
+        location_blob = self._mmap[locations_offset:locations_offset + locations_length]
+        self._locations = [Location(**location) for location in json.loads(location_blob)]
+
+        # Zero-copy uint32 views over each column; bisect runs on them directly
+        self._view = memoryview(self._mmap)
+        column_size = count * COLUMN_ITEM_SIZE
+        columns = [
+            self._view[HEADER_SIZE + i * column_size:HEADER_SIZE + (i + 1) * column_size].cast("I")
+            for i in range(3)
+        ]
+        v6_offset = HEADER_SIZE + 3 * column_size
+        v6_size = v6_count * V6_ITEM_SIZE
+        self._v6_starts = _V6Column(self._view[v6_offset:v6_offset + v6_size])
+        self._v6_ends = _V6Column(self._view[v6_offset + v6_size:v6_offset + 2 * v6_size])
+        v6_indexes_offset = v6_offset + 2 * v6_size
+        columns.append(self._view[v6_indexes_offset:v6_indexes_offset + v6_count * COLUMN_ITEM_SIZE].cast("I"))
+        if sys.byteorder != "little":
+            columns = [column.tolist() for column in columns]
+        self._starts, self._ends, self._indexes, self._v6_indexes = columns
+        if self.cache is not None:
+            self.cache.clear()
+
+    def close(self):
+        """Release the memory map"""
+        for column in (self._starts, self._ends, self._indexes, self._v6_indexes):
+            if isinstance(column, memoryview):
+                column.release()
+        for column in (self._v6_starts, self._v6_ends):
+            if column is not None:
+                column.release()
+        self._starts = self._ends = self._indexes = None
+        self._v6_starts = self._v6_ends = self._v6_indexes = None
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _lookup(self, ip: Tuple[int, int]) -> Optional[Location]:
+        """Binary search for the range containing the address"""
+        version, ip_int = ip
+        if version == 4:
+            starts, ends, indexes = self._starts, self._ends, self._indexes
+        else:
+            starts, ends, indexes = self._v6_starts, self._v6_ends, self._v6_indexes
+        index = bisect.bisect_right(starts, ip_int) - 1
+        if index < 0:
+            return None
+        if ip_int > ends[index]:
+            return None
+        return self._locations[indexes[index]]
+
+    def resolve(self, ip_address: str) -> Optional[Location]:
+        """Resolve an IP address to a location, or None when it is unknown"""
+        if not self.is_loaded:
+            return None
+
+        if self.cache is not None and ip_address in self.cache:
+            return self.cache[ip_address]
+
+        ip = _ip_to_int(ip_address)
+        location = self._lookup(ip) if ip is not None else None
+
+        if self.cache is not None:
+            self.cache[ip_address] = location
+        return location
+
+    def resolve_many(self, ip_addresses: List[str]) -> Dict[str, Optional[Location]]:
+        """Resolve a batch of IP addresses"""
+        return {ip_address: self.resolve(ip_address) for ip_address in ip_addresses}
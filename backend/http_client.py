@@ -0,0 +1,166 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, AsyncIterator
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package (httpx[http2]); without it connections stay on HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "30"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "2"))
+HTTP_RETRY_BACKOFF_SECONDS = float(os.environ.get("HTTP_RETRY_BACKOFF_SECONDS", "0.25"))
+
+# Only requests that are safe to repeat are retried unless the caller opts in
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+LATENCY_SAMPLE_SIZE = 500
+
+
+class _ProviderStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latencies_ms = deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies_ms)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99)
+        }
+
+
+class OutboundHTTPClient:
+    """One pooled httpx.AsyncClient shared by every outbound integration, with retries and per-provider latency"""
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT_SECONDS,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT_SECONDS,
+                 max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                 max_retries: int = HTTP_MAX_RETRIES,
+                 retry_backoff: float = HTTP_RETRY_BACKOFF_SECONDS):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+        )
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._client: Optional[httpx.AsyncClient] = None
+        self._stats: Dict[str, _ProviderStats] = {}
+
+    def start(self):
+        """Open the connection pool"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=self.timeout,
+                limits=self.limits
+            )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The pooled client, opened on first use if start() has not run"""
+        self.start()
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _provider_stats(self, provider: str) -> _ProviderStats:
+        if provider not in self._stats:
+            self._stats[provider] = _ProviderStats()
+        return self._stats[provider]
+
+    def _backoff(self, attempt: int) -> float:
+        # Exponential backoff with jitter so retries from concurrent requests spread out
+        return self.retry_backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    async def request(self, provider: str, method: str, url: str,
+                      retry: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """Send a request; transport errors and 429/502/503/504 are retried for idempotent methods (or retry=True)"""
+        method = method.upper()
+        retryable = method in IDEMPOTENT_METHODS if retry is None else retry
+        attempts = 1 + (self.max_retries if retryable else 0)
+        stats = self._provider_stats(provider)
+
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            stats.requests += 1
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                stats.errors += 1
+                stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+                if attempt + 1 >= attempts:
+                    raise
+                logger.warning(f"{provider} {method} request failed ({type(e).__name__}), retrying")
+            else:
+                stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 500:
+                    stats.errors += 1
+                if response.status_code not in RETRY_STATUS_CODES or attempt + 1 >= attempts:
+                    return response
+                logger.warning(f"{provider} {method} returned {response.status_code}, retrying")
+            stats.retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def get(self, provider: str, url: str, **kwargs) -> httpx.Response:
+        return await self.request(provider, "GET", url, **kwargs)
+
+    async def post(self, provider: str, url: str, **kwargs) -> httpx.Response:
+        return await self.request(provider, "POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, provider: str, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streamed response on the shared pool; latency is measured to the response headers"""
+        stats = self._provider_stats(provider)
+        stats.requests += 1
+        started = time.perf_counter()
+        try:
+            async with self.client.stream(method.upper(), url, **kwargs) as response:
+                stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 500:
+                    stats.errors += 1
+                yield response
+        except httpx.TransportError:
+            stats.errors += 1
+            raise
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "providers": {provider: stats.snapshot() for provider, stats in sorted(self._stats.items())}
+        }
+
+
+# Process-wide client; started and closed with the app
+shared_http_client = OutboundHTTPClient()
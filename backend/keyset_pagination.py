@@ -0,0 +1,40 @@
+import base64
+import binascii
+from typing import Any, Dict, Tuple
+from bson import json_util
+from pymongo import ASCENDING
+
+
+def encode_cursor(sort_field: str, value: Any, last_id: str) -> str:
+    """Encode the last seen sort position as an opaque continuation token"""
+    raw = json_util.dumps([sort_field, value, last_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort_field: str) -> Tuple[Any, str]:
+    """Decode a continuation token; it must belong to the requested sort order"""
+    try:
+        field, value, last_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+    if field != sort_field:
+        raise ValueError("Cursor does not match the requested sort order")
+    return value, last_id
+
+
+def keyset_filter(sort_field: str, direction: int, value: Any, last_id: str, id_field: str = "id") -> Dict[str, Any]:
+    """Filter for documents strictly after the cursor position in (sort_field, id_field) order"""
+    ascending = direction == ASCENDING
+    if sort_field == id_field:
+        return {id_field: {"$gt" if ascending else "$lt": last_id}}
+    # Missing and null sort values order before every other value, and range operators never
+    # match them across types, so the null band is bounded separately
+    if value is None:
+        null_tail = {sort_field: None, id_field: {"$gt" if ascending else "$lt": last_id}}
+        return {"$or": [null_tail, {sort_field: {"$ne": None}}]} if ascending else null_tail
+    # Range bound on the sort key keeps the index scan tight; ties are resolved on the id field
+    after = {
+        sort_field: {"$gte" if ascending else "$lte": value},
+        "$nor": [{sort_field: value, id_field: {"$lte" if ascending else "$gte": last_id}}]
+    }
+    return after if ascending else {"$or": [after, {sort_field: None}]}
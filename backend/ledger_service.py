@@ -0,0 +1,212 @@
+import io
+import csv
+import json
+import base64
+import heapq
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator, Callable
+from pymongo import DESCENDING
+
+# Cursor batches are fetched lazily, so a page over-reads at most one batch per source
+LEDGER_BATCH_SIZE = 50
+LEDGER_MAX_PAGE_SIZE = 500
+# Rows per chunk written to an export stream
+EXPORT_CHUNK_ROWS = 500
+
+LEDGER_FIELDS = ["id", "type", "user_id", "amount", "description", "status", "created_at"]
+
+
+def _credit_entry(txn: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": txn['id'],
+        "type": "credit",
+        "user_id": txn['userId'],
+        "amount": txn['amount'],
+        "description": txn['description'],
+        "status": txn.get('status', 'completed'),
+        "created_at": txn['createdAt']
+    }
+
+
+def _payout_entry(payout: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": payout['id'],
+        "type": "payout",
+        "user_id": payout['expertId'],
+        "amount": -payout['amount'],  # Negative for outgoing
+        "description": f"Payout request - {payout.get('description') or 'Expert earnings'}",
+        "status": payout['status'],
+        "created_at": payout['createdAt']
+    }
+
+
+# transaction_type -> (collection, projection, row builder)
+LEDGER_SOURCES: Dict[str, Tuple[str, Dict[str, int], Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+    "credits": (
+        "credit_transactions",
+        {"_id": 0, "id": 1, "userId": 1, "amount": 1, "description": 1, "status": 1, "createdAt": 1},
+        _credit_entry
+    ),
+    "payouts": (
+        "payout_requests",
+        {"_id": 0, "id": 1, "expertId": 1, "amount": 1, "description": 1, "status": 1, "createdAt": 1},
+        _payout_entry
+    )
+}
+
+
+def encode_cursor(entry: Dict[str, Any]) -> str:
+    raw = json.dumps([entry["created_at"].isoformat(), entry["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(entry_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid ledger cursor")
+
+
+class TransactionLedger:
+    """Credit transactions and payout requests as one feed, newest first, merged from two sorted cursors"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        for collection, _, _ in LEDGER_SOURCES.values():
+            await self.db[collection].create_index(
+                [("createdAt", DESCENDING), ("id", DESCENDING)], name="ledger_order"
+            )
+
+    def _sources(self, transaction_type: str) -> List[str]:
+        if transaction_type == "all":
+            return list(LEDGER_SOURCES)
+        if transaction_type not in LEDGER_SOURCES:
+            raise ValueError(f"Unknown transaction type: {transaction_type}")
+        return [transaction_type]
+
+    def _query(self, after: Optional[Tuple[datetime, str]], start: Optional[datetime],
+               end: Optional[datetime]) -> Dict[str, Any]:
+        clauses = []
+        if start or end:
+            created = {}
+            if start:
+                created["$gte"] = start
+            if end:
+                created["$lt"] = end
+            clauses.append({"createdAt": created})
+        if after:
+            created_at, entry_id = after
+            clauses.append({"$or": [
+                {"createdAt": {"$lt": created_at}},
+                {"createdAt": created_at, "id": {"$lt": entry_id}}
+            ]})
+        if not clauses:
+            return {}
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    async def entries(self, transaction_type: str = "all", after: Optional[Tuple[datetime, str]] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      batch_size: int = LEDGER_BATCH_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        """Ledger rows ordered by (created_at, id) descending, read lazily from each source"""
+        query = self._query(after, start, end)
+        cursors = []
+        for source in self._sources(transaction_type):
+            collection, projection, to_entry = LEDGER_SOURCES[source]
+            cursor = self.db[collection].find(query, projection).sort(
+                [("createdAt", DESCENDING), ("id", DESCENDING)]
+            ).batch_size(batch_size)
+            cursors.append((cursor, to_entry))
+
+        try:
+            # Heap of the current head row of each source, newest on top
+            heads = []
+            for position, (cursor, to_entry) in enumerate(cursors):
+                entry = await self._next(cursor, to_entry)
+                if entry is not None:
+                    heads.append((_DescendingKey(entry), position, entry))
+            heapq.heapify(heads)
+            while heads:
+                _, position, entry = heads[0]
+                yield entry
+                cursor, to_entry = cursors[position]
+                following = await self._next(cursor, to_entry)
+                if following is None:
+                    heapq.heappop(heads)
+                else:
+                    heapq.heapreplace(heads, (_DescendingKey(following), position, following))
+        finally:
+            for cursor, _ in cursors:
+                await cursor.close()
+
+    @staticmethod
+    async def _next(cursor, to_entry) -> Optional[Dict[str, Any]]:
+        async for doc in cursor:
+            return to_entry(doc)
+        return None
+
+    async def page(self, transaction_type: str = "all", limit: int = 100, cursor: Optional[str] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+        """One page of the ledger and the cursor for the next one"""
+        limit = max(1, min(limit, LEDGER_MAX_PAGE_SIZE))
+        after = decode_cursor(cursor) if cursor else None
+        rows: List[Dict[str, Any]] = []
+        has_more = False
+        entries = self.entries(transaction_type, after, start, end,
+                               batch_size=min(limit + 1, LEDGER_BATCH_SIZE))
+        try:
+            async for entry in entries:
+                if len(rows) == limit:
+                    has_more = True
+                    break
+                rows.append(entry)
+        finally:
+            await entries.aclose()
+        return {
+            "transactions": rows,
+            "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+            "has_more": has_more
+        }
+
+    def export(self, export_format: str = "csv", transaction_type: str = "all",
+               start: Optional[datetime] = None, end: Optional[datetime] = None) -> AsyncIterator[str]:
+        """Stream the ledger as CSV or NDJSON text chunks without holding it in memory"""
+        # Validated up front so bad parameters fail before a response starts streaming
+        if export_format not in ("csv", "ndjson"):
+            raise ValueError(f"Unsupported export format: {export_format}")
+        self._sources(transaction_type)
+        return self._export_chunks(export_format, transaction_type, start, end)
+
+    async def _export_chunks(self, export_format: str, transaction_type: str,
+                             start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[str]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=LEDGER_FIELDS) if export_format == "csv" else None
+        if writer:
+            writer.writeheader()
+        rows = 0
+        async for entry in self.entries(transaction_type, start=start, end=end, batch_size=EXPORT_CHUNK_ROWS):
+            row = {**entry, "created_at": entry["created_at"].isoformat()}
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row) + "\n")
+            rows += 1
+            if rows % EXPORT_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+class _DescendingKey:
+    """Orders ledger rows newest first inside a min-heap"""
+    __slots__ = ("key",)
+
+    def __init__(self, entry: Dict[str, Any]):
+        self.key = (entry["created_at"], entry["id"])
+
+    def __lt__(self, other: "_DescendingKey") -> bool:
+        return self.key > other.key
@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Optional, Dict, Any, List
+
+from facet_service import VISIBLE_QUERY
+from text_search import normalize_location
+
+LOCATION_TYPES = ("country", "state", "city")
+LOCATION_SOURCE_FIELDS = LOCATION_TYPES + tuple(VISIBLE_QUERY)
+
+DEFAULT_SUGGESTION_LIMIT = 10
+# Local writes update the index in place; a periodic rebuild picks up writes made by other workers
+LOCATION_INDEX_REFRESH_SECONDS = 900
+# Upper bound for prefix comparisons; sorts after any normalized location key
+_PREFIX_END = "￿"
+
+
+class _PrefixTable:
+    """Sorted normalized keys with performer counts and the most common display spelling"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.counts: Dict[str, int] = {}
+        self.spellings: Dict[str, Counter] = {}
+
+    def add(self, value: str, delta: int):
+        key = normalize_location(value)
+        if not key:
+            return
+        count = self.counts.get(key, 0) + delta
+        spellings = self.spellings.setdefault(key, Counter())
+        spellings[value] += delta
+        if spellings[value] <= 0:
+            del spellings[value]
+
+        if count <= 0:
+            if key in self.counts:
+                del self.counts[key]
+                del self.spellings[key]
+                position = bisect_left(self.keys, key)
+                if position < len(self.keys) and self.keys[position] == key:
+                    del self.keys[position]
+            return
+        if key not in self.counts:
+            insort(self.keys, key)
+        self.counts[key] = count
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + _PREFIX_END, start)
+        # Most performers first, alphabetical among ties
+        best = heapq.nsmallest(limit, self.keys[start:end], key=lambda key: (-self.counts[key], key))
+        return [self.spellings[key].most_common(1)[0][0] for key in best]
+
+
+class LocationPrefixIndex:
+    """In-memory autocomplete over the countries, states and cities of searchable performers"""
+
+    def __init__(self, db, refresh_seconds: int = LOCATION_INDEX_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self._tables: Optional[Dict[str, _PrefixTable]] = None
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._tables is not None
+
+    @staticmethod
+    def _is_visible(doc: Optional[Dict[str, Any]]) -> bool:
+        return bool(doc) and all(doc.get(field) == value for field, value in VISIBLE_QUERY.items())
+
+    async def build(self):
+        """Load distinct locations and their performer counts"""
+        tables = {location_type: _PrefixTable() for location_type in LOCATION_TYPES}
+        cursor = self.db.performer_profiles.find(
+            VISIBLE_QUERY, {"_id": 0, **{field: 1 for field in LOCATION_TYPES}}
+        )
+        async for profile in cursor:
+            for location_type, table in tables.items():
+                if profile.get(location_type):
+                    table.add(profile[location_type], 1)
+        self._tables = tables
+        self._built_at = time.monotonic()
+
+    def _is_stale(self) -> bool:
+        return self._tables is None or time.monotonic() - self._built_at > self.refresh_seconds
+
+    async def ensure_built(self):
+        """Build the index when missing or past the refresh interval"""
+        if self._is_stale():
+            async with self._lock:
+                if self._is_stale():
+                    await self.build()
+
+    def apply_change(self, old_doc: Optional[Dict[str, Any]], new_doc: Optional[Dict[str, Any]]):
+        """Move a profile's locations from its previous state to its new state"""
+        if self._tables is None:
+            return
+        for location_type, table in self._tables.items():
+            if self._is_visible(old_doc) and old_doc.get(location_type):
+                table.add(old_doc[location_type], -1)
+            if self._is_visible(new_doc) and new_doc.get(location_type):
+                table.add(new_doc[location_type], 1)
+
+    async def suggest(self, query: str, location_type: str = "city",
+                      limit: int = DEFAULT_SUGGESTION_LIMIT) -> List[str]:
+        """Locations starting with the query, ranked by number of performers"""
+        if location_type not in LOCATION_TYPES:
+            location_type = "city"
+        prefix = normalize_location(query)
+        if not prefix:
+            return []
+        await self.ensure_built()
+        return self._tables[location_type].complete(prefix, limit)
@@ -9,6 +9,9 @@ from typing import Optional, Dict, Any
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import os
+from presence_service import PresenceTracker
+from daily_metrics_service import DailyMetricsRollup, shared_daily_metrics
+from member_dashboard_cache import shared_dashboard_cache
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,8 +22,11 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 class MemberAuthService:
-    def __init__(self, db):
+    def __init__(self, db, presence: Optional[PresenceTracker] = None,
+                 daily_metrics: Optional[DailyMetricsRollup] = None):
         self.db = db
+        self.presence = presence
+        self.daily_metrics = daily_metrics or shared_daily_metrics
         
     async def register_member(self, registration_data: Dict[str, Any]) -> Dict[str, Any]:
         """Register a new member with email/password"""
@@ -83,6 +89,7 @@ class MemberAuthService:
             
             # Insert user into database
             await self.db.users.insert_one(user_data)
+            self.daily_metrics.record_registration("member")
             
             # Send verification email
             email_sent = await self._send_verification_email(email, first_name, email_verification_token)
@@ -153,11 +160,15 @@ class MemberAuthService:
             }
             await self.db.member_sessions.insert_one(session_data)
             
-            # Update last seen
-            await self.db.users.update_one(
-                {"id": user['id']},
-                {"$set": {"lastSeen": datetime.utcnow()}}
-            )
+            # Update last seen (batched through the presence tracker when available)
+            if self.presence:
+                self.presence.heartbeat("member", user['id'])
+            else:
+                await self.db.users.update_one(
+                    {"id": user['id']},
+                    {"$set": {"lastSeen": datetime.utcnow()}}
+                )
+                self.daily_metrics.record_active(user['id'])
             
             # Remove sensitive data from response
             user_response = {
@@ -189,12 +200,15 @@ class MemberAuthService:
         """Logout member and invalidate session"""
         try:
             # Invalidate session
-            result = await self.db.member_sessions.update_one(
+            session = await self.db.member_sessions.find_one_and_update(
                 {"sessionToken": session_token, "isActive": True},
-                {"$set": {"isActive": False, "updatedAt": datetime.utcnow()}}
+                {"$set": {"isActive": False, "updatedAt": datetime.utcnow()}},
+                projection={"_id": 0, "userId": 1}
             )
             
-            if result.modified_count > 0:
+            if session:
+                if self.presence:
+                    self.presence.set_offline("member", session["userId"])
                 return {"success": True, "message": "Logout successful"}
             else:
                 return {"success": False, "message": "Invalid or expired session"}
@@ -229,6 +243,7 @@ class MemberAuthService:
                     }
                 }
             )
+            shared_dashboard_cache.invalidate(user['id'])
             
             return {
                 "success": True,
@@ -0,0 +1,32 @@
+from typing import Optional, Dict, Any
+from stamped_cache import StampedCache
+
+# Assembled dashboards are kept per member for a bounded time; writes that change what
+# the dashboard shows (credits, favorites, profile, appointments) invalidate entries immediately
+DASHBOARD_CACHE_SIZE = 10000
+DASHBOARD_CACHE_TTL_SECONDS = 60
+
+
+class MemberDashboardCache(StampedCache):
+    """Bounded TTL cache of assembled member dashboards"""
+
+    def __init__(self, maxsize: int = DASHBOARD_CACHE_SIZE, ttl: int = DASHBOARD_CACHE_TTL_SECONDS):
+        super().__init__(maxsize, ttl)
+        self._counts = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, member_id: str) -> Optional[Dict[str, Any]]:
+        dashboard = super().get(member_id)
+        self._counts["hits" if dashboard is not None else "misses"] += 1
+        return dashboard
+
+    def invalidate(self, member_id: str):
+        """Drop a member's dashboard after something on it changes"""
+        super().invalidate(member_id)
+        self._counts["invalidations"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self._counts, "cached": len(self)}
+
+
+# Shared so writes anywhere in the process can invalidate the dashboards they affect
+shared_dashboard_cache = MemberDashboardCache()
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from member_dashboard_cache import MemberDashboardCache, shared_dashboard_cache
+from affiliate_credits_service import CreditService
+from affiliate_stats_service import AffiliateStatsProjection
+
+logger = logging.getLogger(__name__)
+
+RECENT_TRANSACTIONS_LIMIT = 10
+RECENT_ACTIVITY_LIMIT = 10
+# Recent favorites and appointments read for the activity feed
+RECENT_ITEMS_PER_SOURCE = 5
+UPCOMING_APPOINTMENT_STATUSES = ["scheduled", "confirmed"]
+
+MEMBER_DASHBOARD_FIELDS = {
+    "_id": 0, "id": 1, "firstName": 1, "lastName": 1, "displayName": 1, "profileImage": 1,
+    "createdAt": 1, "accountStatus": 1, "isVerified": 1
+}
+
+
+def _activity_entries(transactions: List[Dict[str, Any]], favorites: List[Dict[str, Any]],
+                      appointments: List[Dict[str, Any]], experts: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Recent credit, favorite and appointment events, newest first"""
+    def expert_summary(expert_id: str) -> Dict[str, Any]:
+        expert = experts.get(expert_id, {})
+        return {
+            "id": expert_id,
+            "name": expert.get("displayName") or f"{expert.get('firstName', '')} {expert.get('lastName', '')}".strip(),
+            "specialty": expert.get("expertiseCategory")
+        }
+
+    activity = [
+        {
+            "id": txn["id"],
+            "type": "credit_earned" if txn["amount"] > 0 else "credit_spent",
+            "description": txn["description"],
+            "timestamp": txn["createdAt"],
+            "metadata": {"amount": txn["amount"], "source": txn.get("relatedType")}
+        }
+        for txn in transactions
+    ]
+    activity.extend(
+        {
+            "id": favorite["id"],
+            "type": "favorite_added",
+            "description": f"Added {expert_summary(favorite['expertId'])['name'] or 'an expert'} to favorites",
+            "timestamp": favorite["createdAt"],
+            "expert": expert_summary(favorite["expertId"])
+        }
+        for favorite in favorites
+    )
+    activity.extend(
+        {
+            "id": appointment["id"],
+            "type": "appointment_booked",
+            "description": f"Booked {appointment['title']}",
+            "timestamp": appointment["created_at"],
+            "expert": expert_summary(appointment["performer_id"]),
+            "metadata": {"scheduled_start": appointment["scheduled_start"], "status": appointment["status"]}
+        }
+        for appointment in appointments
+    )
+    activity.sort(key=lambda entry: entry["timestamp"], reverse=True)
+    return activity[:RECENT_ACTIVITY_LIMIT]
+
+
+class MemberDashboardAssembler:
+    """Builds the member dashboard from concurrent sub-queries and caches it per member"""
+
+    def __init__(self, db, cache: Optional[MemberDashboardCache] = None):
+        self.db = db
+        self.cache = cache or shared_dashboard_cache
+        self.affiliate_stats = AffiliateStatsProjection(db)
+
+    async def get(self, member_id: str) -> Optional[Dict[str, Any]]:
+        """Dashboard for a member, or None when the member does not exist"""
+        dashboard = self.cache.get(member_id)
+        if dashboard is not None:
+            return dashboard
+
+        generation = self.cache.generation()
+        dashboard, complete = await self._assemble(member_id)
+        # Payloads with a failed section are served but not cached
+        if dashboard is not None and complete:
+            self.cache.put(member_id, generation, dashboard)
+        return dashboard
+
+    async def _favorites(self, member_id: str) -> Dict[str, Any]:
+        result = await self.db.member_favorites.aggregate([
+            {"$match": {"memberId": member_id}},
+            {"$facet": {
+                "count": [{"$count": "count"}],
+                "recent": [
+                    {"$sort": {"createdAt": -1}},
+                    {"$limit": RECENT_ITEMS_PER_SOURCE},
+                    {"$project": {"_id": 0, "id": 1, "expertId": 1, "createdAt": 1}}
+                ]
+            }}
+        ]).to_list(1)
+        facets = result[0] if result else {}
+        count = facets.get("count") or [{"count": 0}]
+        return {"count": count[0]["count"], "recent": facets.get("recent", [])}
+
+    async def _appointments(self, member_id: str) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        result = await self.db.appointments.aggregate([
+            {"$match": {"member_id": member_id}},
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                "upcoming": [
+                    {"$match": {"scheduled_start": {"$gte": now}, "status": {"$in": UPCOMING_APPOINTMENT_STATUSES}}},
+                    {"$count": "count"}
+                ],
+                "experts": [{"$group": {"_id": "$performer_id"}}, {"$count": "count"}],
+                "recent": [
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": RECENT_ITEMS_PER_SOURCE},
+                    {"$project": {"_id": 0, "id": 1, "performer_id": 1, "title": 1,
+                                  "scheduled_start": 1, "status": 1, "created_at": 1}}
+                ]
+            }}
+        ]).to_list(1)
+        facets = result[0] if result else {}
+
+        def count(name: str) -> int:
+            return facets[name][0]["count"] if facets.get(name) else 0
+
+        return {
+            "total": count("total"),
+            "upcoming": count("upcoming"),
+            "experts_contacted": count("experts"),
+            "recent": facets.get("recent", [])
+        }
+
+    async def _assemble(self, member_id: str):
+        credit_service = CreditService(self.db)
+
+        user, credit_account, affiliate_stats, transactions, favorites, appointments, conversations = \
+            await asyncio.gather(
+                self.db.users.find_one({"id": member_id}, MEMBER_DASHBOARD_FIELDS),
+                credit_service.get_credit_account(member_id),
+                # Read directly so a failure surfaces here instead of as a zeroed stats payload
+                self.affiliate_stats.get(member_id),
+                credit_service.get_credit_history(member_id, RECENT_TRANSACTIONS_LIMIT),
+                self._favorites(member_id),
+                self._appointments(member_id),
+                self.db.chat_rooms.count_documents({"participants": member_id}),
+                return_exceptions=True
+            )
+        if isinstance(user, Exception):
+            raise user
+        if not user:
+            return None, True
+
+        complete = True
+        for name, value in (("credit account", credit_account), ("affiliate stats", affiliate_stats),
+                            ("credit history", transactions), ("favorites", favorites),
+                            ("appointments", appointments), ("conversations", conversations)):
+            if isinstance(value, Exception):
+                logger.warning(f"Failed to load dashboard {name} for {member_id}: {str(value)}")
+                complete = False
+        if isinstance(credit_account, Exception):
+            credit_account = None
+        if isinstance(affiliate_stats, Exception):
+            affiliate_stats = {}
+        elif affiliate_stats is None:
+            affiliate_stats = {"error": "No affiliate account found"}
+        transactions = [] if isinstance(transactions, Exception) else [t.dict() for t in transactions]
+        if isinstance(favorites, Exception):
+            favorites = {"count": 0, "recent": []}
+        if isinstance(appointments, Exception):
+            appointments = {"total": 0, "upcoming": 0, "experts_contacted": 0, "recent": []}
+        if isinstance(conversations, Exception):
+            conversations = 0
+
+        # Names for the experts in the activity feed, in one query
+        expert_ids = list({favorite["expertId"] for favorite in favorites["recent"]} |
+                          {appointment["performer_id"] for appointment in appointments["recent"]})
+        experts = {}
+        if expert_ids:
+            experts = {
+                expert["id"]: expert
+                for expert in await self.db.users.find(
+                    {"id": {"$in": expert_ids}},
+                    {"_id": 0, "id": 1, "firstName": 1, "lastName": 1, "displayName": 1, "expertiseCategory": 1}
+                ).to_list(len(expert_ids))
+            }
+
+        dashboard = {
+            "member": {
+                "id": user['id'],
+                "firstName": user.get('firstName'),
+                "lastName": user.get('lastName'),
+                "displayName": user.get('displayName'),
+                "profileImage": user.get('profileImage'),
+                "memberSince": user.get('createdAt'),
+                "accountStatus": user.get('accountStatus'),
+                "isVerified": user.get('isVerified', False)
+            },
+            "credits": {
+                "balance": credit_account.totalCredits if credit_account else 0.0,
+                "lifetime_earned": credit_account.lifetimeEarned if credit_account else 0.0,
+                "lifetime_spent": credit_account.lifetimeSpent if credit_account else 0.0,
+                "recent_transactions": transactions
+            },
+            "affiliate": affiliate_stats,
+            "favorites": {
+                "count": favorites["count"]
+            },
+            "activity": {
+                "recent": _activity_entries(transactions, favorites["recent"], appointments["recent"], experts)
+            },
+            "stats": {
+                "favorites": favorites["count"],
+                "appointments": appointments["total"],
+                "upcoming_appointments": appointments["upcoming"],
+                "experts_contacted": appointments["experts_contacted"],
+                "conversations": conversations
+            }
+        }
+        return dashboard, complete
+
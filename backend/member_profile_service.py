@@ -1,10 +1,18 @@
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
+from zip_centroid_service import ZipCentroidTable
+from expert_discovery_service import expert_search_fields, expert_discovery_fields, EXPERT_SEARCH_SOURCE_FIELDS
+from member_dashboard_service import MemberDashboardAssembler
+from member_dashboard_cache import MemberDashboardCache, shared_dashboard_cache
 
 class MemberProfileService:
-    def __init__(self, db):
+    def __init__(self, db, zip_centroids: Optional[ZipCentroidTable] = None,
+                 dashboard_cache: Optional[MemberDashboardCache] = None):
         self.db = db
+        self.zip_centroids = zip_centroids
+        self.dashboard_cache = dashboard_cache or shared_dashboard_cache
+        self.dashboard = MemberDashboardAssembler(db, self.dashboard_cache)
     
     async def get_member_profile(self, member_id: str) -> Dict[str, Any]:
         """Get complete member profile"""
@@ -69,6 +77,19 @@ class MemberProfileService:
                 last_name = update_fields.get('lastName', user.get('lastName', ''))
                 update_fields['displayName'] = f"{first_name} {last_name}".strip()
             
+            # Keep map coordinates in step with the location used by radius search
+            if 'location' in update_fields and self.zip_centroids:
+                location = update_fields['location'] if isinstance(update_fields['location'], dict) else {}
+                update_fields['geo'] = self.zip_centroids.point(
+                    location.get('zipCode'), location.get('city'), location.get('state')
+                )
+            
+            # Re-index experts whose searchable fields changed, and fill in any discovery fields they lack
+            if user.get('userType') == 'expert':
+                if any(field in update_fields for field in EXPERT_SEARCH_SOURCE_FIELDS):
+                    update_fields.update(expert_search_fields({**user, **update_fields}))
+                update_fields.update(expert_discovery_fields({**user, **update_fields}, self.zip_centroids))
+            
             update_fields['updatedAt'] = datetime.utcnow()
             
             # Update user document
@@ -76,6 +97,7 @@ class MemberProfileService:
                 {"id": member_id},
                 {"$set": update_fields}
             )
+            self.dashboard_cache.invalidate(member_id)
             
             # Get updated profile
             updated_profile = await self.get_member_profile(member_id)
@@ -162,79 +184,10 @@ class MemberProfileService:
     async def get_member_dashboard(self, member_id: str) -> Dict[str, Any]:
         """Get member dashboard data"""
         try:
-            # Get basic member info
-            user = await self.db.users.find_one({"id": member_id})
-            if not user:
+            dashboard_data = await self.dashboard.get(member_id)
+            if dashboard_data is None:
                 return {"success": False, "message": "Member not found"}
             
-            # Get credit balance
-            try:
-                from affiliate_credits_service import CreditService, AffiliateService
-                credit_service = CreditService(self.db)
-                affiliate_service = AffiliateService(self.db)
-                
-                credit_balance = await credit_service.get_credit_balance(member_id)
-                affiliate_stats = await affiliate_service.get_referral_stats(member_id)
-                
-                # Get recent credit transactions
-                recent_transactions = await credit_service.get_credit_history(member_id, 10)
-                
-            except Exception as e:
-                print(f"Warning: Failed to get credit/affiliate data: {str(e)}")
-                credit_balance = 0.0
-                affiliate_stats = {}
-                recent_transactions = []
-            
-            # Get member favorites count
-            favorites_count = await self.db.member_favorites.count_documents({"memberId": member_id})
-            
-            # Get recent activity (mock for now)
-            recent_activity = [
-                {
-                    "id": str(uuid.uuid4()),
-                    "type": "profile_view",
-                    "description": "Viewed Dr. Sarah Chen's profile",
-                    "timestamp": datetime.utcnow() - timedelta(hours=2),
-                    "expert": {"name": "Dr. Sarah Chen", "specialty": "Family Medicine"}
-                },
-                {
-                    "id": str(uuid.uuid4()),
-                    "type": "search",
-                    "description": "Searched for medical experts in Boston",
-                    "timestamp": datetime.utcnow() - timedelta(hours=5),
-                    "metadata": {"category": "medical", "location": "Boston"}
-                }
-            ]
-            
-            dashboard_data = {
-                "member": {
-                    "id": user['id'],
-                    "firstName": user.get('firstName'),
-                    "lastName": user.get('lastName'),
-                    "displayName": user.get('displayName'),
-                    "profileImage": user.get('profileImage'),
-                    "memberSince": user.get('createdAt'),
-                    "accountStatus": user.get('accountStatus'),
-                    "isVerified": user.get('isVerified', False)
-                },
-                "credits": {
-                    "balance": credit_balance,
-                    "recent_transactions": [t.dict() if hasattr(t, 'dict') else t for t in recent_transactions]
-                },
-                "affiliate": affiliate_stats,
-                "favorites": {
-                    "count": favorites_count
-                },
-                "activity": {
-                    "recent": recent_activity
-                },
-                "stats": {
-                    "profile_views": favorites_count * 3,  # Mock calculation
-                    "searches_this_month": 12,  # Mock data
-                    "experts_contacted": 5  # Mock data
-                }
-            }
-            
             return {
                 "success": True,
                 "dashboard": dashboard_data
@@ -314,6 +267,7 @@ class MemberProfileService:
             }
             
             await self.db.member_favorites.insert_one(favorite_data)
+            self.dashboard_cache.invalidate(member_id)
             
             return {
                 "success": True,
@@ -333,6 +287,7 @@ class MemberProfileService:
             })
             
             if result.deleted_count > 0:
+                self.dashboard_cache.invalidate(member_id)
                 return {
                     "success": True,
                     "message": "Expert removed from favorites"
@@ -416,6 +371,8 @@ class MemberProfileService:
                 }
             )
             
+            self.dashboard_cache.invalidate(member_id)
+            
             # Invalidate all sessions
             await self.db.member_sessions.update_many(
                 {"userId": member_id},
@@ -2,14 +2,25 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import os
-import httpx
 import json
 import hashlib
 import hmac
 from datetime import datetime, timedelta
+import time
 import uuid
+import logging
+from http_client import shared_http_client as http_client
+from token_manager import OAuthTokenManager
+from webhook_service import WebhookProcessor
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/payments", tags=["payments"])
+# Provider webhooks only; mounted on its own so the payment routes above stay unexposed until they have auth
+webhook_router = APIRouter(prefix="/api/payments", tags=["payments"])
+
+# Stripe rejects signatures older than this to stop replayed deliveries
+STRIPE_SIGNATURE_TOLERANCE_SECONDS = 300
 
 # Pydantic Models
 class PaymentPackage(BaseModel):
@@ -98,25 +109,32 @@ PAYMENT_PACKAGES = {
 }
 
 # CCBill OAuth Token Management
+async def fetch_ccbill_token() -> Dict[str, Any]:
+    """Request a new OAuth token from CCBill"""
+    url = f"{os.getenv('CCBILL_BASE_URL', 'https://api.ccbill.com')}/ccbill-auth/oauth/token"
+    auth = (os.getenv('CCBILL_MERCHANT_ID'), os.getenv('CCBILL_SECRET_KEY'))
+    
+    response = await http_client.post(
+        "ccbill",
+        url,
+        data={"grant_type": "client_credentials"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        auth=auth,
+        timeout=30.0,
+        retry=True
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(502, f"CCBill auth failed: {response.text}")
+    
+    return response.json()
+
+ccbill_tokens = OAuthTokenManager("CCBill", fetch_ccbill_token)
+
 async def get_ccbill_token() -> str:
-    """Get OAuth token for CCBill API"""
+    """Get OAuth token for CCBill API (cached until shortly before expiry)"""
     try:
-        url = f"{os.getenv('CCBILL_BASE_URL', 'https://api.ccbill.com')}/ccbill-auth/oauth/token"
-        auth = (os.getenv('CCBILL_MERCHANT_ID'), os.getenv('CCBILL_SECRET_KEY'))
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                data={"grant_type": "client_credentials"},
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-                auth=auth,
-                timeout=30.0
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(502, f"CCBill auth failed: {response.text}")
-                
-            return response.json()["access_token"]
+        return await ccbill_tokens.get_token(os.getenv('CCBILL_MERCHANT_ID'))
     except Exception as e:
         raise HTTPException(502, f"CCBill authentication error: {str(e)}")
 
@@ -161,45 +179,47 @@ async def process_ccbill_payment(
                 "rebills": 99
             })
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(charge_url, json=payload, headers=headers, timeout=30.0)
+        response = await http_client.post("ccbill", charge_url, json=payload, headers=headers, timeout=30.0)
+        if response.status_code == 401:
+            # Revoked or rotated token; the next payment fetches a fresh one
+            ccbill_tokens.invalidate()
             
-            if response.status_code != 200:
-                return PaymentResponse(
-                    success=False,
-                    message=f"Payment failed: {response.text}"
-                )
+        if response.status_code != 200:
+            return PaymentResponse(
+                success=False,
+                message=f"Payment failed: {response.text}"
+            )
             
-            result = response.json()
+        result = response.json()
             
-            # Store transaction in database (implement your database logic here)
-            transaction_data = {
-                "id": str(uuid.uuid4()),
-                "user_id": "current_user_id",  # Get from auth
-                "package_id": request.packageId,
-                "amount": request.amount,
-                "currency": "USD",
-                "payment_method": "ccbill",
-                "transaction_id": result.get("transactionId"),
-                "status": "completed",
-                "created_at": datetime.utcnow(),
-                "metadata": {
-                    "package_name": package["name"],
-                    "is_subscription": request.isSubscription
-                }
+        # Store transaction in database (implement your database logic here)
+        transaction_data = {
+            "id": str(uuid.uuid4()),
+            "user_id": "current_user_id",  # Get from auth
+            "package_id": request.packageId,
+            "amount": request.amount,
+            "currency": "USD",
+            "payment_method": "ccbill",
+            "transaction_id": result.get("transactionId"),
+            "status": "completed",
+            "created_at": datetime.utcnow(),
+            "metadata": {
+                "package_name": package["name"],
+                "is_subscription": request.isSubscription
             }
+        }
             
-            # TODO: Save to MongoDB
+        # TODO: Save to MongoDB
             
-            return PaymentResponse(
-                success=True,
-                message="Payment processed successfully",
-                data={
-                    "transactionId": result.get("transactionId"),
-                    "package": package,
-                    "amount": request.amount
-                }
-            )
+        return PaymentResponse(
+            success=True,
+            message="Payment processed successfully",
+            data={
+                "transactionId": result.get("transactionId"),
+                "package": package,
+                "amount": request.amount
+            }
+        )
             
     except HTTPException:
         raise
@@ -391,56 +411,139 @@ async def check_crypto_payment_status(
         raise HTTPException(500, f"Error checking crypto payment status: {str(e)}")
 
 # Webhook Handlers
-@router.post("/webhooks/ccbill")
+# Webhooks are stored once per provider event id and acknowledged immediately;
+# the dispatch functions below run on the WebhookProcessor workers
+webhook_processor: Optional[WebhookProcessor] = None
+
+def init_webhooks(db) -> WebhookProcessor:
+    """Create the webhook processor used by the webhook routes"""
+    global webhook_processor
+    webhook_processor = WebhookProcessor(db, {
+        "ccbill": dispatch_ccbill_event,
+        "stripe": dispatch_stripe_event
+    })
+    return webhook_processor
+
+def ccbill_event_id(event_type: str, payload: Dict[str, Any], body: bytes) -> str:
+    """CCBill posts no event id; a transaction id plus event type identifies a delivery, else the body hash"""
+    transaction_id = payload.get("transactionId")
+    if transaction_id:
+        return f"{event_type}:{transaction_id}"
+    return hashlib.sha256(body).hexdigest()
+
+def verify_stripe_signature(body: bytes, sig_header: Optional[str], secret: Optional[str],
+                            tolerance: int = STRIPE_SIGNATURE_TOLERANCE_SECONDS, now: Optional[float] = None) -> bool:
+    """Check a Stripe-Signature header (t=timestamp,v1=HMAC-SHA256 of "timestamp.body")"""
+    if not sig_header or not secret:
+        return False
+    timestamp = None
+    signatures = []
+    for item in sig_header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        return False
+    if abs((now if now is not None else time.time()) - int(timestamp)) > tolerance:
+        return False
+    expected = hmac.new(secret.encode("utf-8"), timestamp.encode("utf-8") + b"." + body, hashlib.sha256).hexdigest()
+    return any(hmac.compare_digest(expected, signature) for signature in signatures)
+
+def verify_ccbill_secret(provided: Optional[str], secret: Optional[str]) -> bool:
+    """CCBill does not sign webhook posts; the registered webhook URL carries a shared secret instead"""
+    if not provided or not secret:
+        return False
+    return hmac.compare_digest(provided.encode("utf-8"), secret.encode("utf-8"))
+
+@webhook_router.post("/webhooks/ccbill")
 async def ccbill_webhook(request: Request):
     """Handle CCBill webhooks"""
     try:
-        payload = await request.form()
-        event_type = payload.get("eventType")
-        
-        # Verify webhook signature (implement proper verification)
-        
-        if event_type == "NewSaleSuccess":
-            # Handle successful payment
-            await handle_successful_payment(dict(payload))
-        elif event_type == "Renewal":
-            # Handle subscription renewal
-            await handle_subscription_renewal(dict(payload))
-        elif event_type == "Cancellation":
-            # Handle subscription cancellation
-            await handle_subscription_cancellation(dict(payload))
-        elif event_type == "Chargeback":
-            # Handle chargeback
-            await handle_chargeback(dict(payload))
-        
-        return {"status": "success"}
+        if not verify_ccbill_secret(request.query_params.get("secret"), os.getenv("CCBILL_WEBHOOK_SECRET")):
+            logger.warning("Rejected CCBill webhook with a missing or invalid secret")
+            raise HTTPException(400, "Invalid webhook signature")
+        
+        body = await request.body()
+        payload = dict(await request.form())
+        event_type = payload.get("eventType") or request.query_params.get("eventType", "")
+        if not event_type:
+            raise HTTPException(400, "Missing event type")
+        
+        accepted = await webhook_processor.ingest(
+            "ccbill",
+            ccbill_event_id(event_type, payload, body),
+            event_type,
+            payload,
+            ordering_key=payload.get("subscriptionId")
+        )
+        
+        return {"status": "success", "duplicate": not accepted}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Webhook processing failed: {str(e)}")
 
-@router.post("/webhooks/stripe")
+@webhook_router.post("/webhooks/stripe")
 async def stripe_webhook(request: Request):
     """Handle Stripe webhooks"""
     try:
         body = await request.body()
         sig_header = request.headers.get('stripe-signature')
         
-        # Verify webhook signature (implement proper verification)
-        
-        event = json.loads(body)
-        
-        if event['type'] == 'checkout.session.completed':
-            # Handle successful checkout
-            await handle_stripe_success(event['data']['object'])
-        elif event['type'] == 'invoice.payment_succeeded':
-            # Handle subscription payment
-            await handle_stripe_subscription_payment(event['data']['object'])
+        if not verify_stripe_signature(body, sig_header, os.getenv('STRIPE_WEBHOOK_SECRET')):
+            logger.warning("Rejected Stripe webhook with a missing or invalid signature")
+            raise HTTPException(400, "Invalid webhook signature")
+        
+        try:
+            event = json.loads(body)
+        except ValueError:
+            raise HTTPException(400, "Invalid webhook payload")
+        if not isinstance(event, dict) or not event.get('id') or not event.get('type'):
+            raise HTTPException(400, "Missing event id or type")
+        event_object = (event.get('data') or {}).get('object') or {}
+        
+        accepted = await webhook_processor.ingest(
+            "stripe",
+            event['id'],
+            event['type'],
+            event,
+            ordering_key=event_object.get('subscription') or event_object.get('customer')
+        )
         
-        return {"status": "success"}
+        return {"status": "success", "duplicate": not accepted}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Stripe webhook processing failed: {str(e)}")
 
+async def dispatch_ccbill_event(event_type: str, payload: dict):
+    """Apply a stored CCBill webhook event"""
+    if event_type == "NewSaleSuccess":
+        # Handle successful payment
+        await handle_successful_payment(payload)
+    elif event_type == "Renewal":
+        # Handle subscription renewal
+        await handle_subscription_renewal(payload)
+    elif event_type == "Cancellation":
+        # Handle subscription cancellation
+        await handle_subscription_cancellation(payload)
+    elif event_type == "Chargeback":
+        # Handle chargeback
+        await handle_chargeback(payload)
+
+async def dispatch_stripe_event(event_type: str, event: dict):
+    """Apply a stored Stripe webhook event"""
+    if event_type == 'checkout.session.completed':
+        # Handle successful checkout
+        await handle_stripe_success(event['data']['object'])
+    elif event_type == 'invoice.payment_succeeded':
+        # Handle subscription payment
+        await handle_stripe_subscription_payment(event['data']['object'])
+
 # Helper Functions
 def get_period_in_days(period: str) -> int:
     """Convert period string to days"""
@@ -1,29 +1,159 @@
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from fastapi import HTTPException
+from bson import json_util
+from cachetools import TTLCache
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, UpdateOne, ReturnDocument
 from api_key_models import PerformerProfile, PerformerSearch, Gender, SexualPreference, Ethnicity
+from counter_buffer import CounterBuffer
+from facet_service import PerformerFacetCounts, FACET_SOURCE_FIELDS
+from location_index import LocationPrefixIndex, LOCATION_SOURCE_FIELDS
+from presence_service import PresenceTracker
+from text_search import build_search_tokens, normalize_location, query_tokens
+from keyset_pagination import encode_cursor, decode_cursor, keyset_filter
+from zip_centroid_service import ZipCentroidTable, geo_point, METERS_PER_KM
 import math
 
+BACKFILL_BATCH_SIZE = 1000
+
+# Profile fields that feed the derived search fields (tokens, normalized location, coordinates)
+SEARCH_SOURCE_FIELDS = ("stage_name", "bio", "specialties", "country", "state", "city", "zip_code")
+# Bump when the derivation changes so startup re-indexes existing profiles
+SEARCH_FIELDS_VERSION = 1
+TEXT_WEIGHTS = {"stage_name": 10, "specialties": 5, "bio": 1}
+
+# Filter options whose values come from profile data rather than enums
+DYNAMIC_FILTER_KEYS = ("body_types", "hair_colors", "eye_colors", "languages", "specialties")
+
+# Search totals are cached briefly per normalized filter instead of counted on every page
+COUNT_CACHE_SIZE = 1000
+COUNT_CACHE_TTL_SECONDS = 30
+
+# Performer ids confirmed to exist, so buffered view counts and status updates skip a lookup
+KNOWN_PERFORMER_CACHE_SIZE = 10000
+KNOWN_PERFORMER_CACHE_TTL_SECONDS = 300
+
+# Above this many online performers the online filter uses the persisted status instead of an $in list
+ONLINE_FILTER_MAX_IDS = 1000
+
+# Sort fields offered by search; each gets an index ending in user_id for keyset pagination
+SORT_FIELDS = ("total_views", "average_rating", "created_at", "last_active", "stage_name")
+
 
 class PerformerSearchService:
-    def __init__(self, db):
+    def __init__(self, db, zip_centroids: Optional[ZipCentroidTable] = None,
+                 presence: Optional[PresenceTracker] = None):
         self.db = db
+        self.zip_centroids = zip_centroids
+        self.presence = presence
+        self.count_cache = TTLCache(maxsize=COUNT_CACHE_SIZE, ttl=COUNT_CACHE_TTL_SECONDS)
+        self.facets = PerformerFacetCounts(db)
+        self.locations = LocationPrefixIndex(db)
+        self.view_counter = CounterBuffer(db.performer_profiles, "user_id", "total_views")
+        self.known_performers = TTLCache(maxsize=KNOWN_PERFORMER_CACHE_SIZE, ttl=KNOWN_PERFORMER_CACHE_TTL_SECONDS)
+    
+    async def ensure_indexes(self):
+        """Create the search indexes and fill in derived search fields on existing profiles"""
+        await self.db.performer_profiles.create_index(
+            [("geo", GEOSPHERE), ("show_in_search", ASCENDING), ("account_status", ASCENDING)],
+            name="performer_geo"
+        )
+        for field in SORT_FIELDS:
+            await self.db.performer_profiles.create_index(
+                [("show_in_search", ASCENDING), ("account_status", ASCENDING),
+                 (field, DESCENDING), ("user_id", DESCENDING)],
+                name=f"performer_search_{field}"
+            )
+        await self.db.performer_profiles.create_index(
+            [("stage_name", TEXT), ("specialties", TEXT), ("bio", TEXT)],
+            weights=TEXT_WEIGHTS, default_language="english", name="performer_text"
+        )
+        await self.db.performer_profiles.create_index(
+            [("show_in_search", ASCENDING), ("account_status", ASCENDING), ("search_tokens", ASCENDING)],
+            name="performer_search_tokens"
+        )
+        await self.db.performer_profiles.create_index(
+            [("show_in_search", ASCENDING), ("account_status", ASCENDING), ("country_norm", ASCENDING),
+             ("state_norm", ASCENDING), ("city_norm", ASCENDING)],
+            name="performer_location"
+        )
+        await self.db.performer_profiles.create_index(
+            [("show_in_search", ASCENDING), ("account_status", ASCENDING), ("city_norm", ASCENDING)],
+            name="performer_city"
+        )
+        
+        projection = {"_id": 0, "user_id": 1, **{field: 1 for field in SEARCH_SOURCE_FIELDS}}
+        cursor = self.db.performer_profiles.find({"search_version": {"$ne": SEARCH_FIELDS_VERSION}}, projection)
+        operations = []
+        async for doc in cursor:
+            operations.append(UpdateOne({"user_id": doc["user_id"]}, {"$set": self._derived_fields(doc)}))
+            if len(operations) >= BACKFILL_BATCH_SIZE:
+                await self.db.performer_profiles.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.db.performer_profiles.bulk_write(operations, ordered=False)
+    
+    def _location_point(self, location: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """GeoJSON point for a profile's zip code or city centroid"""
+        if not self.zip_centroids:
+            return None
+        return self.zip_centroids.point(location.get("zip_code"), location.get("city"), location.get("state"))
+    
+    def _derived_fields(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Search tokens, normalized location keys and coordinates computed from a profile's own fields"""
+        derived = {
+            "search_tokens": build_search_tokens(
+                [profile.get("stage_name"), profile.get("specialties")],
+                [profile.get("bio")]
+            ),
+            "country_norm": normalize_location(profile.get("country")),
+            "state_norm": normalize_location(profile.get("state")),
+            "city_norm": normalize_location(profile.get("city")),
+            "search_version": SEARCH_FIELDS_VERSION
+        }
+        # Leave coordinates alone when the centroid table is unavailable
+        if self.zip_centroids and self.zip_centroids.is_loaded:
+            derived["geo"] = self._location_point(profile)
+        return derived
     
     async def create_performer_profile(self, profile_data: Dict[str, Any]) -> PerformerProfile:
         """Create a new performer profile"""
         profile = PerformerProfile(**profile_data)
-        await self.db.performer_profiles.insert_one(profile.dict())
+        profile_doc = profile.dict()
+        profile_doc.update(self._derived_fields(profile_doc))
+        await self.db.performer_profiles.insert_one(profile_doc)
+        self.known_performers[profile.user_id] = True
+        self.facets.apply_change(None, profile_doc)
+        self.locations.apply_change(None, profile_doc)
         return profile
     
     async def update_performer_profile(self, user_id: str, update_data: Dict[str, Any]) -> bool:
         """Update performer profile"""
         update_data["updated_at"] = datetime.utcnow()
         
-        result = await self.db.performer_profiles.update_one(
+        # Return the previous state so search fields, facet counts and locations can be updated from the diff
+        tracked_fields = set(SEARCH_SOURCE_FIELDS) | set(FACET_SOURCE_FIELDS) | set(LOCATION_SOURCE_FIELDS)
+        previous = await self.db.performer_profiles.find_one_and_update(
             {"user_id": user_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"_id": 0, **{field: 1 for field in tracked_fields}},
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        if previous is None:
+            return False
+        
+        updated = {**previous, **update_data}
+        if any(field in update_data for field in SEARCH_SOURCE_FIELDS):
+            # Re-index the profile from its merged old and new fields
+            await self.db.performer_profiles.update_one(
+                {"user_id": user_id},
+                {"$set": self._derived_fields(updated)}
+            )
+        if any(field in update_data for field in FACET_SOURCE_FIELDS):
+            self.facets.apply_change(previous, updated)
+        if any(field in update_data for field in LOCATION_SOURCE_FIELDS):
+            self.locations.apply_change(previous, updated)
+        return True
     
     async def get_performer_profile(self, user_id: str) -> Optional[PerformerProfile]:
         """Get performer profile by user ID"""
@@ -41,23 +171,24 @@ class PerformerSearchService:
             "account_status": "active"
         }
         
-        # Text search
-        if search_params.query:
-            query["$or"] = [
-                {"stage_name": {"$regex": search_params.query, "$options": "i"}},
-                {"bio": {"$regex": search_params.query, "$options": "i"}},
-                {"specialties": {"$in": [search_params.query]}}
-            ]
+        # Text search: relevance-ranked full-text search, otherwise indexed prefix matching
+        relevance = bool(search_params.query) and search_params.sort_by == "relevance"
+        if relevance:
+            query["$text"] = {"$search": search_params.query}
+        elif search_params.query:
+            tokens = query_tokens(search_params.query)
+            if tokens:
+                query["search_tokens"] = {"$all": tokens}
         
-        # Location filters
+        # Location filters (exact match on normalized names)
         if search_params.country:
-            query["country"] = {"$regex": search_params.country, "$options": "i"}
+            query["country_norm"] = normalize_location(search_params.country)
         
         if search_params.state:
-            query["state"] = {"$regex": search_params.state, "$options": "i"}
+            query["state_norm"] = normalize_location(search_params.state)
         
         if search_params.city:
-            query["city"] = {"$regex": search_params.city, "$options": "i"}
+            query["city_norm"] = normalize_location(search_params.city)
         
         if search_params.zip_code:
             query["zip_code"] = search_params.zip_code
@@ -99,7 +230,12 @@ class PerformerSearchService:
         
         # Status filters
         if search_params.online_only:
-            query["online_status"] = "online"
+            online_ids = self.presence.online_ids("performer", "online") if self.presence else None
+            if online_ids is not None and len(online_ids) <= ONLINE_FILTER_MAX_IDS:
+                query["user_id"] = {"$in": sorted(online_ids)}
+            else:
+                # Large online populations match on the persisted status (current to the last presence flush)
+                query["online_status"] = "online"
         
         if search_params.verified_only:
             query["is_verified"] = True
@@ -111,10 +247,25 @@ class PerformerSearchService:
         if search_params.languages:
             query["languages"] = {"$in": search_params.languages}
         
-        # Build sort options
-        sort_options = []
+        # Radius search around a zip code or city centroid replaces exact location matching
+        origin = None
+        if search_params.radius_km and self.zip_centroids and (search_params.zip_code or search_params.city):
+            origin = self.zip_centroids.lookup(search_params.zip_code, search_params.city, search_params.state)
+        if origin:
+            for field in ("zip_code", "state_norm", "city_norm"):
+                query.pop(field, None)
+            if relevance:
+                # $geoNear cannot be combined with $text; match the words by prefix instead
+                relevance = False
+                del query["$text"]
+                tokens = query_tokens(search_params.query)
+                if tokens:
+                    query["search_tokens"] = {"$all": tokens}
         
-        if search_params.sort_by == "popularity":
+        # Build sort options
+        if origin and search_params.sort_by == "distance":
+            sort_field = "distance_m"
+        elif search_params.sort_by == "popularity":
             sort_field = "total_views"
         elif search_params.sort_by == "rating":
             sort_field = "average_rating"
@@ -128,26 +279,67 @@ class PerformerSearchService:
             sort_field = "total_views"  # Default
         
         sort_direction = -1 if search_params.sort_order == "desc" else 1
-        sort_options.append((sort_field, sort_direction))
-        
-        # Add secondary sort by online status (online first)
-        sort_options.append(("online_status", -1))
-        
-        # Calculate pagination
-        skip = (search_params.page - 1) * search_params.limit
-        
-        # Execute search
-        cursor = self.db.performer_profiles.find(query)
-        
-        # Apply sorting
-        for field, direction in sort_options:
-            cursor = cursor.sort(field, direction)
-        
-        # Get total count for pagination
-        total_count = await self.db.performer_profiles.count_documents(query)
-        
-        # Apply pagination
-        performers = await cursor.skip(skip).limit(search_params.limit).to_list(search_params.limit)
+        if sort_field == "distance_m":
+            sort_direction = 1
+        # user_id breaks ties so pages are stable and continuation tokens are unambiguous
+        sort_options = [(sort_field, sort_direction), ("user_id", sort_direction)]
+        
+        # A continuation token replaces skip; otherwise fall back to page/limit
+        keyset = None
+        skip = 0
+        if search_params.cursor and relevance:
+            raise ValueError("Cursor pagination is not available for relevance sorting")
+        if search_params.cursor:
+            value, last_user_id = decode_cursor(search_params.cursor, sort_field)
+            keyset = keyset_filter(sort_field, sort_direction, value, last_user_id, id_field="user_id")
+        else:
+            skip = (search_params.page - 1) * search_params.limit
+        
+        # Fetch one extra document to learn whether another page exists
+        fetch_limit = search_params.limit + 1
+        
+        if origin:
+            # $geoNear filters by radius and orders by distance in one indexed stage
+            geo_near = {
+                "$geoNear": {
+                    "near": geo_point(origin["latitude"], origin["longitude"]),
+                    "distanceField": "distance_m",
+                    "maxDistance": search_params.radius_km * METERS_PER_KM,
+                    "spherical": True,
+                    "key": "geo",
+                    "query": query
+                }
+            }
+            page = [{"$sort": dict(sort_options)}]
+            if keyset:
+                page.append({"$match": keyset})
+            page += [{"$skip": skip}, {"$limit": fetch_limit}]
+            # The page and the total within the radius come from one pass over the $geoNear output
+            result = await self.db.performer_profiles.aggregate([
+                geo_near,
+                {"$facet": {"performers": page, "total": [{"$count": "count"}]}}
+            ]).to_list(1)
+            performers = result[0]["performers"] if result else []
+            total_count = result[0]["total"][0]["count"] if result and result[0]["total"] else 0
+        elif relevance:
+            score = {"$meta": "textScore"}
+            cursor = self.db.performer_profiles.find(query, {"score": score}).sort(
+                [("score", score), ("user_id", ASCENDING)]
+            )
+            performers = await cursor.skip(skip).limit(fetch_limit).to_list(fetch_limit)
+            total_count = await self._cached_count(query)
+        else:
+            find_query = {"$and": [query, keyset]} if keyset else query
+            cursor = self.db.performer_profiles.find(find_query).sort(sort_options)
+            performers = await cursor.skip(skip).limit(fetch_limit).to_list(fetch_limit)
+            total_count = await self._cached_count(query)
+        
+        has_next = len(performers) > search_params.limit
+        performers = performers[:search_params.limit]
+        next_cursor = None
+        if has_next and not relevance:
+            last = performers[-1]
+            next_cursor = encode_cursor(sort_field, last.get(sort_field), last["user_id"])
         
         # Convert to PerformerProfile objects and add computed fields
         result_performers = []
@@ -157,28 +349,32 @@ class PerformerSearchService:
             # Add computed fields for display
             performer_dict = performer.dict()
             performer_dict["display_location"] = self._format_location(performer)
-            performer_dict["is_online"] = performer.online_status == "online"
-            performer_dict["distance_km"] = None  # Could calculate if user location provided
+            if self.presence:
+                performer_dict["online_status"] = self.presence.get_status("performer", performer.user_id)
+            performer_dict["is_online"] = performer_dict["online_status"] == "online"
+            distance_m = performer_doc.get("distance_m")
+            performer_dict["distance_km"] = round(distance_m / METERS_PER_KM, 1) if distance_m is not None else None
             
             result_performers.append(performer_dict)
         
         # Calculate pagination info
         total_pages = math.ceil(total_count / search_params.limit)
-        has_next = search_params.page < total_pages
-        has_prev = search_params.page > 1
+        has_prev = bool(search_params.cursor) or search_params.page > 1
         
         return {
             "performers": result_performers,
             "pagination": {
-                "current_page": search_params.page,
+                "current_page": None if search_params.cursor else search_params.page,
                 "total_pages": total_pages,
                 "total_count": total_count,
                 "limit": search_params.limit,
                 "has_next": has_next,
-                "has_prev": has_prev
+                "has_prev": has_prev,
+                "next_cursor": next_cursor
             },
             "filters_applied": {
                 "location": bool(search_params.country or search_params.state or search_params.city),
+                "radius": origin is not None,
                 "demographics": bool(search_params.min_age or search_params.max_age or 
                                    search_params.gender or search_params.sexual_preference or search_params.ethnicity),
                 "status": bool(search_params.online_only or search_params.verified_only),
@@ -187,6 +383,15 @@ class PerformerSearchService:
             }
         }
     
+    async def _cached_count(self, query: Dict[str, Any]) -> int:
+        """Total matches for a filter, served from a short-lived cache keyed by the normalized filter"""
+        key = json_util.dumps(query, sort_keys=True)
+        total_count = self.count_cache.get(key)
+        if total_count is None:
+            total_count = await self.db.performer_profiles.count_documents(query)
+            self.count_cache[key] = total_count
+        return total_count
+    
     def _format_location(self, performer: PerformerProfile) -> str:
         """Format performer location for display"""
         if performer.show_exact_location:
@@ -205,88 +410,63 @@ class PerformerSearchService:
     
     async def get_location_suggestions(self, query: str, location_type: str = "city") -> List[str]:
         """Get location suggestions for autocomplete"""
-        
-        if location_type == "country":
-            field = "country"
-        elif location_type == "state":
-            field = "state"
-        elif location_type == "city":
-            field = "city"
-        else:
-            field = "city"
-        
-        pipeline = [
-            {"$match": {field: {"$regex": query, "$options": "i"}}},
-            {"$group": {"_id": f"${field}"}},
-            {"$sort": {"_id": 1}},
-            {"$limit": 10}
-        ]
-        
-        results = await self.db.performer_profiles.aggregate(pipeline).to_list(10)
-        return [result["_id"] for result in results if result["_id"]]
+        return await self.locations.suggest(query, location_type)
     
     async def get_filter_options(self) -> Dict[str, List[str]]:
         """Get available filter options"""
         
-        # Get unique values for various fields
-        pipeline_templates = {
-            "body_types": {"$group": {"_id": "$body_type"}, "$sort": {"_id": 1}},
-            "hair_colors": {"$group": {"_id": "$hair_color"}, "$sort": {"_id": 1}},
-            "eye_colors": {"$group": {"_id": "$eye_color"}, "$sort": {"_id": 1}},
-            "languages": {"$unwind": "$languages", "$group": {"_id": "$languages"}, "$sort": {"_id": 1}},
-            "specialties": {"$unwind": "$specialties", "$group": {"_id": "$specialties"}, "$sort": {"_id": 1}}
-        }
-        
         filter_options = {
             "genders": [g.value for g in Gender],
             "sexual_preferences": [sp.value for sp in SexualPreference],
             "ethnicities": [e.value for e in Ethnicity],
             "sort_options": [
+                {"value": "relevance", "label": "Best Match"},
                 {"value": "popularity", "label": "Most Popular"},
                 {"value": "rating", "label": "Highest Rated"},
                 {"value": "newest", "label": "Newest"},
                 {"value": "last_active", "label": "Recently Active"},
-                {"value": "alphabetical", "label": "A-Z"}
+                {"value": "alphabetical", "label": "A-Z"},
+                {"value": "distance", "label": "Nearest (radius search)"}
             ]
         }
         
-        # Get dynamic options from database
-        for key, pipeline in pipeline_templates.items():
-            if key == "languages" or key == "specialties":
-                pipeline = [
-                    {"$unwind": f"${key[:-1]}"},  # Remove 's' and unwind
-                    {"$group": {"_id": f"${key[:-1]}"}},
-                    {"$sort": {"_id": 1}},
-                    {"$limit": 20}
-                ]
-            else:
-                pipeline = [
-                    {"$group": {"_id": f"${key[:-1]}"}},  # Remove 's'
-                    {"$sort": {"_id": 1}},
-                    {"$limit": 20}
-                ]
-            
-            try:
-                results = await self.db.performer_profiles.aggregate(pipeline).to_list(20)
-                filter_options[key] = [result["_id"] for result in results if result["_id"]]
-            except:
+        # Dynamic options and per-value counts come from the cached facet counts
+        try:
+            facet_options = await self.facets.get_options()
+            for key in DYNAMIC_FILTER_KEYS:
+                filter_options[key] = facet_options[key]
+            filter_options["facet_counts"] = facet_options["facet_counts"]
+        except Exception:
+            for key in DYNAMIC_FILTER_KEYS:
                 filter_options[key] = []
+            filter_options["facet_counts"] = {}
         
         return filter_options
     
+    async def _performer_exists(self, user_id: str) -> bool:
+        if user_id in self.known_performers:
+            return True
+        doc = await self.db.performer_profiles.find_one({"user_id": user_id}, {"_id": 0, "user_id": 1})
+        if doc is None:
+            return False
+        self.known_performers[user_id] = True
+        return True
+    
     async def increment_view_count(self, user_id: str) -> bool:
-        """Increment performer view count"""
-        result = await self.db.performer_profiles.update_one(
-            {"user_id": user_id},
-            {
-                "$inc": {"total_views": 1},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
-        return result.modified_count > 0
+        """Increment performer view count (buffered and written in batches)"""
+        if not await self._performer_exists(user_id):
+            return False
+        self.view_counter.add(user_id)
+        return True
     
     async def update_online_status(self, user_id: str, status: str) -> bool:
         """Update performer online status"""
+        if self.presence:
+            if not await self._performer_exists(user_id):
+                return False
+            # Recorded in memory and kept until changed; last_active and status changes are persisted in batches
+            self.presence.set_status("performer", user_id, status)
+            return True
         result = await self.db.performer_profiles.update_one(
             {"user_id": user_id},
             {
@@ -0,0 +1,33 @@
+import asyncio
+from typing import Optional
+
+
+class PeriodicFlusher:
+    """Base for write-behind buffers: flush() runs every flush_seconds on a background task and once more on stop()"""
+
+    flush_seconds: float
+    _task: Optional[asyncio.Task] = None
+
+    async def flush(self):
+        raise NotImplementedError
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            # Shielded so stopping mid-write does not drop the batch in flight
+            await asyncio.shield(self.flush())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the interval flush and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
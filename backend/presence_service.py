@@ -0,0 +1,206 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Set
+from pymongo import UpdateOne
+from daily_metrics_service import DailyMetricsRollup, shared_daily_metrics
+from periodic_flusher import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+# A user stays online this long after their last heartbeat
+PRESENCE_TTL_SECONDS = int(os.environ.get("PRESENCE_TTL_SECONDS", "120"))
+PRESENCE_FLUSH_SECONDS = float(os.environ.get("PRESENCE_FLUSH_SECONDS", "30"))
+
+# Kind -> where presence is persisted and how online/offline are stored
+PRESENCE_KINDS = {
+    "performer": {
+        "collection": "performer_profiles",
+        "id_field": "user_id",
+        "seen_field": "last_active",
+        "status_field": "online_status",
+        "online": "online",
+        "offline": "offline",
+        # Performer statuses are set explicitly and stay until changed, as they did before heartbeats
+        "sticky": True
+    },
+    "member": {
+        "collection": "users",
+        "id_field": "id",
+        "seen_field": "lastSeen",
+        "status_field": "isOnline",
+        "online": True,
+        "offline": False,
+        "sticky": False
+    }
+}
+
+
+class _PresenceState:
+    """Heartbeats and statuses of one kind, plus the changes not yet written"""
+
+    def __init__(self):
+        self.last_seen: Dict[str, datetime] = {}
+        self.status: Dict[str, Any] = {}
+        self.dirty_seen: Dict[str, datetime] = {}
+        self.dirty_status: Dict[str, Any] = {}
+        # Users whose status was set explicitly; they never expire
+        self.sticky: Set[str] = set()
+        # Users expired here -> the cutoff used, so the offline write only wins over older activity
+        self.expired: Dict[str, datetime] = {}
+
+
+class PresenceTracker(PeriodicFlusher):
+    """In-memory online presence with heartbeat expiry; last-seen times and status changes are persisted in batches"""
+
+    def __init__(self, db, ttl_seconds: int = PRESENCE_TTL_SECONDS,
+                 flush_seconds: float = PRESENCE_FLUSH_SECONDS,
+                 daily_metrics: Optional[DailyMetricsRollup] = None):
+        self.db = db
+        self.daily_metrics = daily_metrics or shared_daily_metrics
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.flush_seconds = flush_seconds
+        self._states = {kind: _PresenceState() for kind in PRESENCE_KINDS}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _state(self, kind: str) -> _PresenceState:
+        if kind not in self._states:
+            raise ValueError(f"Unknown presence kind: {kind}")
+        return self._states[kind]
+
+    async def load(self):
+        """Seed memory with users persisted as online; they expire unless a heartbeat arrives"""
+        now = datetime.utcnow()
+        for kind, config in PRESENCE_KINDS.items():
+            state = self._states[kind]
+            cursor = self.db[config["collection"]].find(
+                {config["status_field"]: {"$nin": [config["offline"], None]}},
+                {"_id": 0, config["id_field"]: 1, config["seen_field"]: 1, config["status_field"]: 1}
+            )
+            async for doc in cursor:
+                user_id = doc.get(config["id_field"])
+                if not user_id:
+                    continue
+                state.last_seen[user_id] = min(doc.get(config["seen_field"]) or now, now)
+                state.status[user_id] = doc[config["status_field"]]
+                if config["sticky"]:
+                    state.sticky.add(user_id)
+
+    def heartbeat(self, kind: str, user_id: str, status: Any = None):
+        """Record activity; the status defaults to the current explicit status, else the kind's online value"""
+        state = self._state(kind)
+        config = PRESENCE_KINDS[kind]
+        if status is None:
+            status = state.status.get(user_id, config["online"]) if user_id in state.sticky else config["online"]
+        if status == config["offline"]:
+            self.set_offline(kind, user_id)
+            return
+
+        now = datetime.utcnow()
+        state.last_seen[user_id] = now
+        state.dirty_seen[user_id] = now
+        state.expired.pop(user_id, None)
+        self.daily_metrics.record_active(user_id, now)
+        if state.status.get(user_id) != status:
+            state.status[user_id] = status
+            state.dirty_status[user_id] = status
+
+    def set_status(self, kind: str, user_id: str, status: Any):
+        """Set a status explicitly; it stays until changed instead of expiring with heartbeats"""
+        state = self._state(kind)
+        if status == PRESENCE_KINDS[kind]["offline"]:
+            self.set_offline(kind, user_id)
+            return
+        state.sticky.add(user_id)
+        self.heartbeat(kind, user_id, status)
+
+    def set_offline(self, kind: str, user_id: str):
+        state = self._state(kind)
+        state.last_seen.pop(user_id, None)
+        state.status.pop(user_id, None)
+        state.sticky.discard(user_id)
+        state.expired.pop(user_id, None)
+        state.dirty_seen.pop(user_id, None)
+        state.dirty_status[user_id] = PRESENCE_KINDS[kind]["offline"]
+
+    def _expire(self, kind: str):
+        state = self._states[kind]
+        cutoff = datetime.utcnow() - self.ttl
+        for user_id in [user_id for user_id, seen in state.last_seen.items()
+                        if seen < cutoff and user_id not in state.sticky]:
+            self.set_offline(kind, user_id)
+            state.expired[user_id] = cutoff
+
+    def online_ids(self, kind: str, status: Any = None) -> Set[str]:
+        """Users of a kind with a heartbeat inside the TTL, optionally only those in one status"""
+        state = self._state(kind)
+        self._expire(kind)
+        if status is None:
+            return set(state.last_seen)
+        return {user_id for user_id in state.last_seen if state.status.get(user_id) == status}
+
+    def is_online(self, kind: str, user_id: str) -> bool:
+        state = self._state(kind)
+        if user_id in state.sticky:
+            return True
+        seen = state.last_seen.get(user_id)
+        return seen is not None and seen >= datetime.utcnow() - self.ttl
+
+    def get_status(self, kind: str, user_id: str) -> Any:
+        if self.is_online(kind, user_id):
+            return self._state(kind).status.get(user_id, PRESENCE_KINDS[kind]["online"])
+        return PRESENCE_KINDS[kind]["offline"]
+
+    async def flush(self) -> int:
+        """Write coalesced last-seen times and status changes; one update per user per kind"""
+        async with self._flush_lock:
+            written = 0
+            for kind, config in PRESENCE_KINDS.items():
+                self._expire(kind)
+                state = self._states[kind]
+                if not state.dirty_seen and not state.dirty_status:
+                    continue
+                dirty_seen, dirty_status, expired = state.dirty_seen, state.dirty_status, state.expired
+                state.dirty_seen, state.dirty_status, state.expired = {}, {}, {}
+
+                operations = []
+                for user_id in set(dirty_seen) | set(dirty_status):
+                    query = {config["id_field"]: user_id}
+                    fields = {}
+                    if user_id in dirty_seen:
+                        fields[config["seen_field"]] = dirty_seen[user_id]
+                        # Rewritten with every last-seen update, so an offline written by another
+                        # process that had not seen this activity yet is corrected on the next flush
+                        fields[config["status_field"]] = state.status.get(user_id, config["online"])
+                    if user_id in dirty_status:
+                        fields[config["status_field"]] = dirty_status[user_id]
+                    if user_id in expired:
+                        # Only expire if no process has persisted newer activity for this user
+                        query[config["seen_field"]] = {"$lt": expired[user_id]}
+                    operations.append(UpdateOne(query, {"$set": fields}))
+                try:
+                    await self.db[config["collection"]].bulk_write(operations, ordered=False)
+                    written += len(operations)
+                except Exception as e:
+                    # Keep anything newer that arrived while the write was in flight
+                    for user_id, seen in dirty_seen.items():
+                        state.dirty_seen.setdefault(user_id, seen)
+                    for user_id, status in dirty_status.items():
+                        state.dirty_status.setdefault(user_id, status)
+                    for user_id, cutoff in expired.items():
+                        if user_id in state.dirty_status:
+                            state.expired.setdefault(user_id, cutoff)
+                    logger.error(f"Failed to persist {kind} presence: {str(e)}")
+            return written
+
+    def metrics(self) -> Dict[str, Any]:
+        metrics = {}
+        for kind in PRESENCE_KINDS:
+            state = self._states[kind]
+            metrics[kind] = {
+                "online": len(self.online_ids(kind)),
+                "pending_writes": len(set(state.dirty_seen) | set(state.dirty_status))
+            }
+        return metrics
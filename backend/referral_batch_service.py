@@ -0,0 +1,217 @@
+import os
+import uuid
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from affiliate_credits_models import CreditAccount, CreditTransaction, CreditTransactionType
+from credit_ledger import CreditLedger, APPLIED_BATCHES_FIELD, APPLIED_BATCH_HISTORY
+from daily_metrics_service import DailyMetricsRollup, shared_daily_metrics
+from affiliate_stats_service import AffiliateStatsProjection
+
+logger = logging.getLogger(__name__)
+
+# Bonus for codes whose program does not set referralBonus (the AffiliateProgram default)
+REFERRAL_BONUS_CREDITS = 10.0
+DUPLICATE_KEY_ERROR = 11000
+# Batches still marked pending after this long are assumed abandoned by a crashed worker
+REFERRAL_BATCH_RECOVERY_SECONDS = int(os.environ.get("REFERRAL_BATCH_RECOVERY_SECONDS", "300"))
+
+
+class ReferralBatchProcessor:
+    """Applies many referral signups with one bulk write per collection, keeping per-referrer totals exact"""
+
+    def __init__(self, db, ledger: Optional[CreditLedger] = None,
+                 daily_metrics: Optional[DailyMetricsRollup] = None):
+        self.db = db
+        self.ledger = ledger or CreditLedger(db)
+        self.daily_metrics = daily_metrics or shared_daily_metrics
+        self.stats = AffiliateStatsProjection(db)
+
+    async def ensure_indexes(self):
+        await self.db.referral_tracking.create_index(
+            [("affiliateCode", ASCENDING), ("hasSignedUp", ASCENDING), ("createdAt", ASCENDING)],
+            name="referral_pending_by_code"
+        )
+        # A user can be referred once; the index makes concurrent batches (and single signups) agree on that
+        try:
+            await self.db.referral_tracking.drop_index("referral_user")
+        except OperationFailure:
+            pass
+        await self.db.referral_tracking.create_index(
+            [("referredUserId", ASCENDING)], unique=True, name="referral_user_unique",
+            partialFilterExpression={"referredUserId": {"$type": "string"}}
+        )
+        await self.db.referral_tracking.create_index([("batchId", ASCENDING)], sparse=True, name="referral_batch")
+
+    async def process(self, signups: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """Match (affiliate_code, new_user_id) signups to pending referral clicks and award their credits"""
+        batch_id = str(uuid.uuid4())
+        unmatched: List[Dict[str, str]] = []
+
+        # One referral per new user, and none for users already credited as a referral
+        new_user_ids = list(dict.fromkeys(user_id for _, user_id in signups))
+        already_referred = set(await self.db.referral_tracking.distinct(
+            "referredUserId", {"referredUserId": {"$in": new_user_ids}}
+        ))
+        by_code: Dict[str, List[str]] = defaultdict(list)
+        seen = set()
+        for code, user_id in signups:
+            if user_id in seen or user_id in already_referred:
+                unmatched.append({"affiliateCode": code, "newUserId": user_id, "reason": "already_referred"})
+                continue
+            seen.add(user_id)
+            by_code[code].append(user_id)
+
+        # Oldest pending clicks per code, reading only as many as that code has signups; a popular
+        # code can have far more unconverted clicks than fit in one grouped document
+        codes = list(by_code)
+        pending = await asyncio.gather(*(self._pending_clicks(code, len(by_code[code])) for code in codes))
+        pending_ids = dict(zip(codes, pending))
+        bonuses = await self._referral_bonuses(codes)
+
+        now = datetime.utcnow()
+        claims = []
+        claim_users = []
+        for code, user_ids in by_code.items():
+            tracking_ids = pending_ids.get(code, [])
+            for tracking_id, user_id in zip(tracking_ids, user_ids):
+                claim_users.append(user_id)
+                claims.append(UpdateOne(
+                    {"id": tracking_id, "hasSignedUp": False},
+                    {"$set": {
+                        "referredUserId": user_id,
+                        "hasSignedUp": True,
+                        "signupDate": now,
+                        "creditsAwarded": bonuses.get(code, REFERRAL_BONUS_CREDITS),
+                        "updatedAt": now,
+                        "batchId": batch_id,
+                        "creditBatchPending": True
+                    }}
+                ))
+            unmatched.extend(
+                {"affiliateCode": code, "newUserId": user_id, "reason": "no_pending_referral"}
+                for user_id in user_ids[len(tracking_ids):]
+            )
+
+        claimed: List[Dict[str, Any]] = []
+        if claims:
+            referred_concurrently = set()
+            try:
+                await self.db.referral_tracking.bulk_write(claims, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                    raise
+                # The unique referredUserId index rejected users another request referred since the check above
+                referred_concurrently = {claim_users[error["index"]] for error in errors}
+            # Clicks claimed by a concurrent request keep their other batch id and are not counted here
+            claimed = await self._claimed(batch_id)
+            claimed_users = {doc["referredUserId"] for doc in claimed}
+            unmatched.extend(
+                {"affiliateCode": code, "newUserId": user_id,
+                 "reason": "already_referred" if user_id in referred_concurrently else "claimed_concurrently"}
+                for code, user_ids in by_code.items()
+                for user_id in user_ids[:len(pending_ids.get(code, []))]
+                if user_id not in claimed_users
+            )
+            await self._apply(batch_id, claimed)
+
+        return {
+            "batch_id": batch_id,
+            "processed": len(claimed),
+            "referrers": len({doc["referrerId"] for doc in claimed}),
+            "credits_awarded": sum(doc["creditsAwarded"] for doc in claimed),
+            "unmatched": unmatched
+        }
+
+    async def _referral_bonuses(self, codes: List[str]) -> Dict[str, float]:
+        programs = await self.db.affiliate_programs.find(
+            {"affiliateCode": {"$in": codes}}, {"_id": 0, "affiliateCode": 1, "referralBonus": 1}
+        ).to_list(len(codes))
+        return {
+            program["affiliateCode"]: program["referralBonus"]
+            for program in programs if program.get("referralBonus") is not None
+        }
+
+    async def _pending_clicks(self, code: str, limit: int) -> List[str]:
+        clicks = await self.db.referral_tracking.find(
+            {"affiliateCode": code, "hasSignedUp": False}, {"_id": 0, "id": 1}
+        ).sort("createdAt", ASCENDING).limit(limit).to_list(limit)
+        return [click["id"] for click in clicks]
+
+    async def _claimed(self, batch_id: str) -> List[Dict[str, Any]]:
+        return await self.db.referral_tracking.find(
+            {"batchId": batch_id},
+            {"_id": 0, "id": 1, "affiliateCode": 1, "referrerId": 1, "referredUserId": 1, "creditsAwarded": 1,
+             "createdAt": 1, "signupDate": 1}
+        ).to_list(None)
+
+    async def _apply(self, batch_id: str, claimed: List[Dict[str, Any]], resuming: bool = False):
+        """Credit referrers and update affiliate stats for a claimed batch; safe to run again for the same batch"""
+        if not claimed:
+            return
+        # A resumed batch may already be credited for some referrers; their credits were counted then
+        already_credited = set()
+        if resuming:
+            already_credited = set(await self.db.credit_accounts.distinct("userId", {
+                "userId": {"$in": list({doc["referrerId"] for doc in claimed})},
+                APPLIED_BATCHES_FIELD: batch_id
+            }))
+        credits: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        referrals_by_code: Counter = Counter()
+        credits_by_code: Counter = Counter()
+        for doc in claimed:
+            transaction = CreditTransaction(
+                # Derived from the referral so a re-applied batch cannot record it twice
+                id=f"referral-{doc['id']}",
+                userId=doc["referrerId"],
+                creditAccountId=doc["referrerId"],
+                transactionType=CreditTransactionType.EARNED_REFERRAL,
+                amount=doc["creditsAwarded"],
+                description=f"Referral bonus for new member {doc['referredUserId']}",
+                relatedId=doc["referredUserId"],
+                relatedType="referral"
+            )
+            credits[doc["referrerId"]].append(transaction.dict())
+            referrals_by_code[doc["affiliateCode"]] += 1
+            credits_by_code[doc["affiliateCode"]] += doc["creditsAwarded"]
+
+        await self.ledger.credit_many(batch_id, credits, lambda user_id: CreditAccount(userId=user_id).dict())
+
+        now = datetime.utcnow()
+        await self.db.affiliate_programs.bulk_write([
+            UpdateOne(
+                {"affiliateCode": code, APPLIED_BATCHES_FIELD: {"$ne": batch_id}},
+                {
+                    "$inc": {"totalReferrals": count, "totalCreditsEarned": credits_by_code[code]},
+                    "$set": {"updatedAt": now, "lastActiveAt": now},
+                    "$push": {APPLIED_BATCHES_FIELD: {"$each": [batch_id], "$slice": -APPLIED_BATCH_HISTORY}}
+                }
+            )
+            for code, count in referrals_by_code.items()
+        ], ordered=False)
+        await self.stats.record_referrals(claimed, batch_id)
+
+        for doc in claimed:
+            if doc["referrerId"] not in already_credited:
+                self.daily_metrics.record_credit_transaction(doc["creditsAwarded"])
+        await self.db.referral_tracking.update_many(
+            {"batchId": batch_id}, {"$unset": {"creditBatchPending": ""}}
+        )
+
+    async def recover(self) -> int:
+        """Finish batches whose clicks were claimed but whose credits a crashed worker may not have applied"""
+        cutoff = datetime.utcnow() - timedelta(seconds=REFERRAL_BATCH_RECOVERY_SECONDS)
+        batch_ids = await self.db.referral_tracking.distinct(
+            "batchId", {"creditBatchPending": True, "signupDate": {"$lt": cutoff}}
+        )
+        for batch_id in batch_ids:
+            try:
+                await self._apply(batch_id, await self._claimed(batch_id), resuming=True)
+            except Exception as e:
+                logger.error(f"Failed to recover referral batch {batch_id}: {str(e)}")
+        return len(batch_ids)
@@ -0,0 +1,343 @@
+import os
+import re
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+from cachetools import TTLCache
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from affiliate_credits_models import ReferralTracking
+from affiliate_stats_service import AffiliateStatsProjection
+from daily_metrics_service import day_key
+from periodic_flusher import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+REFERRAL_CLICK_FLUSH_SECONDS = float(os.environ.get("REFERRAL_CLICK_FLUSH_SECONDS", "1"))
+REFERRAL_CLICK_MAX_PENDING = int(os.environ.get("REFERRAL_CLICK_MAX_PENDING", "2000"))
+# Clicks held while writes keep failing; the oldest are dropped beyond this
+REFERRAL_CLICK_MAX_BUFFERED = int(os.environ.get("REFERRAL_CLICK_MAX_BUFFERED", "50000"))
+# Failed writes are retried after flush_seconds, doubling up to this
+REFERRAL_CLICK_MAX_BACKOFF_SECONDS = float(os.environ.get("REFERRAL_CLICK_MAX_BACKOFF_SECONDS", "60"))
+# How often codes created by other workers are pulled into the filter
+AFFILIATE_CODE_REFRESH_SECONDS = float(os.environ.get("AFFILIATE_CODE_REFRESH_SECONDS", "30"))
+# createdAt is set before the insert lands, so each refresh re-reads a little of the previous window
+AFFILIATE_CODE_REFRESH_OVERLAP = timedelta(minutes=1)
+
+# Codes are always generated as REF + 8 upper-case hex digits
+AFFILIATE_CODE_PATTERN = re.compile(r"^REF[0-9A-F]{8}$")
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+BLOOM_MIN_CAPACITY = 100000
+KNOWN_CODE_CACHE_SIZE = 100000
+KNOWN_CODE_TTL_SECONDS = 3600
+UNKNOWN_CODE_CACHE_SIZE = 50000
+UNKNOWN_CODE_TTL_SECONDS = 60
+DUPLICATE_KEY_ERROR = 11000
+
+
+class BloomFilter:
+    """Fixed-size bit array with double hashing; no false negatives, about 1% false positives at capacity"""
+
+    def __init__(self, capacity: int, false_positive_rate: float = BLOOM_FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        # Re-adding a known key leaves every bit set, so it is not counted twice
+        if added:
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class AffiliateCodeFilter:
+    """Validates affiliate codes in memory: format check, bloom filter of all codes, and code -> member caches"""
+
+    def __init__(self, db=None, refresh_seconds: float = AFFILIATE_CODE_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self._bloom: Optional[BloomFilter] = None
+        self._loaded_until: Optional[datetime] = None
+        self._known: TTLCache = TTLCache(maxsize=KNOWN_CODE_CACHE_SIZE, ttl=KNOWN_CODE_TTL_SECONDS)
+        self._unknown: TTLCache = TTLCache(maxsize=UNKNOWN_CODE_CACHE_SIZE, ttl=UNKNOWN_CODE_TTL_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+        self._counts = {"rejected_format": 0, "rejected_bloom": 0, "rejected_cached": 0,
+                        "cache_hits": 0, "lookups": 0}
+
+    def bind(self, db):
+        self.db = db
+
+    async def load(self) -> int:
+        """Rebuild the bloom filter from every affiliate code"""
+        started = datetime.utcnow()
+        total = await self.db.affiliate_programs.count_documents({})
+        bloom = BloomFilter(max(BLOOM_MIN_CAPACITY, total * 2))
+        async for program in self.db.affiliate_programs.find({}, {"_id": 0, "affiliateCode": 1}):
+            bloom.add(program["affiliateCode"])
+        self._bloom = bloom
+        self._loaded_until = started
+        return bloom.count
+
+    async def refresh(self) -> int:
+        """Add codes created since the last load, e.g. by other workers"""
+        if self._bloom is None or self._bloom.count >= self._bloom.capacity:
+            return await self.load()
+        started = datetime.utcnow()
+        added = 0
+        cursor = self.db.affiliate_programs.find(
+            {"createdAt": {"$gte": self._loaded_until - AFFILIATE_CODE_REFRESH_OVERLAP}},
+            {"_id": 0, "affiliateCode": 1, "memberId": 1}
+        )
+        async for program in cursor:
+            self.add(program["affiliateCode"], program["memberId"])
+            added += 1
+        self._loaded_until = started
+        return added
+
+    def add(self, code: str, member_id: str):
+        """Register a newly created code so its clicks are accepted immediately"""
+        if self._bloom is not None:
+            self._bloom.add(code)
+        self._unknown.pop(code, None)
+        self._known[code] = member_id
+
+    async def resolve(self, code: str) -> Optional[str]:
+        """Member id owning `code`, or None when the code does not exist"""
+        if not AFFILIATE_CODE_PATTERN.match(code):
+            self._counts["rejected_format"] += 1
+            return None
+        member_id = self._known.get(code)
+        if member_id is not None:
+            self._counts["cache_hits"] += 1
+            return member_id
+        if code in self._unknown:
+            self._counts["rejected_cached"] += 1
+            return None
+        # Until the filter is loaded every well-formed code goes to the database
+        if self._bloom is not None and code not in self._bloom:
+            self._counts["rejected_bloom"] += 1
+            return None
+
+        self._counts["lookups"] += 1
+        program = await self.db.affiliate_programs.find_one(
+            {"affiliateCode": code}, {"_id": 0, "memberId": 1}
+        )
+        if program is None:
+            self._unknown[code] = True
+            return None
+        self._known[code] = program["memberId"]
+        return program["memberId"]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to refresh affiliate codes: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._counts,
+            "bloom_codes": self._bloom.count if self._bloom else 0,
+            "bloom_capacity": self._bloom.capacity if self._bloom else 0,
+            "known_cached": len(self._known),
+            "unknown_cached": len(self._unknown)
+        }
+
+
+def click_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class ReferralClickIngestor(PeriodicFlusher):
+    """Buffers validated referral clicks and writes them with insert_many plus per-code hourly counters"""
+
+    def __init__(self, db, codes: AffiliateCodeFilter, stats: Optional[AffiliateStatsProjection] = None,
+                 flush_seconds: float = REFERRAL_CLICK_FLUSH_SECONDS,
+                 max_pending: int = REFERRAL_CLICK_MAX_PENDING,
+                 max_buffered: int = REFERRAL_CLICK_MAX_BUFFERED):
+        self.db = db
+        self.codes = codes
+        self.stats = stats or AffiliateStatsProjection(db)
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+        self._pending: List[Dict[str, Any]] = []
+        self._hourly: Counter = Counter()
+        # member id -> {day: clicks} not yet added to the affiliate stats projection
+        self._member_days: Dict[str, Counter] = defaultdict(Counter)
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Consecutive failed writes, and the monotonic time before which the flush loop does not retry
+        self._failures = 0
+        self._retry_at = 0.0
+        self._counts = {"accepted": 0, "rejected": 0, "written": 0, "flushes": 0, "failed_flushes": 0,
+                        "dropped": 0}
+
+    async def ensure_indexes(self):
+        await self.db.affiliate_programs.create_index([("affiliateCode", ASCENDING)], name="affiliate_code")
+        await self.db.affiliate_programs.create_index([("createdAt", ASCENDING)], name="affiliate_created")
+        await self.db.referral_click_hourly.create_index(
+            [("affiliateCode", ASCENDING), ("hour", ASCENDING)], name="click_hourly_code"
+        )
+        await self.db.referral_tracking.create_index(
+            [("referrerId", ASCENDING), ("hasSignedUp", ASCENDING), ("signupDate", ASCENDING)],
+            name="referral_signups_by_referrer"
+        )
+
+    async def track(self, affiliate_code: str, ip_address: str, user_agent: str,
+                    referrer_url: str) -> Optional[ReferralTracking]:
+        """Validate and buffer one click; None when the code does not exist"""
+        referrer_id = await self.codes.resolve(affiliate_code)
+        if referrer_id is None:
+            self._counts["rejected"] += 1
+            return None
+
+        tracking = ReferralTracking(
+            affiliateCode=affiliate_code,
+            referrerId=referrer_id,
+            ipAddress=ip_address,
+            userAgent=user_agent,
+            referrerUrl=referrer_url
+        )
+        # A stable _id makes re-inserting a partly written batch hit only duplicates
+        self._pending.append({"_id": tracking.id, **tracking.dict()})
+        self._hourly[(affiliate_code, click_hour(tracking.createdAt))] += 1
+        self._member_days[referrer_id][day_key(tracking.createdAt)] += 1
+        self._counts["accepted"] += 1
+        if (len(self._pending) >= self.max_pending and not self._flush_lock.locked()
+                and time.monotonic() >= self._retry_at):
+            asyncio.get_running_loop().create_task(self.flush())
+        return tracking
+
+    async def flush(self) -> int:
+        """Insert buffered clicks and add them to the hourly counters; failed batches are returned to the buffer
+
+        Counters for a batch are applied once, after every click in it has been stored.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            # Backing off after a failed write; a direct flush (no loop, or on stop) still tries
+            if self._task is not None and time.monotonic() < self._retry_at:
+                return 0
+            clicks, hourly, member_days = self._pending, self._hourly, self._member_days
+            self._pending, self._hourly, self._member_days = [], Counter(), defaultdict(Counter)
+            try:
+                try:
+                    await self.db.referral_tracking.insert_many(clicks, ordered=False)
+                except BulkWriteError as e:
+                    # Duplicates are clicks an earlier, partly failed attempt already wrote
+                    if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                        raise
+            except Exception as e:
+                self._counts["failed_flushes"] += 1
+                self._pending[:0] = clicks
+                self._hourly.update(hourly)
+                self._requeue_member_days(member_days)
+                self._failures += 1
+                backoff = min(self.flush_seconds * 2 ** self._failures, REFERRAL_CLICK_MAX_BACKOFF_SECONDS)
+                self._retry_at = time.monotonic() + backoff
+                logger.error(f"Failed to write {len(clicks)} referral clicks, retrying in {backoff:.1f}s: {str(e)}")
+                self._drop_oldest(len(self._pending) - self.max_buffered)
+                return 0
+
+            self._failures = 0
+            self._retry_at = 0.0
+
+            now = datetime.utcnow()
+            try:
+                await self.db.referral_click_hourly.bulk_write([
+                    UpdateOne(
+                        {"affiliateCode": code, "hour": hour},
+                        {"$inc": {"clicks": count}, "$set": {"updated_at": now}},
+                        upsert=True
+                    )
+                    for (code, hour), count in hourly.items()
+                ], ordered=False)
+            except Exception as e:
+                # The clicks themselves are stored; only the counters are retried
+                self._hourly.update(hourly)
+                logger.error(f"Failed to update hourly click counters: {str(e)}")
+            try:
+                await self.stats.record_clicks(member_days)
+            except Exception as e:
+                self._requeue_member_days(member_days)
+                logger.error(f"Failed to add clicks to affiliate stats: {str(e)}")
+
+            self._counts["written"] += len(clicks)
+            self._counts["flushes"] += 1
+            return len(clicks)
+
+    def _drop_oldest(self, count: int):
+        """Discard the oldest buffered clicks along with their share of the pending counters"""
+        if count <= 0:
+            return
+        dropped, self._pending = self._pending[:count], self._pending[count:]
+        for click in dropped:
+            self._hourly[(click["affiliateCode"], click_hour(click["createdAt"]))] -= 1
+            self._member_days[click["referrerId"]][day_key(click["createdAt"])] -= 1
+        self._hourly = +self._hourly
+        for member_id in list(self._member_days):
+            days = +self._member_days[member_id]
+            if days:
+                self._member_days[member_id] = days
+            else:
+                del self._member_days[member_id]
+        self._counts["dropped"] += count
+        logger.warning(f"Dropped {count} buffered referral clicks over the {self.max_buffered} limit")
+
+    def _requeue_member_days(self, member_days: Dict[str, Counter]):
+        for member_id, days in member_days.items():
+            self._member_days[member_id].update(days)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._counts,
+            "pending": len(self._pending),
+            "pending_counters": len(self._hourly),
+            "pending_stats_members": len(self._member_days),
+            "flush_seconds": self.flush_seconds,
+            "max_pending": self.max_pending,
+            "max_buffered": self.max_buffered,
+            "codes": self.codes.metrics()
+        }
+
+
+# Shared by every AffiliateService so codes created anywhere in the process are known at once
+shared_affiliate_codes = AffiliateCodeFilter()
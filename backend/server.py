@@ -1,19 +1,20 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
+from cachetools import TTLCache
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timedelta
-from enum import Enum
 import random
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from datetime import timedelta
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -41,18 +42,35 @@ from api_key_models import (
 from video_service import VideoConferencingService, VideoRecordingService
 from calendar_service import CalendarIntegrationService
 from shipping_service import ShippingLabelService
+from http_client import shared_http_client as http_client
+from file_streaming import ranged_file_response
+from payment_routes import webhook_router as payment_webhook_router, init_webhooks
 from trial_service import TrialService
 from performer_search_service import PerformerSearchService
 from affiliate_credits_service import AffiliateService, CreditService, PayoutService, ShoppingCartService
+from credit_ledger import CreditLedger
+from referral_click_service import ReferralClickIngestor, shared_affiliate_codes as affiliate_codes
+from member_dashboard_cache import shared_dashboard_cache as dashboard_cache
+from referral_batch_service import ReferralBatchProcessor
 from affiliate_credits_models import (
     AffiliateProgram, ReferralTracking, CreditAccount, CreditTransaction,
     ExpertPayoutAccount, PayoutRequest, PayoutHistory, ShoppingCart, CartItem,
-    AffiliateStatus, CreditTransactionType, PayoutStatus, PayoutMethod
+    AffiliateStatus, CreditTransactionType, PayoutStatus, PayoutMethod, BulkReferralSignupRequest
 )
 from member_auth_service import MemberAuthService
+from presence_service import PresenceTracker
+from daily_metrics_service import shared_daily_metrics as daily_metrics
 from member_profile_service import MemberProfileService
 from admin_auth_service import AdminAuthService
 from admin_management_service import AdminManagementService
+from access_control_models import (
+    LocationPreference, TeaserSettings, BlockedUser, AccessRequest, BulkAccessRequest,
+    LocationBatchRequest
+)
+from access_control_service import AccessControlService
+from geoip_service import GeoIPResolver
+from expert_discovery_service import ExpertDiscoveryService
+from zip_centroid_service import ZipCentroidTable
 
 
 ROOT_DIR = Path(__file__).parent
@@ -69,92 +87,6 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Enums
-class SubscriptionType(str, Enum):
-    FREE = "free"
-    MONTHLY = "monthly"
-    PER_VISIT = "per_visit"
-    TEASER = "teaser"
-
-class AccessLevel(str, Enum):
-    FULL = "full"
-    TEASER = "teaser"
-    BLOCKED = "blocked"
-
-class BlockReason(str, Enum):
-    HARASSMENT = "harassment"
-    BAD_LANGUAGE = "bad_language"
-    INAPPROPRIATE_BEHAVIOR = "inappropriate_behavior"
-    SPAM = "spam"
-    OTHER = "other"
-
-# Location Models
-class Location(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    country: str
-    country_code: str
-    state: Optional[str] = None
-    state_code: Optional[str] = None
-    city: Optional[str] = None
-    zip_code: Optional[str] = None
-    latitude: Optional[float] = None
-    longitude: Optional[float] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class LocationPreference(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    performer_id: str
-    location_type: str  # "country", "state", "city", "zip_code"
-    location_value: str  # e.g., "US", "CA", "Los Angeles", "90210"
-    is_allowed: bool  # True for allowed, False for blocked
-    subscription_type: SubscriptionType
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-# Teaser Models
-class TeaserSettings(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    performer_id: str
-    enabled: bool = True
-    duration_seconds: int = Field(default=30, ge=5, le=300)  # 5 seconds to 5 minutes
-    message: Optional[str] = "Preview time expired! Subscribe to continue viewing my profile."
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-class TeaserSession(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    performer_id: str
-    user_id: str
-    user_ip: str
-    started_at: datetime = Field(default_factory=datetime.utcnow)
-    expires_at: datetime
-    is_active: bool = True
-
-# User Blocking Models
-class BlockedUser(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    performer_id: str
-    blocked_user_id: str
-    blocked_user_ip: Optional[str] = None
-    reason: BlockReason
-    notes: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-# Access Control Models
-class AccessRequest(BaseModel):
-    performer_id: str
-    user_id: Optional[str] = None
-    user_ip: str
-    location: Location
-
-class AccessResponse(BaseModel):
-    access_level: AccessLevel
-    allowed: bool
-    reason: str
-    teaser_remaining_seconds: Optional[int] = None
-    subscription_required: Optional[SubscriptionType] = None
-    message: Optional[str] = None
-
 # Define Models
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -164,254 +96,25 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
-# Mock Geo-IP Detection Service
-async def mock_detect_location_from_ip(ip_address: str) -> Location:
-    """Mock implementation of IP geolocation - replace with real Google Geo IP API"""
-    # Mock data for different IP ranges
-    mock_locations = [
-        Location(
-            country="United States",
-            country_code="US", 
-            state="California",
-            state_code="CA",
-            city="Los Angeles",
-            zip_code="90210",
-            latitude=34.0522,
-            longitude=-118.2437
-        ),
-        Location(
-            country="United States",
-            country_code="US",
-            state="New York", 
-            state_code="NY",
-            city="New York",
-            zip_code="10001",
-            latitude=40.7128,
-            longitude=-74.0060
-        ),
-        Location(
-            country="United States",
-            country_code="US",
-            state="Massachusetts", 
-            state_code="MA",
-            city="Boston",
-            zip_code="02115",
-            latitude=42.3601,
-            longitude=-71.0589
-        ),
-        Location(
-            country="United States",
-            country_code="US",
-            state="Texas", 
-            state_code="TX",
-            city="Austin",
-            zip_code="78701",
-            latitude=30.2672,
-            longitude=-97.7431
-        ),
-        Location(
-            country="United States",
-            country_code="US",
-            state="Florida", 
-            state_code="FL",
-            city="Miami",
-            zip_code="33101",
-            latitude=25.7617,
-            longitude=-80.1918
-        ),
-        Location(
-            country="Canada",
-            country_code="CA",
-            state="Ontario",
-            state_code="ON",
-            city="Toronto",
-            zip_code="M5H 2N2",
-            latitude=43.6532,
-            longitude=-79.3832
-        )
-    ]
-    
-    # Randomly select a location for demo purposes
-    # In production, this would use actual IP geolocation
-    import random
-    return random.choice(mock_locations)
+# Offline GeoIP database (compiled from CSV and memory-mapped at startup)
+geoip_resolver = GeoIPResolver(
+    os.environ.get('GEOIP_CSV_PATH', str(ROOT_DIR / 'data' / 'geoip_ranges.csv')),
+    os.environ.get('GEOIP_DB_PATH', str(ROOT_DIR / 'data' / 'geoip_ranges.bin'))
+)
 
 # Access Control Service
-class AccessControlService:
-    def __init__(self):
-        pass
-    
-    async def get_user_location(self, request: Request) -> Location:
-        """Get user location from IP address"""
-        user_ip = request.client.host
-        # Handle localhost/development IPs
-        if user_ip in ["127.0.0.1", "::1", "localhost"]:
-            user_ip = "192.168.1.100"  # Mock IP for development
-        
-        return await mock_detect_location_from_ip(user_ip)
-    
-    async def check_location_access(self, performer_id: str, user_location: Location) -> tuple[bool, SubscriptionType, str]:
-        """Check if user's location is allowed to access performer's profile"""
-        # Get performer's location preferences
-        preferences = await db.location_preferences.find({"performer_id": performer_id}).to_list(1000)
-        
-        if not preferences:
-            # No preferences set - default to free access globally
-            return True, SubscriptionType.FREE, "Global access allowed"
-        
-        # Check each location preference
-        for pref in preferences:
-            pref_obj = LocationPreference(**pref)
-            location_match = False
-            
-            # Check location match based on preference type
-            if pref_obj.location_type == "country" and pref_obj.location_value.lower() == user_location.country_code.lower():
-                location_match = True
-            elif pref_obj.location_type == "state" and pref_obj.location_value.lower() == user_location.state_code.lower():
-                location_match = True
-            elif pref_obj.location_type == "city" and pref_obj.location_value.lower() == user_location.city.lower():
-                location_match = True
-            elif pref_obj.location_type == "zip_code" and pref_obj.location_value == user_location.zip_code:
-                location_match = True
-            
-            if location_match:
-                if pref_obj.is_allowed:
-                    return True, pref_obj.subscription_type, f"Access allowed for {pref_obj.location_type}: {pref_obj.location_value}"
-                else:
-                    return False, None, f"Access blocked for {pref_obj.location_type}: {pref_obj.location_value}"
-        
-        # No matching preferences found - default behavior
-        return False, None, "Location not in allowed regions"
-    
-    async def check_user_blocked(self, performer_id: str, user_id: Optional[str], user_ip: str) -> tuple[bool, str]:
-        """Check if user is blocked by the performer"""
-        # Check by user ID if available
-        if user_id:
-            blocked = await db.blocked_users.find_one({
-                "performer_id": performer_id,
-                "blocked_user_id": user_id
-            })
-            if blocked:
-                blocked_obj = BlockedUser(**blocked)
-                return True, f"User blocked: {blocked_obj.reason.value}"
-        
-        # Check by IP address
-        blocked = await db.blocked_users.find_one({
-            "performer_id": performer_id,
-            "blocked_user_ip": user_ip
-        })
-        if blocked:
-            blocked_obj = BlockedUser(**blocked)
-            return True, f"IP blocked: {blocked_obj.reason.value}"
-        
-        return False, ""
-    
-    async def get_or_create_teaser_session(self, performer_id: str, user_id: Optional[str], user_ip: str) -> Optional[TeaserSession]:
-        """Get existing teaser session or create new one"""
-        # Get teaser settings
-        teaser_settings = await db.teaser_settings.find_one({"performer_id": performer_id})
-        if not teaser_settings or not teaser_settings.get("enabled", False):
-            return None
-        
-        settings = TeaserSettings(**teaser_settings)
-        
-        # Check for existing active session
-        query = {"performer_id": performer_id, "user_ip": user_ip, "is_active": True}
-        if user_id:
-            query["user_id"] = user_id
-        
-        existing_session = await db.teaser_sessions.find_one(query)
-        if existing_session:
-            session = TeaserSession(**existing_session)
-            if session.expires_at > datetime.utcnow():
-                return session
-            else:
-                # Deactivate expired session
-                await db.teaser_sessions.update_one(
-                    {"id": session.id},
-                    {"$set": {"is_active": False}}
-                )
-        
-        # Create new teaser session
-        new_session = TeaserSession(
-            performer_id=performer_id,
-            user_id=user_id or "",
-            user_ip=user_ip,
-            expires_at=datetime.utcnow() + timedelta(seconds=settings.duration_seconds)
-        )
-        
-        await db.teaser_sessions.insert_one(new_session.dict())
-        return new_session
-    
-    async def check_profile_access(self, access_request: AccessRequest) -> AccessResponse:
-        """Main access control logic"""
-        performer_id = access_request.performer_id
-        user_id = access_request.user_id
-        user_ip = access_request.user_ip
-        location = access_request.location
-        
-        # 1. Check if user is blocked
-        is_blocked, block_reason = await self.check_user_blocked(performer_id, user_id, user_ip)
-        if is_blocked:
-            return AccessResponse(
-                access_level=AccessLevel.BLOCKED,
-                allowed=False,
-                reason=block_reason,
-                message="You are blocked from accessing this profile."
-            )
-        
-        # 2. Check location access
-        location_allowed, subscription_type, location_reason = await self.check_location_access(performer_id, location)
-        if not location_allowed:
-            return AccessResponse(
-                access_level=AccessLevel.BLOCKED,
-                allowed=False,
-                reason=location_reason,
-                message="This profile is not available in your location."
-            )
-        
-        # 3. Handle subscription types
-        if subscription_type == SubscriptionType.FREE:
-            return AccessResponse(
-                access_level=AccessLevel.FULL,
-                allowed=True,
-                reason="Free access granted",
-                message="Welcome! Enjoy full access to this profile."
-            )
-        
-        elif subscription_type == SubscriptionType.TEASER:
-            # Check/create teaser session
-            teaser_session = await self.get_or_create_teaser_session(performer_id, user_id, user_ip)
-            if teaser_session and teaser_session.expires_at > datetime.utcnow():
-                remaining_seconds = int((teaser_session.expires_at - datetime.utcnow()).total_seconds())
-                return AccessResponse(
-                    access_level=AccessLevel.TEASER,
-                    allowed=True,
-                    reason="Teaser access active",
-                    teaser_remaining_seconds=remaining_seconds,
-                    message=f"Preview mode - {remaining_seconds} seconds remaining"
-                )
-            else:
-                return AccessResponse(
-                    access_level=AccessLevel.BLOCKED,
-                    allowed=False,
-                    reason="Teaser expired",
-                    subscription_required=SubscriptionType.MONTHLY,
-                    message="Preview time expired! Subscribe to continue viewing this profile."
-                )
-        
-        else:  # MONTHLY or PER_VISIT
-            # TODO: Check if user has active subscription/payment
-            # For now, return subscription required
-            return AccessResponse(
-                access_level=AccessLevel.BLOCKED,
-                allowed=False,
-                reason="Subscription required",
-                subscription_required=subscription_type,
-                message=f"This profile requires a {subscription_type.value} subscription."
-            )
+access_control = AccessControlService(db, geoip_resolver)
+
+# Per-day analytics counters (incremented from events, flushed in batches)
+daily_metrics.bind(db)
 
-access_control = AccessControlService()
+# Online presence (heartbeats in memory, last-seen times persisted in batches)
+presence_tracker = PresenceTracker(db, daily_metrics=daily_metrics)
+
+# Zip code and city centroids for radius search (loaded at startup)
+zip_centroids = ZipCentroidTable(
+    os.environ.get('ZIP_CENTROIDS_CSV_PATH', str(ROOT_DIR / 'data' / 'zip_centroids.csv'))
+)
 
 # API Routes
 # API Routes
@@ -435,9 +138,18 @@ async def get_status_checks():
 
 # Location Detection API
 @api_router.post("/detect-location")
-async def detect_user_location(request: Request):
-    """Detect user's location from IP address"""
+async def detect_user_location(request: Request, batch: Optional[LocationBatchRequest] = None):
+    """Detect user's location from IP address, or resolve a batch of addresses"""
     try:
+        if batch:
+            return {
+                "success": True,
+                "locations": {
+                    ip: location.dict() if location else None
+                    for ip, location in geoip_resolver.resolve_many(batch.ips).items()
+                }
+            }
+        
         location = await access_control.get_user_location(request)
         return {
             "success": True,
@@ -467,10 +179,12 @@ async def create_location_preference(performer_id: str, preference: LocationPref
             {"id": existing["id"]},
             {"$set": preference.dict()}
         )
+        access_control.location_rules.invalidate(performer_id)
         return {"success": True, "message": "Location preference updated"}
     else:
         # Create new preference
         await db.location_preferences.insert_one(preference.dict())
+        access_control.location_rules.invalidate(performer_id)
         return {"success": True, "message": "Location preference created"}
 
 @api_router.get("/performer/{performer_id}/location-preferences")
@@ -490,6 +204,7 @@ async def delete_location_preference(performer_id: str, preference_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Location preference not found")
     
+    access_control.location_rules.invalidate(performer_id)
     return {"success": True, "message": "Location preference deleted"}
 
 # Teaser Settings API
@@ -572,28 +287,39 @@ async def check_profile_access(request: Request, access_request: AccessRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Access check failed: {str(e)}")
 
+@api_router.post("/check-profile-access/bulk")
+async def check_bulk_profile_access(request: Request, bulk_request: BulkAccessRequest):
+    """Check if a user can access each of many performer profiles (e.g. a search results grid)"""
+    try:
+        # Get user location if not provided
+        if not bulk_request.location:
+            bulk_request.location = await access_control.get_user_location(request)
+        
+        # Set user IP
+        bulk_request.user_ip = request.client.host
+        
+        results = await access_control.check_bulk_profile_access(bulk_request)
+        return {
+            "success": True,
+            "results": results
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk access check failed: {str(e)}")
+
 # Teaser Session API
 @api_router.get("/teaser-session/{performer_id}")
 async def get_teaser_session_status(performer_id: str, request: Request, user_id: Optional[str] = None):
     """Get current teaser session status for a user"""
     user_ip = request.client.host
     
-    # Find active teaser session
-    query = {"performer_id": performer_id, "user_ip": user_ip, "is_active": True}
-    if user_id:
-        query["user_id"] = user_id
-    
-    session = await db.teaser_sessions.find_one(query)
-    if not session:
+    # Served from the in-memory session layer while the viewer polls
+    session_obj = await access_control.teaser_sessions.get(performer_id, user_id, user_ip)
+    if not session_obj:
         return {"active": False, "message": "No active teaser session"}
     
-    session_obj = TeaserSession(**session)
     if session_obj.expires_at <= datetime.utcnow():
-        # Deactivate expired session
-        await db.teaser_sessions.update_one(
-            {"id": session_obj.id},
-            {"$set": {"is_active": False}}
-        )
         return {"active": False, "message": "Teaser session expired"}
     
     remaining_seconds = int((session_obj.expires_at - datetime.utcnow()).total_seconds())
@@ -637,72 +363,31 @@ async def search_experts_by_location(
 ):
     """Search experts by geographic location with radius"""
     try:
-        # Mock implementation for demonstration
-        # In production, this would use geolocation services and database queries
-        
-        base_experts = [
-            {
-                "id": 1,
-                "name": "Dr. Sarah Chen",
-                "specialty": "Family Medicine",
-                "location": {"city": "Boston", "state": "MA", "zip": "02115"},
-                "distance": 5.2,
-                "hourly_rate": 150
-            },
-            {
-                "id": 2,
-                "name": "James Wilson",
-                "specialty": "Life Insurance",
-                "location": {"city": "Cambridge", "state": "MA", "zip": "02138"},
-                "distance": 8.7,
-                "hourly_rate": 100
-            },
-            {
-                "id": 3,
-                "name": "David Thompson",
-                "specialty": "Business Consulting",
-                "location": {"city": "Newton", "state": "MA", "zip": "02458"},
-                "distance": 12.3,
-                "hourly_rate": 200
-            }
-        ]
-        
-        # Filter by radius
-        filtered_experts = [expert for expert in base_experts if expert["distance"] <= radius]
-        
-        # Filter by category if specified
-        if category:
-            category_map = {
-                "medical": ["Family Medicine", "Cardiology", "Mental Health"],
-                "insurance": ["Life Insurance", "Health Insurance"],
-                "business": ["Business Consulting", "Financial Consulting"]
-            }
-            relevant_specialties = category_map.get(category, [])
-            filtered_experts = [expert for expert in filtered_experts if expert["specialty"] in relevant_specialties]
+        search_results = await expert_discovery_service.search_by_location(
+            zip_code=zip_code, city=city, state=state, category=category, radius_miles=radius
+        )
+        experts = search_results["experts"]
+        origin = search_results["origin"]
         
         search_location = ""
         if zip_code:
-            # Add city lookup for zip code (mock implementation)
-            zip_to_city = {
-                "02115": "Boston, MA",
-                "02138": "Cambridge, MA", 
-                "02458": "Newton, MA"
-            }
-            city_name = zip_to_city.get(zip_code, "Unknown City")
+            city_name = f"{origin['city']}, {origin['state_code']}" if origin else "Unknown City"
             search_location = f"{zip_code} ({city_name})"
         elif city and state:
             search_location = f"{city}, {state}"
         elif city:
             search_location = city
+        elif state:
+            search_location = state
             
         return {
             "success": True,
-            "experts": filtered_experts,
+            "experts": experts,
             "search_params": {
                 "location": search_location,
                 "radius": radius,
                 "category": category,
-                "total_results": len(filtered_experts)
+                "total_results": len(experts)
             }
         }
     except Exception as e:
@@ -770,298 +455,34 @@ async def discover_experts(
     status: Optional[str] = None,
     experienceLevel: Optional[str] = None,
     sortBy: Optional[str] = None,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    q: Optional[str] = None
 ):
     """Enhanced expert discovery with comprehensive filtering"""
     try:
-        # This would normally query the database, but for demo we'll return mock data
-        # In a real implementation, this would filter the experts collection in MongoDB
-        
-        mock_experts = [
-            # Medical Experts
-            {
-                "id": 1,
-                "name": "Dr. Sarah Chen",
-                "category": "medical",
-                "specialty": "Family Medicine",
-                "location": {"city": "Boston", "state": "MA", "zipCode": "02115"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 15,
-                "isOnline": True,
-                "rating": 4.9,
-                "consultationRate": 150,
-                "profileImage": "https://images.unsplash.com/photo-1559839734-2b71ea197ec2",
-                "credentials": ["MD", "Board Certified"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            {
-                "id": 2,
-                "name": "Dr. Michael Rodriguez",
-                "category": "medical",
-                "specialty": "Cardiology",
-                "location": {"city": "Houston", "state": "TX", "zipCode": "77002"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 20,
-                "isOnline": False,
-                "rating": 4.8,
-                "consultationRate": 250,
-                "profileImage": "https://images.unsplash.com/photo-1612349317150-e413f6a5b16d",
-                "credentials": ["MD", "FACC"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            {
-                "id": 3,
-                "name": "Dr. Emily Foster",
-                "category": "medical",
-                "specialty": "Pediatrics",
-                "location": {"city": "Los Angeles", "state": "CA", "zipCode": "90210"},
-                "experienceLevel": "experienced",
-                "yearsOfExperience": 12,
-                "isOnline": True,
-                "rating": 4.7,
-                "consultationRate": 180,
-                "profileImage": "https://images.unsplash.com/photo-1582750433449-648ed127bb54",
-                "credentials": ["MD", "Pediatric Board Certified"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            # Insurance Experts
-            {
-                "id": 4,
-                "name": "James Wilson",
-                "category": "insurance",
-                "specialty": "Life Insurance",
-                "location": {"city": "Denver", "state": "CO", "zipCode": "80202"},
-                "experienceLevel": "experienced",
-                "yearsOfExperience": 15,
-                "isOnline": True,
-                "rating": 4.7,
-                "consultationRate": 100,
-                "profileImage": "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d",
-                "credentials": ["Licensed Agent"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            {
-                "id": 5,
-                "name": "Lisa Anderson",
-                "category": "insurance",
-                "specialty": "Auto & Home Insurance",
-                "location": {"city": "Phoenix", "state": "AZ", "zipCode": "85001"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 18,
-                "isOnline": True,
-                "rating": 4.8,
-                "consultationRate": 85,
-                "profileImage": "https://images.unsplash.com/photo-1494790108755-2616c8da6ad6",
-                "credentials": ["Licensed Agent", "CPCU"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            # Business Experts
-            {
-                "id": 6,
-                "name": "David Thompson",
-                "category": "business",
-                "specialty": "Strategy Consulting",
-                "location": {"city": "Seattle", "state": "WA", "zipCode": "98101"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 22,
-                "isOnline": True,
-                "rating": 4.9,
-                "consultationRate": 200,
-                "profileImage": "https://images.unsplash.com/photo-1472099645785-5658abf4ff4e",
-                "credentials": ["MBA", "CPA"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            {
-                "id": 7,
-                "name": "Amanda Rodriguez",
-                "category": "business",
-                "specialty": "Marketing Strategy",
-                "location": {"city": "Miami", "state": "FL", "zipCode": "33101"},
-                "experienceLevel": "experienced",
-                "yearsOfExperience": 10,
-                "isOnline": False,
-                "rating": 4.6,
-                "consultationRate": 175,
-                "profileImage": "https://images.unsplash.com/photo-1580489944761-15a19d654956",
-                "credentials": ["MBA", "PMP"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            # Education Experts
-            {
-                "id": 8,
-                "name": "Professor Robert Adams",
-                "category": "education",
-                "specialty": "Mathematics",
-                "location": {"city": "Boston", "state": "MA", "zipCode": "02116"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 25,
-                "isOnline": True,
-                "rating": 4.9,
-                "consultationRate": 75,
-                "profileImage": "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d",
-                "credentials": ["PhD Mathematics"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            {
-                "id": 9,
-                "name": "Jennifer Kim",
-                "category": "education",
-                "specialty": "Language Learning",
-                "location": {"city": "San Francisco", "state": "CA", "zipCode": "94102"},
-                "experienceLevel": "experienced",
-                "yearsOfExperience": 8,
-                "isOnline": True,
-                "rating": 4.8,
-                "consultationRate": 60,
-                "profileImage": "https://images.unsplash.com/photo-1438761681033-6461ffad8d80",
-                "credentials": ["MA Linguistics", "TESOL Certified"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            {
-                "id": 10,
-                "name": "Marcus Johnson",
-                "category": "education",
-                "specialty": "SAT/ACT Prep",
-                "location": {"city": "Chicago", "state": "IL", "zipCode": "60601"},
-                "experienceLevel": "intermediate",
-                "yearsOfExperience": 6,
-                "isOnline": True,
-                "rating": 4.7,
-                "consultationRate": 55,
-                "profileImage": "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d",
-                "credentials": ["MS Education", "SAT Certified"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            # Legal Experts
-            {
-                "id": 11,
-                "name": "Attorney Michelle Stone",
-                "category": "legal",
-                "specialty": "Family Law",
-                "location": {"city": "Atlanta", "state": "GA", "zipCode": "30309"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 16,
-                "isOnline": False,
-                "rating": 4.8,
-                "consultationRate": 300,
-                "profileImage": "https://images.unsplash.com/photo-1594736797933-d0ff1d1e2e8e",
-                "credentials": ["JD", "State Bar Certified"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            {
-                "id": 12,
-                "name": "Richard Parker",
-                "category": "legal",
-                "specialty": "Business Law",
-                "location": {"city": "New York", "state": "NY", "zipCode": "10001"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 24,
-                "isOnline": True,
-                "rating": 4.9,
-                "consultationRate": 450,
-                "profileImage": "https://images.unsplash.com/photo-1556157382-97eda2d62296",
-                "credentials": ["JD", "LLM", "NY Bar"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            # Financial Experts
-            {
-                "id": 13,
-                "name": "Thomas Bradford",
-                "category": "financial",
-                "specialty": "Investment Planning",
-                "location": {"city": "Dallas", "state": "TX", "zipCode": "75201"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 19,
-                "isOnline": True,
-                "rating": 4.8,
-                "consultationRate": 275,
-                "profileImage": "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d",
-                "credentials": ["CFP", "CFA"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            {
-                "id": 14,
-                "name": "Sophia Williams",
-                "category": "financial",
-                "specialty": "Retirement Planning",
-                "location": {"city": "Portland", "state": "OR", "zipCode": "97201"},
-                "experienceLevel": "experienced",
-                "yearsOfExperience": 11,
-                "isOnline": True,
-                "rating": 4.7,
-                "consultationRate": 225,
-                "profileImage": "https://images.unsplash.com/photo-1580489944761-15a19d654956",
-                "credentials": ["CFP", "ChFC"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            },
-            # Technology Experts
-            {
-                "id": 15,
-                "name": "Kevin Zhang",
-                "category": "technology",
-                "specialty": "Cybersecurity",
-                "location": {"city": "Austin", "state": "TX", "zipCode": "78701"},
-                "experienceLevel": "expert",
-                "yearsOfExperience": 14,
-                "isOnline": True,
-                "rating": 4.9,
-                "consultationRate": 225,
-                "profileImage": "https://images.unsplash.com/photo-1472099645785-5658abf4ff4e",
-                "credentials": ["CISSP", "CEH"],
-                "availableFor": ["chat", "video_call", "in_person"]
-            }
-        ]
-        
-        # Apply filters
-        filtered_experts = mock_experts
-        
-        # Filter by category
-        if category and category != 'all':
-            filtered_experts = [e for e in filtered_experts if e['category'] == category]
-        
-        # Filter by status
-        if status and status != 'all':
-            if status == 'online':
-                filtered_experts = [e for e in filtered_experts if e['isOnline']]
-            elif status == 'offline':
-                filtered_experts = [e for e in filtered_experts if not e['isOnline']]
-        
-        # Filter by experience level
-        if experienceLevel and experienceLevel != 'all':
-            experience_map = {
-                'entry': (0, 2),
-                'intermediate': (3, 7),
-                'experienced': (8, 15),
-                'expert': (16, 100)
-            }
-            if experienceLevel in experience_map:
-                min_exp, max_exp = experience_map[experienceLevel]
-                filtered_experts = [e for e in filtered_experts if min_exp <= e['yearsOfExperience'] <= max_exp]
-        
-        # Sort results
-        if sortBy:
-            if sortBy == 'rating':
-                filtered_experts.sort(key=lambda x: x['rating'], reverse=True)
-            elif sortBy == 'price_low':
-                filtered_experts.sort(key=lambda x: x['consultationRate'])
-            elif sortBy == 'price_high':
-                filtered_experts.sort(key=lambda x: x['consultationRate'], reverse=True)
-            elif sortBy == 'experience':
-                filtered_experts.sort(key=lambda x: x['yearsOfExperience'], reverse=True)
-        
-        # Apply limit
-        filtered_experts = filtered_experts[:limit]
+        page = await expert_discovery_service.discover_experts(
+            category=category,
+            status=status,
+            experience_level=experienceLevel,
+            sort_by=sortBy,
+            limit=limit,
+            cursor=cursor,
+            search=q
+        )
         
         return {
             "success": True,
-            "experts": filtered_experts,
-            "total": len(filtered_experts),
+            "experts": page["experts"],
+            "total": len(page["experts"]),
+            "next_cursor": page["next_cursor"],
             "filters_applied": {
                 "category": category,
                 "location": location,
                 "status": status,
                 "experienceLevel": experienceLevel,
-                "sortBy": sortBy
+                "sortBy": sortBy,
+                "q": q
             }
         }
         
@@ -1123,57 +544,37 @@ async def get_expert_categories():
 @api_router.get("/experts/featured")
 async def get_featured_experts():
     """Get featured experts"""
-    # For now, return sample expert data
-    featured_experts = [
-        {
-            "id": "expert_001",
-            "name": "Dr. Sarah Chen",
-            "title": "Senior Corporate Attorney",
-            "category": "legal",
-            "rating": 4.9,
-            "consultations": 1247,
-            "rate": 350.0,
-            "image": "https://images.unsplash.com/photo-1573496359142-b8d87734a5a2"
-        },
-        {
-            "id": "expert_002",
-            "name": "Dr. Priya Patel",
-            "title": "Internal Medicine Physician",
-            "category": "medical",
-            "rating": 4.9,
-            "consultations": 1456,
-            "rate": 200.0,
-            "image": "https://images.unsplash.com/photo-1582750433449-648ed127bb54"
-        },
-        {
-            "id": "expert_003",
-            "name": "Jennifer Thompson",
-            "title": "Certified Financial Planner",
-            "category": "financial",
-            "rating": 4.8,
-            "consultations": 734,
-            "rate": 250.0,
-            "image": "https://images.unsplash.com/photo-1580489944761-15a19d654956"
-        }
-    ]
+    featured_experts = await expert_discovery_service.get_featured_experts()
     return {"featured_experts": featured_experts}
 
 # Include the router in the main app
 app.include_router(api_router)
 
 # API Key Management Service
+# Resolved credentials are reused for this long; writes through the service invalidate them immediately
+API_KEY_CACHE_TTL_SECONDS = int(os.environ.get("API_KEY_CACHE_TTL_SECONDS", "60"))
+
 class APIKeyService:
-    def __init__(self):
-        pass
+    def __init__(self, cache_ttl_seconds: int = API_KEY_CACHE_TTL_SECONDS):
+        self.cache = TTLCache(maxsize=256, ttl=cache_ttl_seconds)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        # Bumped on every write so lookups that started before it are not cached
+        self._generation = 0
+    
+    def invalidate(self):
+        """Drop cached credentials after any API key write"""
+        self._generation += 1
+        self.cache.clear()
+        self._inflight.clear()
     
     async def create_api_key(self, key_data: APIKeyCreate, created_by: str) -> APIKey:
         """Create a new API key"""
         api_key = APIKey(**key_data.dict(), created_by=created_by)
         await db.api_keys.insert_one(api_key.dict())
+        self.invalidate()
         return api_key
     
-    async def get_api_key(self, key_type: APIKeyType, active_only: bool = True) -> Optional[APIKey]:
-        """Get API key by type"""
+    async def _load_api_key(self, key_type: APIKeyType, active_only: bool) -> Optional[APIKey]:
         query = {"key_type": key_type.value}
         if active_only:
             query["status"] = APIKeyStatus.ACTIVE.value
@@ -1183,6 +584,34 @@ class APIKeyService:
             return APIKey(**key_doc)
         return None
     
+    async def get_api_key(self, key_type: APIKeyType, active_only: bool = True) -> Optional[APIKey]:
+        """Get API key by type (cached; concurrent lookups for the same type share one query)"""
+        cache_key = (key_type.value, active_only)
+        if cache_key in self.cache:
+            return self.cache[cache_key]
+        
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        # The load runs as its own task so a cancelled caller cannot strand the others waiting on it
+        task = asyncio.get_running_loop().create_task(self._load_and_cache(cache_key, key_type, active_only))
+        # Retrieve a failure even when every caller was cancelled before it arrived
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[cache_key] = task
+        return await asyncio.shield(task)
+    
+    async def _load_and_cache(self, cache_key: tuple, key_type: APIKeyType, active_only: bool) -> Optional[APIKey]:
+        generation = self._generation
+        try:
+            api_key = await self._load_api_key(key_type, active_only)
+            if generation == self._generation:
+                self.cache[cache_key] = api_key
+            return api_key
+        finally:
+            if self._inflight.get(cache_key) is asyncio.current_task():
+                del self._inflight[cache_key]
+    
     async def get_all_api_keys(self) -> list[APIKey]:
         """Get all API keys"""
         keys = await db.api_keys.find().to_list(1000)
@@ -1197,44 +626,56 @@ class APIKeyService:
             {"id": key_id},
             {"$set": update_dict}
         )
+        self.invalidate()
         return result.modified_count > 0
     
     async def delete_api_key(self, key_id: str) -> bool:
         """Delete an API key"""
         result = await db.api_keys.delete_one({"id": key_id})
+        self.invalidate()
         return result.deleted_count > 0
 
 api_key_service = APIKeyService()
 
 # Initialize video services
-video_service = VideoConferencingService(api_key_service)
-recording_service = VideoRecordingService(db)
+video_service = VideoConferencingService(api_key_service, http_client)
+recording_service = VideoRecordingService(db, http_client)
 
 # Initialize calendar service
-calendar_service = CalendarIntegrationService(api_key_service, db)
+calendar_service = CalendarIntegrationService(api_key_service, db, http_client)
 
 # Initialize shipping service
-shipping_service = ShippingLabelService(api_key_service, db)
+shipping_service = ShippingLabelService(api_key_service, db, http_client)
 
 # Initialize trial service
 trial_service = TrialService(db)
 
 # Initialize performer search service
-performer_search_service = PerformerSearchService(db)
+performer_search_service = PerformerSearchService(db, zip_centroids, presence_tracker)
+
+# Initialize expert discovery service
+expert_discovery_service = ExpertDiscoveryService(db, zip_centroids)
 
 # Initialize affiliate, credits, and payout services
-affiliate_service = AffiliateService(db)
-credit_service = CreditService(db)
-payout_service = PayoutService(db)
+affiliate_codes.bind(db)
+referral_click_ingestor = ReferralClickIngestor(db, affiliate_codes)
+affiliate_service = AffiliateService(db, referral_click_ingestor, affiliate_codes)
+credit_ledger = CreditLedger(db)
+credit_service = CreditService(db, daily_metrics, credit_ledger)
+referral_batch_processor = ReferralBatchProcessor(db, credit_ledger, daily_metrics)
+payout_service = PayoutService(db, daily_metrics)
 cart_service = ShoppingCartService(db)
 
 # Initialize member services
-member_auth_service = MemberAuthService(db)
-member_profile_service = MemberProfileService(db)
+member_auth_service = MemberAuthService(db, presence_tracker, daily_metrics)
+member_profile_service = MemberProfileService(db, zip_centroids)
 
 # Initialize admin services
-admin_auth_service = AdminAuthService(db)
-admin_management_service = AdminManagementService(db)
+admin_auth_service = AdminAuthService(db, daily_metrics)
+admin_management_service = AdminManagementService(db, daily_metrics, zip_centroids)
+
+# Payment webhook ingestion (stored once per event id, applied by background workers)
+webhook_processor = init_webhooks(db)
 
 # Video Conferencing API Routes
 @api_router.post("/video/agora/token")
@@ -1861,6 +1302,25 @@ async def logout_member(logout_data: dict):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Logout failed: {str(e)}")
 
+@api_router.post("/members/{member_id}/heartbeat")
+async def member_heartbeat(member_id: str):
+    """Keep a member marked as online"""
+    presence_tracker.heartbeat("member", member_id)
+    return {"success": True}
+
+@api_router.get("/presence/{kind}/online")
+async def get_online_users(kind: str, limit: int = 100):
+    """Get users of a kind (performer or member) that are currently online"""
+    try:
+        online_ids = sorted(presence_tracker.online_ids(kind))
+        return {
+            "success": True,
+            "online_count": len(online_ids),
+            "user_ids": online_ids[:limit]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @api_router.post("/members/verify-email")
 async def verify_member_email(verification_data: dict):
     """Verify member email address"""
@@ -2267,10 +1727,13 @@ async def get_financial_overview():
         raise HTTPException(status_code=400, detail=f"Failed to get financial overview: {str(e)}")
 
 @api_router.get("/admin/finances/transactions")
-async def get_transaction_history(transaction_type: str = "all", limit: int = 100):
+async def get_transaction_history(transaction_type: str = "all", limit: int = 100, cursor: Optional[str] = None,
+                                  start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
     """Get transaction history"""
     try:
-        result = await admin_management_service.get_transaction_history(transaction_type, limit)
+        result = await admin_management_service.get_transaction_history(
+            transaction_type, limit, cursor, start_date, end_date
+        )
         if result.get('success'):
             return result
         else:
@@ -2278,6 +1741,22 @@ async def get_transaction_history(transaction_type: str = "all", limit: int = 10
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to get transaction history: {str(e)}")
 
+@api_router.get("/admin/finances/transactions/export")
+async def export_transaction_history(format: str = "csv", transaction_type: str = "all",
+                                     start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+    """Stream the full transaction ledger as CSV or NDJSON"""
+    try:
+        chunks = admin_management_service.ledger.export(format, transaction_type, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"transactions-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # =============================================================================
 # ADMIN ANALYTICS API ROUTES
 # =============================================================================
@@ -2294,6 +1773,70 @@ async def get_platform_analytics(period: str = "30d"):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to get analytics: {str(e)}")
 
+@api_router.get("/admin/metrics/view-counter")
+async def get_view_counter_metrics():
+    """Get buffered performer view counter metrics"""
+    return {
+        "success": True,
+        "metrics": performer_search_service.view_counter.metrics()
+    }
+
+@api_router.get("/admin/metrics/http")
+async def get_http_client_metrics():
+    """Get outbound integration request metrics per provider"""
+    return {
+        "success": True,
+        "metrics": http_client.metrics()
+    }
+
+@api_router.get("/admin/metrics/webhooks")
+async def get_webhook_metrics():
+    """Get payment webhook ingestion metrics"""
+    return {
+        "success": True,
+        "metrics": webhook_processor.metrics()
+    }
+
+@api_router.get("/admin/metrics/presence")
+async def get_presence_metrics():
+    """Get online presence tracker metrics"""
+    return {
+        "success": True,
+        "metrics": presence_tracker.metrics()
+    }
+
+@api_router.get("/admin/metrics/credit-ledger")
+async def get_credit_ledger_metrics():
+    """Get credit ledger debit and outbox relay metrics"""
+    return {
+        "success": True,
+        "metrics": credit_ledger.metrics()
+    }
+
+@api_router.get("/admin/metrics/member-dashboards")
+async def get_member_dashboard_metrics():
+    """Get member dashboard cache metrics"""
+    return {
+        "success": True,
+        "metrics": dashboard_cache.metrics()
+    }
+
+@api_router.get("/admin/metrics/referral-clicks")
+async def get_referral_click_metrics():
+    """Get referral click ingestion and affiliate code filter metrics"""
+    return {
+        "success": True,
+        "metrics": referral_click_ingestor.metrics()
+    }
+
+@api_router.get("/admin/metrics/daily-rollups")
+async def get_daily_rollup_metrics():
+    """Get daily analytics rollup metrics"""
+    return {
+        "success": True,
+        "metrics": daily_metrics.metrics()
+    }
+
 @api_router.get("/admin/analytics/engagement")
 async def get_user_engagement_metrics():
     """Get user engagement metrics"""
@@ -2381,6 +1924,20 @@ async def process_referral_signup(affiliate_code: str, new_user_id: str):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to process referral signup: {str(e)}")
 
+@api_router.post("/affiliate/process-signups/bulk")
+async def process_referral_signups_bulk(request: BulkReferralSignupRequest):
+    """Process a batch of referral signups and award their credits together"""
+    try:
+        result = await referral_batch_processor.process(
+            [(signup.affiliateCode, signup.newUserId) for signup in request.signups]
+        )
+        return {
+            "success": True,
+            **result
+        }
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to process referral signups: {str(e)}")
+
 @api_router.get("/affiliate/{member_id}/stats")
 async def get_referral_stats(member_id: str):
     """Get referral statistics for a member"""
@@ -2603,30 +2160,29 @@ async def get_max_credits_usable(user_id: str):
 async def download_recording(recording_id: str):
     """Download a recording file"""
     try:
-        recording = await recording_service.get_recording_by_id(recording_id)
-        if not recording:
-            raise HTTPException(status_code=404, detail="Recording not found")
-        
-        file_urls = recording.get("file_urls", [])
-        if not file_urls:
-            raise HTTPException(status_code=404, detail="No recording files available")
-        
-        # Download the first file (you can extend this to handle multiple files)
-        file_url = file_urls[0] if isinstance(file_urls, list) else file_urls
-        local_path = await recording_service.download_recording_file(recording_id, file_url)
-        
-        if not local_path:
-            raise HTTPException(status_code=500, detail="Failed to download recording")
+        local_path = await recording_service.fetch_recording_file(recording_id)
         
         return {
             "success": True,
             "download_path": local_path,
+            "file_url": f"/api/video/recordings/{recording_id}/file",
             "recording_id": recording_id
         }
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Download failed: {str(e)}")
 
+@api_router.get("/video/recordings/{recording_id}/file")
+async def stream_recording_file(recording_id: str, request: Request):
+    """Stream a recording file, with Range support for seeking and resumed downloads"""
+    try:
+        local_path = await recording_service.fetch_recording_file(recording_id)
+        return ranged_file_response(local_path, request.headers.get("range"), os.path.basename(local_path))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Streaming failed: {str(e)}")
+
 @api_router.get("/video/twilio/recordings/{room_sid}")
 async def get_twilio_room_recordings(room_sid: str):
     """Get Twilio recordings for a specific room"""
@@ -2680,6 +2236,7 @@ async def create_appointment(appointment_data: dict):
     """Create a new appointment"""
     appointment = Appointment(**appointment_data)
     await db.appointments.insert_one(appointment.dict())
+    dashboard_cache.invalidate(appointment.member_id)
     return appointment
 
 @api_router.get("/performer/{performer_id}/appointments", response_model=list[Appointment])
@@ -2704,6 +2261,9 @@ async def update_appointment_status(appointment_id: str, status: AppointmentStat
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Appointment not found")
+    appointment = await db.appointments.find_one({"id": appointment_id}, {"_id": 0, "member_id": 1})
+    if appointment:
+        dashboard_cache.invalidate(appointment["member_id"])
     return {"success": True, "message": "Appointment status updated"}
 
 @api_router.post("/performer/{performer_id}/availability", response_model=AppointmentAvailability)
@@ -2726,6 +2286,7 @@ async def create_chat_room(chat_data: dict):
     """Create a new chat room"""
     chat_room = ChatRoom(**chat_data)
     await db.chat_rooms.insert_one(chat_room.dict())
+    dashboard_cache.invalidate_many(chat_room.participants)
     return chat_room
 
 @api_router.get("/chat/rooms/{user_id}", response_model=list[ChatRoom])
@@ -2853,6 +2414,7 @@ async def update_order_shipping(order_id: str, shipping_data: dict):
 
 # Include the router in the main app
 app.include_router(api_router)
+app.include_router(payment_webhook_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -2869,6 +2431,112 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_services():
+    http_client.start()
+    try:
+        await access_control.teaser_sessions.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Failed to create teaser session indexes: {str(e)}")
+    try:
+        zip_centroids.load()
+    except Exception as e:
+        logger.error(f"Zip centroid table unavailable, radius search disabled: {str(e)}")
+    try:
+        await expert_discovery_service.ensure_indexes()
+        await performer_search_service.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Failed to create search indexes: {str(e)}")
+    try:
+        await performer_search_service.facets.refresh()
+    except Exception as e:
+        logger.error(f"Failed to compute performer facet counts: {str(e)}")
+    try:
+        await performer_search_service.locations.build()
+    except Exception as e:
+        logger.error(f"Failed to build location autocomplete index: {str(e)}")
+    performer_search_service.view_counter.start()
+    try:
+        await presence_tracker.load()
+    except Exception as e:
+        logger.error(f"Failed to load online presence: {str(e)}")
+    presence_tracker.start()
+    try:
+        await webhook_processor.ensure_indexes()
+        recovered = await webhook_processor.recover()
+        if recovered:
+            logger.info(f"Re-queued {recovered} unprocessed webhook events")
+    except Exception as e:
+        logger.error(f"Failed to recover webhook events: {str(e)}")
+    webhook_processor.start()
+    try:
+        await admin_management_service.summary.ensure_indexes()
+        await admin_management_service.ledger.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Failed to create admin summary and ledger indexes: {str(e)}")
+    admin_management_service.summary.start()
+    try:
+        await daily_metrics.ensure_indexes()
+        backfilled = await daily_metrics.backfill()
+        if backfilled:
+            logger.info(f"Backfilled {backfilled} days of daily metrics")
+    except Exception as e:
+        logger.error(f"Failed to backfill daily metrics: {str(e)}")
+    daily_metrics.start()
+    try:
+        await credit_ledger.ensure_indexes()
+        recovered = await credit_ledger.recover()
+        if recovered:
+            logger.info(f"Re-queued {recovered} unrelayed credit transactions")
+    except Exception as e:
+        logger.error(f"Failed to recover credit ledger outbox: {str(e)}")
+    credit_ledger.start()
+    try:
+        await referral_batch_processor.ensure_indexes()
+        recovered = await referral_batch_processor.recover()
+        if recovered:
+            logger.info(f"Finished {recovered} interrupted referral batches")
+    except Exception as e:
+        logger.error(f"Failed to recover referral batches: {str(e)}")
+    try:
+        await referral_click_ingestor.ensure_indexes()
+        await affiliate_service.stats.ensure_indexes()
+        loaded = await affiliate_codes.load()
+        logger.info(f"Loaded {loaded} affiliate codes for click validation")
+    except Exception as e:
+        logger.error(f"Failed to load affiliate codes, clicks will be validated against the database: {str(e)}")
+    affiliate_codes.start()
+    referral_click_ingestor.start()
+    try:
+        geoip_resolver.open()
+    except Exception as e:
+        logger.error(f"GeoIP database unavailable, locations will resolve as unknown: {str(e)}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    try:
+        await performer_search_service.view_counter.stop()
+    except Exception as e:
+        logger.error(f"Failed to flush buffered view counts: {str(e)}")
+    try:
+        await presence_tracker.stop()
+    except Exception as e:
+        logger.error(f"Failed to persist online presence: {str(e)}")
+    try:
+        await referral_click_ingestor.stop()
+    except Exception as e:
+        logger.error(f"Failed to write buffered referral clicks: {str(e)}")
+    await affiliate_codes.stop()
+    try:
+        await credit_ledger.stop()
+    except Exception as e:
+        logger.error(f"Failed to relay credit transactions: {str(e)}")
+    try:
+        await daily_metrics.stop()
+    except Exception as e:
+        logger.error(f"Failed to flush daily metrics: {str(e)}")
+    await webhook_processor.stop()
+    await admin_management_service.summary.stop()
+    await http_client.close()
     client.close()
+    geoip_resolver.close()
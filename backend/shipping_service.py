@@ -5,14 +5,16 @@ from typing import Optional, Dict, Any, List
 from datetime import datetime
 from xml.etree import ElementTree as ET
 from fastapi import HTTPException
-import httpx
 import aiofiles
 from api_key_models import APIKeyType
+from http_client import OutboundHTTPClient, shared_http_client
+from token_manager import OAuthTokenManager
 
 
 class USPSShippingService:
-    def __init__(self, api_key_service):
+    def __init__(self, api_key_service, http_client: Optional[OutboundHTTPClient] = None):
         self.api_key_service = api_key_service
+        self.http_client = http_client or shared_http_client
         self.test_url = "https://secure.shippingapis.com/ShippingAPITest.dll"
         self.prod_url = "https://secure.shippingapis.com/ShippingAPI.dll"
     
@@ -141,13 +143,13 @@ class USPSShippingService:
             to_address, from_address, package_info, credentials["user_id"]
         )
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.test_url}?API=eVS",
-                data=f"XML={xml_payload}",
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-                timeout=30.0
-            )
+        response = await self.http_client.post(
+            "usps",
+            f"{self.test_url}?API=eVS",
+            data=f"XML={xml_payload}",
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            timeout=30.0
+        )
         
         if response.status_code != 200:
             raise HTTPException(status_code=400, detail=f"USPS API error: {response.text}")
@@ -162,13 +164,14 @@ class USPSShippingService:
         
         xml_payload = self.generate_tracking_xml(tracking_number, credentials["user_id"])
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.test_url}?API=TrackV2",
-                data=f"XML={xml_payload}",
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-                timeout=30.0
-            )
+        response = await self.http_client.post(
+            "usps",
+            f"{self.test_url}?API=TrackV2",
+            data=f"XML={xml_payload}",
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            timeout=30.0,
+            retry=True
+        )
         
         if response.status_code != 200:
             raise HTTPException(status_code=400, detail=f"USPS Tracking API error: {response.text}")
@@ -195,13 +198,14 @@ class USPSShippingService:
         
         xml_payload = ET.tostring(address_request, encoding='unicode')
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.test_url}?API=Verify",
-                data=f"XML={xml_payload}",
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-                timeout=30.0
-            )
+        response = await self.http_client.post(
+            "usps",
+            f"{self.test_url}?API=Verify",
+            data=f"XML={xml_payload}",
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            timeout=30.0,
+            retry=True
+        )
         
         if response.status_code != 200:
             raise HTTPException(status_code=400, detail=f"USPS Address Validation error: {response.text}")
@@ -231,8 +235,10 @@ class USPSShippingService:
 
 
 class UPSShippingService:
-    def __init__(self, api_key_service):
+    def __init__(self, api_key_service, http_client: Optional[OutboundHTTPClient] = None):
         self.api_key_service = api_key_service
+        self.http_client = http_client or shared_http_client
+        self.tokens = OAuthTokenManager("UPS", self.fetch_access_token)
         self.test_url = "https://wwwcie.ups.com/api"
         self.prod_url = "https://api.ups.com"
     
@@ -248,7 +254,15 @@ class UPSShippingService:
         return None
     
     async def get_access_token(self) -> str:
-        """Get UPS OAuth access token"""
+        """Get UPS OAuth access token (cached until shortly before expiry)"""
+        credentials = await self.get_ups_credentials()
+        if not credentials:
+            raise HTTPException(status_code=404, detail="UPS credentials not configured")
+        
+        return await self.tokens.get_token(credentials["client_id"])
+    
+    async def fetch_access_token(self) -> Dict[str, Any]:
+        """Request a new UPS OAuth access token"""
         credentials = await self.get_ups_credentials()
         if not credentials:
             raise HTTPException(status_code=404, detail="UPS credentials not configured")
@@ -265,17 +279,18 @@ class UPSShippingService:
             "Content-Type": "application/x-www-form-urlencoded"
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.test_url}/security/v1/oauth/token",
-                data=payload,
-                headers=headers
-            )
+        response = await self.http_client.post(
+            "ups",
+            f"{self.test_url}/security/v1/oauth/token",
+            data=payload,
+            headers=headers,
+            retry=True
+        )
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=400, detail="UPS authentication failed")
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail="UPS authentication failed")
             
-            return response.json()["access_token"]
+        return response.json()
     
     async def create_shipping_label(self, to_address: Dict[str, str], from_address: Dict[str, str], 
                                   package_info: Dict[str, Any]) -> Dict[str, Any]:
@@ -380,32 +395,35 @@ class UPSShippingService:
             "AccessLicenseNumber": credentials["access_key"]
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.test_url}/shipments/v1801/ship",
-                json=ship_request,
-                headers=headers
-            )
+        response = await self.http_client.post(
+            "ups",
+            f"{self.test_url}/shipments/v1801/ship",
+            json=ship_request,
+            headers=headers
+        )
+        if response.status_code == 401:
+            # Revoked or rotated token; the next label request fetches a fresh one
+            self.tokens.invalidate()
             
-            if response.status_code not in [200, 201]:
-                raise HTTPException(status_code=400, detail=f"UPS API error: {response.text}")
+        if response.status_code not in [200, 201]:
+            raise HTTPException(status_code=400, detail=f"UPS API error: {response.text}")
             
-            result = response.json()
-            shipment_response = result["ShipmentResponse"]
+        result = response.json()
+        shipment_response = result["ShipmentResponse"]
             
-            return {
-                "tracking_number": shipment_response["ShipmentResults"]["ShipmentIdentificationNumber"],
-                "label_image": shipment_response["ShipmentResults"]["PackageResults"]["ShippingLabel"]["GraphicImage"],
-                "total_charges": shipment_response["ShipmentResults"]["ShipmentCharges"]["TotalCharges"]["MonetaryValue"]
-            }
+        return {
+            "tracking_number": shipment_response["ShipmentResults"]["ShipmentIdentificationNumber"],
+            "label_image": shipment_response["ShipmentResults"]["PackageResults"]["ShippingLabel"]["GraphicImage"],
+            "total_charges": shipment_response["ShipmentResults"]["ShipmentCharges"]["TotalCharges"]["MonetaryValue"]
+        }
 
 
 class ShippingLabelService:
-    def __init__(self, api_key_service, db):
+    def __init__(self, api_key_service, db, http_client: Optional[OutboundHTTPClient] = None):
         self.api_key_service = api_key_service
         self.db = db
-        self.usps_service = USPSShippingService(api_key_service)
-        self.ups_service = UPSShippingService(api_key_service)
+        self.usps_service = USPSShippingService(api_key_service, http_client)
+        self.ups_service = UPSShippingService(api_key_service, http_client)
     
     async def create_shipping_label(self, provider: str, to_address: Dict[str, str], 
                                   from_address: Dict[str, str], package_info: Dict[str, Any], 
@@ -0,0 +1,44 @@
+from typing import Optional, Any, Hashable, Iterable
+from cachetools import TTLCache
+
+
+class StampedCache:
+    """Bounded TTL cache whose invalidations are stamped, so a value loaded while a write landed is not cached"""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Invalidations are stamped from a counter and kept as long as cached values would be
+        self._clock = 0
+        self._invalidated = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Loads started before this stamp are not cached; raised when a stamp has to be evicted
+        self._floor = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._cache
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self._cache.get(key)
+
+    def generation(self) -> int:
+        """Stamp to pass to put() for a value loaded from now on"""
+        return self._clock
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        """Cache `value` unless `key` was invalidated after `generation` was taken"""
+        if generation >= self._floor and self._invalidated.get(key, 0) <= generation:
+            self._cache[key] = value
+
+    def invalidate(self, key: Hashable):
+        self._invalidated.expire()
+        if key not in self._invalidated and len(self._invalidated) >= self._invalidated.maxsize:
+            self._floor = self._clock
+        self._clock += 1
+        self._invalidated[key] = self._clock
+        self._cache.pop(key, None)
+
+    def invalidate_many(self, keys: Iterable[Hashable]):
+        for key in keys:
+            self.invalidate(key)
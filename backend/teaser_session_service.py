@@ -0,0 +1,180 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple
+from cachetools import LRUCache
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from access_control_models import TeaserSession
+
+logger = logging.getLogger(__name__)
+
+# Optional wait after a session expires before the viewer can start another preview.
+# 0 (the default) starts a new session as soon as the old one expires; MongoDB's TTL
+# monitor purges sessions this long after expiry
+TEASER_SESSION_COOLDOWN_SECONDS = int(os.environ.get("TEASER_SESSION_COOLDOWN_SECONDS", "0"))
+TEASER_SESSION_CACHE_SIZE = int(os.environ.get("TEASER_SESSION_CACHE_SIZE", "10000"))
+MAX_UPSERT_ATTEMPTS = 3
+# Viewers without an account are told apart by address rather than sharing one empty user id
+ANONYMOUS_VIEWER_PREFIX = "anon:"
+
+SessionKey = Tuple[str, str, str]
+
+
+class TeaserSessionStore:
+    """One teaser session per (performer, viewer, IP), created atomically and purged by a TTL index"""
+
+    def __init__(self, db, cooldown_seconds: int = TEASER_SESSION_COOLDOWN_SECONDS,
+                 cache_size: int = TEASER_SESSION_CACHE_SIZE):
+        self.collection = db.teaser_sessions
+        self.cooldown = timedelta(seconds=cooldown_seconds)
+        # Sessions never change after creation, so a cached copy stays valid until it is purged
+        self.cache = LRUCache(maxsize=cache_size) if cache_size else None
+
+    @staticmethod
+    def _viewer(user_id: Optional[str], user_ip: str) -> str:
+        return user_id or f"{ANONYMOUS_VIEWER_PREFIX}{user_ip}"
+
+    @classmethod
+    def _key(cls, performer_id: str, user_id: Optional[str], user_ip: str) -> SessionKey:
+        return performer_id, cls._viewer(user_id, user_ip), user_ip
+
+    @staticmethod
+    def _filter(key: SessionKey) -> Dict[str, str]:
+        performer_id, user_id, user_ip = key
+        return {"performer_id": performer_id, "user_id": user_id, "user_ip": user_ip}
+
+    async def ensure_indexes(self):
+        """Create the unique session key index and the TTL index on expires_at"""
+        # Rows deactivated by the old find-then-insert flow are superseded by newer ones
+        await self.collection.delete_many({"is_active": False})
+        # The old flow could also leave several active rows per key; keep the newest of each
+        stale = []
+        cursor = self.collection.aggregate([
+            {"$sort": {"started_at": -1}},
+            {"$group": {
+                "_id": {"performer_id": "$performer_id", "user_id": "$user_id", "user_ip": "$user_ip"},
+                "ids": {"$push": "$_id"}
+            }},
+            {"$match": {"ids.1": {"$exists": True}}}
+        ], allowDiskUse=True)
+        async for group in cursor:
+            stale.extend(group["ids"][1:])
+        if stale:
+            await self.collection.delete_many({"_id": {"$in": stale}})
+            logger.info(f"Removed {len(stale)} duplicate teaser sessions")
+        await self.collection.create_index(
+            [("performer_id", ASCENDING), ("user_id", ASCENDING), ("user_ip", ASCENDING)],
+            unique=True, name="teaser_session_key"
+        )
+        expire_after = int(self.cooldown.total_seconds())
+        try:
+            await self.collection.create_index("expires_at", expireAfterSeconds=expire_after, name="teaser_session_ttl")
+        except OperationFailure:
+            # The index exists with a different cooldown; update it in place
+            await self.collection.database.command(
+                "collMod", self.collection.name,
+                index={"name": "teaser_session_ttl", "expireAfterSeconds": expire_after}
+            )
+
+    def _is_live(self, session: TeaserSession, now: datetime) -> bool:
+        """Whether a session still blocks a new preview (active or cooling down)"""
+        return session.expires_at + self.cooldown > now
+
+    def _remember(self, key: SessionKey, session: TeaserSession):
+        if self.cache is not None:
+            self.cache[key] = session
+
+    def _cached(self, key: SessionKey, now: datetime) -> Optional[TeaserSession]:
+        if self.cache is None:
+            return None
+        session = self.cache.get(key)
+        if session is not None and not self._is_live(session, now):
+            self.cache.pop(key, None)
+            return None
+        return session
+
+    async def get(self, performer_id: str, user_id: Optional[str], user_ip: str) -> Optional[TeaserSession]:
+        """Get the viewer's session (active or expired) without starting one"""
+        key = self._key(performer_id, user_id, user_ip)
+        now = datetime.utcnow()
+        session = self._cached(key, now)
+        if session is not None:
+            return session
+
+        doc = await self.collection.find_one(self._filter(key))
+        if not doc:
+            return None
+        session = TeaserSession(**doc)
+        # Expired sessions are returned until purged so callers can report them as expired
+        if self._is_live(session, now):
+            self._remember(key, session)
+        return session
+
+    async def get_many(self, performer_ids: List[str], user_id: Optional[str],
+                       user_ip: str) -> Dict[str, TeaserSession]:
+        """Get the viewer's sessions for many performers, querying misses at once"""
+        now = datetime.utcnow()
+        sessions = {}
+        missing = []
+        for performer_id in performer_ids:
+            session = self._cached(self._key(performer_id, user_id, user_ip), now)
+            if session is not None:
+                sessions[performer_id] = session
+            else:
+                missing.append(performer_id)
+
+        if missing:
+            docs = await self.collection.find({
+                "performer_id": {"$in": missing}, "user_id": self._viewer(user_id, user_ip), "user_ip": user_ip
+            }).to_list(None)
+            for doc in docs:
+                session = TeaserSession(**doc)
+                if self._is_live(session, now):
+                    sessions[session.performer_id] = session
+                    self._remember(self._key(session.performer_id, user_id, user_ip), session)
+
+        return sessions
+
+    async def get_or_start(self, performer_id: str, user_id: Optional[str], user_ip: str,
+                           duration_seconds: int) -> TeaserSession:
+        """Return the viewer's session, starting one with a single atomic upsert if none is live"""
+        key = self._key(performer_id, user_id, user_ip)
+        now = datetime.utcnow()
+        session = self._cached(key, now)
+        if session is not None:
+            return session
+
+        for _ in range(MAX_UPSERT_ATTEMPTS):
+            now = datetime.utcnow()
+            new_session = TeaserSession(
+                performer_id=performer_id,
+                user_id=key[1],
+                user_ip=user_ip,
+                started_at=now,
+                expires_at=now + timedelta(seconds=duration_seconds)
+            )
+            try:
+                # Matches a live session or inserts a new one; concurrent callers converge on one row
+                doc = await self.collection.find_one_and_update(
+                    {**self._filter(key), "expires_at": {"$gt": now - self.cooldown}},
+                    {"$setOnInsert": new_session.dict()},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Either a concurrent insert won, or a stale row the TTL monitor has not purged yet
+                # is in the way; replace the stale row in place and retry otherwise
+                doc = await self.collection.find_one_and_update(
+                    {**self._filter(key), "expires_at": {"$lte": now - self.cooldown}},
+                    {"$set": new_session.dict()},
+                    return_document=ReturnDocument.AFTER
+                )
+                if doc is None:
+                    continue
+
+            session = TeaserSession(**doc)
+            self._remember(key, session)
+            return session
+
+        raise Exception("Could not start teaser session")
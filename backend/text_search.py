@@ -0,0 +1,71 @@
+import re
+import unicodedata
+from typing import Optional, List, Iterable, Union
+
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+
+# Names and tags are indexed by every prefix so partially typed words match;
+# long free text (bios) is indexed by whole words only to keep documents small
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 20
+MAX_WORD_TOKENS = 200
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Lowercase and strip accents so 'Zoë' and 'zoe' compare equal"""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize_text(value))
+
+
+def normalize_location(value: Optional[str]) -> Optional[str]:
+    """Exact-match key for a country, state or city name"""
+    tokens = tokenize(value)
+    return " ".join(tokens) if tokens else None
+
+
+def _flatten(sources: Iterable[Union[str, List[str], None]]) -> List[str]:
+    tokens = []
+    for source in sources:
+        if isinstance(source, (list, tuple)):
+            for item in source:
+                tokens.extend(tokenize(item))
+        else:
+            tokens.extend(tokenize(source))
+    return tokens
+
+
+def build_search_tokens(prefix_sources: Iterable[Union[str, List[str], None]],
+                        word_sources: Iterable[Union[str, List[str], None]] = ()) -> List[str]:
+    """Token array stored on a profile and matched with $all by search queries"""
+    tokens = set()
+    for token in _flatten(prefix_sources):
+        tokens.add(token[:MAX_PREFIX_LENGTH])
+        for length in range(MIN_PREFIX_LENGTH, min(len(token), MAX_PREFIX_LENGTH) + 1):
+            tokens.add(token[:length])
+
+    words = []
+    seen = set()
+    for token in _flatten(word_sources):
+        token = token[:MAX_PREFIX_LENGTH]
+        if len(token) >= MIN_PREFIX_LENGTH and token not in seen:
+            seen.add(token)
+            words.append(token)
+    tokens.update(words[:MAX_WORD_TOKENS])
+
+    return sorted(tokens)
+
+
+def query_tokens(query: Optional[str]) -> List[str]:
+    """Tokens of a search box query, shaped to match stored prefixes"""
+    tokens = []
+    for token in tokenize(query):
+        token = token[:MAX_PREFIX_LENGTH]
+        if len(token) >= MIN_PREFIX_LENGTH and token not in tokens:
+            tokens.append(token)
+    return tokens
@@ -0,0 +1,67 @@
+import time
+import asyncio
+import logging
+from typing import Optional, Callable, Awaitable, Dict, Any, Hashable
+
+logger = logging.getLogger(__name__)
+
+# Tokens are treated as expired this long before the provider's expiry
+TOKEN_EXPIRY_MARGIN_SECONDS = 60
+# Past this fraction of its lifetime a token is still served but replaced in the background
+TOKEN_REFRESH_AHEAD_FRACTION = 0.8
+# Used when a token response carries no expires_in
+DEFAULT_TOKEN_TTL_SECONDS = 3600
+
+
+class OAuthTokenManager:
+    """Caches a client_credentials access token, refreshing it ahead of expiry with one in-flight fetch"""
+
+    def __init__(self, name: str, fetch_token: Callable[[], Awaitable[Dict[str, Any]]],
+                 expiry_margin: float = TOKEN_EXPIRY_MARGIN_SECONDS,
+                 refresh_ahead_fraction: float = TOKEN_REFRESH_AHEAD_FRACTION):
+        self.name = name
+        self.fetch_token = fetch_token
+        self.expiry_margin = expiry_margin
+        self.refresh_ahead_fraction = refresh_ahead_fraction
+        self._token: Optional[str] = None
+        self._key: Optional[Hashable] = None
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._inflight_key: Optional[Hashable] = None
+
+    def invalidate(self):
+        """Forget the cached token, e.g. after the provider rejects it"""
+        self._token = None
+
+    async def _refresh(self, key: Optional[Hashable]) -> str:
+        started = time.monotonic()
+        token_data = await self.fetch_token()
+        lifetime = float(token_data.get("expires_in") or DEFAULT_TOKEN_TTL_SECONDS)
+        usable = max(lifetime - self.expiry_margin, 0.0)
+        self._token = token_data["access_token"]
+        self._key = key
+        self._expires_at = started + usable
+        self._refresh_at = started + usable * self.refresh_ahead_fraction
+        return self._token
+
+    def _start_refresh(self, key: Optional[Hashable]) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done() or self._inflight_key != key:
+            self._inflight_key = key
+            self._inflight = asyncio.get_running_loop().create_task(self._refresh(key))
+            self._inflight.add_done_callback(self._log_background_failure)
+        return self._inflight
+
+    def _log_background_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"{self.name} token refresh failed: {task.exception()}")
+
+    async def get_token(self, key: Optional[Hashable] = None) -> str:
+        """Current token; a different key (e.g. new client credentials) forces a fresh one"""
+        now = time.monotonic()
+        if self._token is not None and self._key == key and now < self._expires_at:
+            if now >= self._refresh_at:
+                self._start_refresh(key)
+            return self._token
+        # Shielded so one caller giving up does not cancel the fetch others are waiting on
+        return await asyncio.shield(self._start_refresh(key))
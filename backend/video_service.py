@@ -1,20 +1,27 @@
 import os
 import uuid
+import asyncio
 import base64
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from weakref import WeakValueDictionary
 from fastapi import HTTPException
 from twilio.jwt.access_token import AccessToken
 from twilio.jwt.access_token.grants import VideoGrant
 from twilio.rest import Client
-import httpx
 import aiofiles
 from api_key_models import APIKeyType
+from http_client import OutboundHTTPClient, shared_http_client
+from file_streaming import STREAM_CHUNK_SIZE
+
+RECORDINGS_DOWNLOAD_DIR = os.environ.get("RECORDINGS_DOWNLOAD_DIR", "/app/downloads/recordings")
 
 
 class VideoConferencingService:
-    def __init__(self, api_key_service):
+    def __init__(self, api_key_service, http_client: Optional[OutboundHTTPClient] = None):
         self.api_key_service = api_key_service
+        self.http_client = http_client or shared_http_client
     
     async def get_agora_credentials(self) -> Optional[Dict[str, str]]:
         """Get Agora API credentials"""
@@ -92,18 +99,18 @@ class VideoConferencingService:
             "clientRequest": {}
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                acquire_url,
-                json=acquire_payload,
-                headers={"Authorization": f"Basic {auth_header}"}
-            )
+        response = await self.http_client.post(
+            "agora",
+            acquire_url,
+            json=acquire_payload,
+            headers={"Authorization": f"Basic {auth_header}"}
+        )
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=400, detail=f"Agora acquire failed: {response.text}")
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"Agora acquire failed: {response.text}")
             
-            acquire_result = response.json()
-            resource_id = acquire_result["resourceId"]
+        acquire_result = response.json()
+        resource_id = acquire_result["resourceId"]
         
         # 2. Start recording
         start_url = f"https://api.agora.io/v1/apps/{credentials['app_id']}/cloud_recording/resourceid/{resource_id}/mode/mix/start"
@@ -134,24 +141,24 @@ class VideoConferencingService:
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                start_url,
-                json=start_payload,
-                headers={"Authorization": f"Basic {auth_header}"}
-            )
+        response = await self.http_client.post(
+            "agora",
+            start_url,
+            json=start_payload,
+            headers={"Authorization": f"Basic {auth_header}"}
+        )
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=400, detail=f"Agora recording start failed: {response.text}")
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"Agora recording start failed: {response.text}")
             
-            start_result = response.json()
+        start_result = response.json()
             
-            return {
-                "resource_id": resource_id,
-                "sid": start_result["sid"],
-                "recording_id": start_result.get("recordingId"),
-                "status": "recording"
-            }
+        return {
+            "resource_id": resource_id,
+            "sid": start_result["sid"],
+            "recording_id": start_result.get("recordingId"),
+            "status": "recording"
+        }
     
     async def stop_agora_recording(self, channel: str, uid: str, resource_id: str, sid: str) -> Dict[str, Any]:
         """Stop Agora cloud recording"""
@@ -169,23 +176,23 @@ class VideoConferencingService:
             "clientRequest": {}
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                stop_url,
-                json=stop_payload,
-                headers={"Authorization": f"Basic {auth_header}"}
-            )
+        response = await self.http_client.post(
+            "agora",
+            stop_url,
+            json=stop_payload,
+            headers={"Authorization": f"Basic {auth_header}"}
+        )
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=400, detail=f"Agora recording stop failed: {response.text}")
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail=f"Agora recording stop failed: {response.text}")
             
-            stop_result = response.json()
+        stop_result = response.json()
             
-            return {
-                "recording_id": stop_result.get("recordingId"),
-                "file_list": stop_result.get("serverResponse", {}).get("fileList", []),
-                "status": "stopped"
-            }
+        return {
+            "recording_id": stop_result.get("recordingId"),
+            "file_list": stop_result.get("serverResponse", {}).get("fileList", []),
+            "status": "stopped"
+        }
     
     async def start_twilio_recording(self, room_sid: str) -> Dict[str, Any]:
         """Start Twilio recording"""
@@ -295,8 +302,11 @@ class VideoConferencingService:
 
 
 class VideoRecordingService:
-    def __init__(self, db):
+    def __init__(self, db, http_client: Optional[OutboundHTTPClient] = None):
         self.db = db
+        self.http_client = http_client or shared_http_client
+        # One download per file at a time; concurrent requests wait for it
+        self._download_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
     
     async def save_recording_metadata(self, recording_data: Dict[str, Any]) -> str:
         """Save recording metadata to database"""
@@ -347,26 +357,61 @@ class VideoRecordingService:
         recordings = await self.db.video_recordings.find({"performer_id": performer_id}).to_list(1000)
         return recordings
     
+    async def fetch_recording_file(self, recording_id: str) -> str:
+        """Local copy of a recording's first file, downloading it if needed"""
+        recording = await self.get_recording_by_id(recording_id)
+        if not recording:
+            raise HTTPException(status_code=404, detail="Recording not found")
+        
+        file_urls = recording.get("file_urls", [])
+        if not file_urls:
+            raise HTTPException(status_code=404, detail="No recording files available")
+        
+        # Download the first file (you can extend this to handle multiple files)
+        file_url = file_urls[0] if isinstance(file_urls, list) else file_urls
+        local_path = await self.download_recording_file(recording_id, file_url)
+        
+        if not local_path:
+            raise HTTPException(status_code=500, detail="Failed to download recording")
+        return local_path
+    
+    def get_local_path(self, recording_id: str, file_url: str) -> str:
+        """Stable local path for a recording file, so interrupted downloads can resume"""
+        url_path = urlparse(file_url).path
+        file_extension = url_path.rsplit('.', 1)[-1] if '.' in url_path.rsplit('/', 1)[-1] else 'mp4'
+        return os.path.join(RECORDINGS_DOWNLOAD_DIR, f"{recording_id}.{file_extension}")
+    
     async def download_recording_file(self, recording_id: str, file_url: str) -> Optional[str]:
-        """Download recording file and return local path"""
+        """Stream a recording file to disk, resuming a partial download with an HTTP Range request"""
+        file_path = self.get_local_path(recording_id, file_url)
+        lock = self._download_locks.get(file_path)
+        if lock is None:
+            lock = self._download_locks[file_path] = asyncio.Lock()
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(file_url)
-                response.raise_for_status()
-                
-                # Create downloads directory if it doesn't exist
-                downloads_dir = "/app/downloads/recordings"
-                os.makedirs(downloads_dir, exist_ok=True)
+            async with lock:
+                if os.path.exists(file_path):
+                    return file_path
                 
-                # Generate filename
-                file_extension = file_url.split('.')[-1] if '.' in file_url else 'mp4'
-                filename = f"{recording_id}_{datetime.utcnow().isoformat()}.{file_extension}"
-                file_path = os.path.join(downloads_dir, filename)
+                os.makedirs(RECORDINGS_DOWNLOAD_DIR, exist_ok=True)
+                part_path = f"{file_path}.part"
+                offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                headers = {"Range": f"bytes={offset}-"} if offset else {}
                 
-                # Save file
-                async with aiofiles.open(file_path, 'wb') as f:
-                    await f.write(response.content)
+                async with self.http_client.stream("recordings", "GET", file_url, headers=headers) as response:
+                    if response.status_code == 416 and offset:
+                        # The partial file already holds the whole recording
+                        os.replace(part_path, file_path)
+                        return file_path
+                    response.raise_for_status()
+                    
+                    # Append only when the provider honoured the range; otherwise start over
+                    content_range = response.headers.get("content-range", "")
+                    resumed = response.status_code == 206 and content_range.startswith(f"bytes {offset}-")
+                    async with aiofiles.open(part_path, 'ab' if resumed else 'wb') as f:
+                        async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                            await f.write(chunk)
                 
+                os.replace(part_path, file_path)
                 return file_path
                 
         except Exception as e:
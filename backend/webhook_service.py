@@ -0,0 +1,187 @@
+import os
+import zlib
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "8"))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_BACKOFF_SECONDS = float(os.environ.get("WEBHOOK_RETRY_BACKOFF_SECONDS", "1"))
+WEBHOOK_RETRY_BACKOFF_MAX_SECONDS = 60.0
+# How long a worker owns an event it claimed; renewed on every retry, so it only lapses
+# when the owning process stops without finishing the event
+WEBHOOK_LEASE_SECONDS = int(os.environ.get("WEBHOOK_LEASE_SECONDS", "300"))
+
+# Event lifecycle in the webhook_events collection
+STATUS_PENDING = "pending"
+STATUS_PROCESSED = "processed"
+STATUS_FAILED = "failed"
+
+EventHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class WebhookProcessor:
+    """Persists provider webhooks once per event id and applies them on partitioned background workers"""
+
+    def __init__(self, db, handlers: Dict[str, EventHandler], workers: int = WEBHOOK_WORKERS,
+                 max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+                 retry_backoff: float = WEBHOOK_RETRY_BACKOFF_SECONDS,
+                 lease_seconds: int = WEBHOOK_LEASE_SECONDS):
+        self.collection = db.webhook_events
+        self.handlers = handlers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease = timedelta(seconds=lease_seconds)
+        self._queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+        self._counts = {"received": 0, "duplicates": 0, "processed": 0, "retries": 0, "failed": 0,
+                        "claimed_elsewhere": 0}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("provider", ASCENDING), ("event_id", ASCENDING)], unique=True, name="webhook_event_id"
+        )
+        await self.collection.create_index(
+            [("status", ASCENDING), ("received_at", ASCENDING)], name="webhook_status"
+        )
+
+    def _partition(self, ordering_key: str) -> asyncio.Queue:
+        # Events for one subscription always share a worker, so they apply in arrival order
+        # and a retrying event holds back the ones behind it
+        return self._queues[zlib.crc32(ordering_key.encode("utf-8")) % len(self._queues)]
+
+    async def ingest(self, provider: str, event_id: str, event_type: str,
+                     payload: Dict[str, Any], ordering_key: Optional[str] = None) -> bool:
+        """Store an event and queue it; returns False when the event id was already received"""
+        event = {
+            "id": str(uuid.uuid4()),
+            "provider": provider,
+            "event_id": event_id,
+            "event_type": event_type,
+            "ordering_key": ordering_key or event_id,
+            "payload": payload,
+            "status": STATUS_PENDING,
+            "attempts": 0,
+            "last_error": None,
+            "received_at": datetime.utcnow(),
+            "processed_at": None,
+            "lease_until": None
+        }
+        try:
+            await self.collection.insert_one(event)
+        except DuplicateKeyError:
+            self._counts["duplicates"] += 1
+            return False
+
+        self._counts["received"] += 1
+        self._partition(event["ordering_key"]).put_nowait(event)
+        return True
+
+    @staticmethod
+    def _claimable(now: datetime) -> Dict[str, Any]:
+        # Pending and not leased by a live worker (events stored before leases existed have no field)
+        return {"status": STATUS_PENDING, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]}
+
+    async def recover(self) -> int:
+        """Re-queue events that were stored but not finished before the last shutdown"""
+        cursor = self.collection.find(
+            self._claimable(datetime.utcnow()), {"_id": 0}
+        ).sort("received_at", ASCENDING)
+        recovered = 0
+        async for event in cursor:
+            self._partition(event["ordering_key"]).put_nowait(event)
+            recovered += 1
+        return recovered
+
+    async def _apply(self, event: Dict[str, Any]):
+        handler = self.handlers.get(event["provider"])
+        if handler is None:
+            raise ValueError(f"No webhook handler for provider {event['provider']}")
+        await handler(event["event_type"], event["payload"])
+
+    async def _claim(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Lease the event to this worker; None when another process holds it or finished it"""
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"id": event["id"], **self._claimable(now)},
+            {"$set": {"lease_until": now + self.lease}},
+            projection={"_id": 0}
+        )
+
+    async def _process(self, event: Dict[str, Any]):
+        # Several processes may recover the same pending event; only the one holding the lease applies it
+        event = await self._claim(event)
+        if event is None:
+            self._counts["claimed_elsewhere"] += 1
+            return
+        attempts = event.get("attempts", 0)
+        while True:
+            attempts += 1
+            try:
+                await self._apply(event)
+            except Exception as e:
+                if attempts >= self.max_attempts:
+                    self._counts["failed"] += 1
+                    await self.collection.update_one(
+                        {"id": event["id"]},
+                        {"$set": {"status": STATUS_FAILED, "attempts": attempts, "last_error": str(e), "lease_until": None}}
+                    )
+                    logger.error(f"Webhook {event['provider']}/{event['event_id']} failed after {attempts} attempts: {str(e)}")
+                    return
+                self._counts["retries"] += 1
+                await self.collection.update_one(
+                    {"id": event["id"]},
+                    {"$set": {"attempts": attempts, "last_error": str(e),
+                              "lease_until": datetime.utcnow() + self.lease}}
+                )
+                delay = min(self.retry_backoff * (2 ** (attempts - 1)), WEBHOOK_RETRY_BACKOFF_MAX_SECONDS)
+                await asyncio.sleep(delay)
+                continue
+
+            self._counts["processed"] += 1
+            await self.collection.update_one(
+                {"id": event["id"]},
+                {"$set": {"status": STATUS_PROCESSED, "attempts": attempts, "processed_at": datetime.utcnow(),
+                          "lease_until": None}}
+            )
+            return
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            event = await queue.get()
+            try:
+                await self._process(event)
+            except Exception as e:
+                # Bookkeeping failed (e.g. database unavailable); the event stays pending for recovery
+                logger.error(f"Webhook {event.get('provider')}/{event.get('event_id')} not processed: {str(e)}")
+            finally:
+                queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self):
+        """Stop the workers; unfinished events stay pending and are recovered on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self):
+        """Wait until every queued event has been handled"""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._counts,
+            "queued": sum(queue.qsize() for queue in self._queues),
+            "workers": len(self._queues)
+        }
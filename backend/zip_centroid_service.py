@@ -0,0 +1,93 @@
+import csv
+from typing import Optional, Dict, Any, List
+
+METERS_PER_KM = 1000.0
+METERS_PER_MILE = 1609.344
+
+
+def geo_point(latitude: float, longitude: float) -> Dict[str, Any]:
+    """GeoJSON point as stored on profiles for 2dsphere queries"""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+class ZipCentroidTable:
+    """In-memory zip code and city centroids used to place profiles and search origins on the map"""
+
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        self._by_zip: Dict[str, Dict[str, Any]] = {}
+        self._by_city_state: Dict[tuple, Dict[str, Any]] = {}
+        self._by_city: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self._by_zip)
+
+    @staticmethod
+    def _normalize_zip(zip_code: str) -> str:
+        return zip_code.strip().split("-")[0].upper()
+
+    def load(self):
+        """Read the centroid CSV; cities are placed at the mean of their zip centroids"""
+        by_zip = {}
+        city_points: Dict[tuple, List[Dict[str, Any]]] = {}
+
+        with open(self.csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                centroid = {
+                    "zip_code": row["zip_code"].strip(),
+                    "city": row["city"].strip(),
+                    "state": row["state"].strip(),
+                    "state_code": row["state_code"].strip(),
+                    "country_code": row["country_code"].strip(),
+                    "latitude": float(row["latitude"]),
+                    "longitude": float(row["longitude"])
+                }
+                by_zip[self._normalize_zip(centroid["zip_code"])] = centroid
+                city_points.setdefault((centroid["city"].lower(), centroid["state_code"].lower()), []).append(centroid)
+
+        by_city_state = {}
+        by_city = {}
+        for (city, state_code), points in city_points.items():
+            first = points[0]
+            centroid = {
+                "zip_code": None,
+                "city": first["city"],
+                "state": first["state"],
+                "state_code": first["state_code"],
+                "country_code": first["country_code"],
+                "latitude": sum(p["latitude"] for p in points) / len(points),
+                "longitude": sum(p["longitude"] for p in points) / len(points)
+            }
+            by_city_state[(city, state_code)] = centroid
+            by_city_state[(city, first["state"].lower())] = centroid
+            # City-only lookups prefer the city with the most zip codes
+            if city not in by_city or len(points) > by_city[city][1]:
+                by_city[city] = (centroid, len(points))
+
+        self._by_zip = by_zip
+        self._by_city_state = by_city_state
+        self._by_city = {city: entry[0] for city, entry in by_city.items()}
+
+    def lookup(self, zip_code: Optional[str] = None, city: Optional[str] = None,
+               state: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Centroid for a zip code, or else for a city (optionally qualified by state name or code)"""
+        if zip_code:
+            centroid = self._by_zip.get(self._normalize_zip(zip_code))
+            if centroid:
+                return centroid
+        if city:
+            city_key = city.strip().lower()
+            if state:
+                return self._by_city_state.get((city_key, state.strip().lower()))
+            return self._by_city.get(city_key)
+        return None
+
+    def point(self, zip_code: Optional[str] = None, city: Optional[str] = None,
+              state: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """GeoJSON point for a location, or None when it is not in the table"""
+        centroid = self.lookup(zip_code, city, state)
+        if not centroid:
+            return None
+        return geo_point(centroid["latitude"], centroid["longitude"])
+
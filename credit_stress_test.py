@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Stress credit debits: fire many parallel purchases at a few accounts and check that no balance is overdrawn.
+
+Each account is seeded with a balance that covers only part of the purchases aimed at it. Afterwards the script
+checks that balances never went negative, that purchases were only rejected once unaffordable, and that every
+successful debit has exactly one credit_transactions record once the outbox has been relayed.
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+from affiliate_credits_models import CreditAccount
+from affiliate_credits_service import CreditService
+from credit_ledger import CreditLedger
+
+
+async def seed(db, accounts: int, balance: float) -> list:
+    user_ids = [f"stress-{uuid.uuid4()}" for _ in range(accounts)]
+    await db.credit_accounts.insert_many([
+        CreditAccount(userId=user_id, totalCredits=balance, lifetimeEarned=balance).dict()
+        for user_id in user_ids
+    ])
+    return user_ids
+
+
+async def run_direct(service: CreditService, purchases: list) -> tuple:
+    async def purchase(user_id: str, amount: float):
+        started = time.perf_counter()
+        ok = await service.use_credits_for_purchase(user_id, amount, str(uuid.uuid4()), "Stress test purchase")
+        return ok, (time.perf_counter() - started) * 1000
+
+    return await asyncio.gather(*(purchase(user_id, amount) for user_id, amount in purchases))
+
+
+async def run_http(base_url: str, purchases: list) -> tuple:
+    limits = httpx.Limits(max_connections=len(purchases), max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def purchase(user_id: str, amount: float):
+            started = time.perf_counter()
+            response = await client.post("/api/credits/use", params={
+                "user_id": user_id, "amount": amount,
+                "order_id": str(uuid.uuid4()), "description": "Stress test purchase"
+            })
+            ok = response.status_code == 200 and response.json().get("success") is True
+            return ok, (time.perf_counter() - started) * 1000
+
+        return await asyncio.gather(*(purchase(user_id, amount) for user_id, amount in purchases))
+
+
+async def verify(db, user_ids: list, balance: float, purchases: list, results: list) -> bool:
+    spent_by_user = {user_id: 0.0 for user_id in user_ids}
+    successes_by_user = {user_id: 0 for user_id in user_ids}
+    smallest_rejected = {user_id: float("inf") for user_id in user_ids}
+    for (user_id, amount), (ok, _) in zip(purchases, results):
+        if ok:
+            spent_by_user[user_id] += amount
+            successes_by_user[user_id] += 1
+        else:
+            smallest_rejected[user_id] = min(smallest_rejected[user_id], amount)
+
+    passed = True
+    for user_id in user_ids:
+        account = await db.credit_accounts.find_one({"userId": user_id})
+        records = await db.credit_transactions.count_documents({"userId": user_id})
+        expected_balance = balance - spent_by_user[user_id]
+        checks = {
+            "never negative": account["totalCredits"] >= 0,
+            "balance matches successes": abs(account["totalCredits"] - expected_balance) < 1e-6,
+            "lifetimeSpent matches": abs(account["lifetimeSpent"] - spent_by_user[user_id]) < 1e-6,
+            # Balances only fall, so a rejected purchase must still be unaffordable at the end
+            "rejections were unaffordable": account["totalCredits"] < smallest_rejected[user_id],
+            "one record per debit": records == successes_by_user[user_id],
+            "outbox drained": not account.get("pendingTransactions")
+        }
+        failed = [name for name, ok in checks.items() if not ok]
+        if failed:
+            passed = False
+            print(f"  {user_id}: FAILED {', '.join(failed)} "
+                  f"(balance={account['totalCredits']}, expected={expected_balance}, records={records})")
+    return passed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000, help="parallel purchase requests")
+    parser.add_argument("--accounts", type=int, default=5, help="accounts the purchases are spread over")
+    parser.add_argument("--balance", type=float, default=100.0, help="starting balance per account")
+    parser.add_argument("--amounts", default="1,2,5", help="comma-separated purchase amounts")
+    parser.add_argument("--url", help="send purchases to a running backend instead of calling the service "
+                                      "(the backend must use the same database)")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="credit_stress_test",
+                        help="database to use; with --url it must be the backend's database")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    ledger = CreditLedger(db)
+    await ledger.ensure_indexes()
+    user_ids = await seed(db, args.accounts, args.balance)
+
+    amounts = [float(amount) for amount in args.amounts.split(",")]
+    purchases = [(random.choice(user_ids), random.choice(amounts)) for _ in range(args.requests)]
+    demand = sum(amount for _, amount in purchases)
+    print(f"{args.requests} purchases totalling {demand:.0f} credits against "
+          f"{args.accounts} accounts holding {args.balance * args.accounts:.0f}")
+
+    started = time.perf_counter()
+    if args.url:
+        results = await run_http(args.url, purchases)
+        # The backend relays transaction records on its own interval
+        await asyncio.sleep(ledger.flush_seconds * 3)
+    else:
+        ledger.start()
+        results = await run_direct(CreditService(db, ledger=ledger), purchases)
+        await ledger.stop()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    succeeded = sum(1 for ok, _ in results if ok)
+    print(f"Completed in {elapsed:.2f}s ({args.requests / elapsed:.0f} requests/s): "
+          f"{succeeded} succeeded, {args.requests - succeeded} rejected")
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    print(f"  latency p50={statistics.median(latencies):.1f}ms p99={p99:.1f}ms")
+
+    passed = await verify(db, user_ids, args.balance, purchases, results)
+    print("PASS: no overdraft, one record per successful debit" if passed else "FAIL")
+
+    # Only the stress accounts are removed, so pointing at a shared database is safe
+    await db.credit_accounts.delete_many({"userId": {"$in": user_ids}})
+    await db.credit_transactions.delete_many({"userId": {"$in": user_ids}})
+    client.close()
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
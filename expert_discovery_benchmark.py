@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Benchmark expert discovery: seed experts into a scratch database and report p50/p99 latency per filter combination."""
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from motor.motor_asyncio import AsyncIOMotorClient
+from expert_discovery_service import ExpertDiscoveryService, CATEGORY_VALUES
+
+CITIES = [
+    ("Boston", "MA", "02115"), ("New York", "NY", "10001"), ("Houston", "TX", "77002"),
+    ("Los Angeles", "CA", "90210"), ("Denver", "CO", "80202"), ("Seattle", "WA", "98101"),
+    ("Miami", "FL", "33101"), ("Chicago", "IL", "60601"), ("Atlanta", "GA", "30309"), ("Austin", "TX", "78701")
+]
+LEVELS = ["entry", "intermediate", "experienced", "expert"]
+
+FILTER_COMBOS = [
+    {},
+    {"category": "medical"},
+    {"status": "online"},
+    {"experience_level": "expert"},
+    {"sort_by": "rating"},
+    {"sort_by": "price_low"},
+    {"sort_by": "price_high"},
+    {"sort_by": "experience"},
+    {"category": "legal", "status": "online"},
+    {"category": "financial", "sort_by": "rating"},
+    {"status": "online", "experience_level": "experienced", "sort_by": "price_low"},
+    {"category": "technology", "status": "offline", "experience_level": "intermediate", "sort_by": "rating"}
+]
+
+
+def make_expert(index: int) -> dict:
+    city, state, zip_code = random.choice(CITIES)
+    return {
+        "id": str(uuid.uuid4()),
+        "email": f"expert{index}@benchmark.test",
+        "firstName": "Expert",
+        "lastName": str(index),
+        "displayName": f"Expert {index}",
+        "userType": "expert",
+        "accountStatus": "active",
+        "isVerified": random.random() < 0.3,
+        "expertiseCategory": random.choice(CATEGORY_VALUES[:-1]),
+        "expertiseLevel": random.choice(LEVELS),
+        "specializations": ["General Consulting"],
+        "yearsOfExperience": random.randint(0, 40),
+        "isOnline": random.random() < 0.4,
+        "averageRating": round(random.uniform(3.0, 5.0), 1),
+        "consultationRate": float(random.randint(40, 500)),
+        "totalConsultations": random.randint(0, 2000),
+        "location": {"city": city, "state": state, "zipCode": zip_code}
+    }
+
+
+async def seed(db, count: int):
+    await db.users.delete_many({})
+    batch = []
+    for i in range(count):
+        batch.append(make_expert(i))
+        if len(batch) == 5000:
+            await db.users.insert_many(batch)
+            batch = []
+    if batch:
+        await db.users.insert_many(batch)
+
+
+async def measure(service: ExpertDiscoveryService, filters: dict, iterations: int, pages: int) -> list:
+    """Latency in ms for each page fetch, following next_cursor for up to `pages` pages"""
+    latencies = []
+    for _ in range(iterations):
+        cursor = None
+        for _ in range(pages):
+            started = time.perf_counter()
+            page = await service.discover_experts(limit=50, cursor=cursor, **filters)
+            latencies.append((time.perf_counter() - started) * 1000)
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--experts", type=int, default=100000, help="number of experts to seed")
+    parser.add_argument("--iterations", type=int, default=50, help="runs per filter combination")
+    parser.add_argument("--pages", type=int, default=5, help="pages followed per run")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="expert_discovery_benchmark")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    service = ExpertDiscoveryService(db)
+
+    started = time.perf_counter()
+    await seed(db, args.experts)
+    await service.ensure_indexes()
+    print(f"Seeded {args.experts:,} experts in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'filters':<80} {'p50 ms':>8} {'p99 ms':>8}")
+    for filters in FILTER_COMBOS:
+        latencies = await measure(service, filters, args.iterations, args.pages)
+        p50 = statistics.median(latencies)
+        p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+        label = ", ".join(f"{k}={v}" for k, v in filters.items()) or "(none)"
+        print(f"{label:<80} {p50:>8.2f} {p99:>8.2f}")
+
+    await client.drop_database(args.db_name)
+    client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
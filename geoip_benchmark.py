@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark the offline GeoIP resolver: compile a synthetic range table and measure lookups per second."""
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from geoip_service import GeoIPResolver, compile_geoip_csv
+
+CITIES = [
+    ("United States", "US", "California", "CA", "Los Angeles", "90210", 34.0522, -118.2437),
+    ("United States", "US", "New York", "NY", "New York", "10001", 40.7128, -74.0060),
+    ("United States", "US", "Massachusetts", "MA", "Boston", "02115", 42.3601, -71.0589),
+    ("United States", "US", "Texas", "TX", "Austin", "78701", 30.2672, -97.7431),
+    ("United States", "US", "Florida", "FL", "Miami", "33101", 25.7617, -80.1918),
+    ("Canada", "CA", "Ontario", "ON", "Toronto", "M5H 2N2", 43.6532, -79.3832)
+]
+
+
+def write_synthetic_csv(path: str, range_count: int):
+    """Write non-overlapping ranges spread across the IPv4 space"""
+    step = (2 ** 32) // range_count
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["start_ip", "end_ip", "country", "country_code", "state", "state_code",
+                         "city", "zip_code", "latitude", "longitude"])
+        for i in range(range_count):
+            start = i * step
+            end = start + step // 2
+            writer.writerow([start, end, *random.choice(CITIES)])
+
+
+def run_lookups(resolver: GeoIPResolver, addresses: list) -> float:
+    """Return lookups per second for resolving every address once"""
+    started = time.perf_counter()
+    for address in addresses:
+        resolver.resolve(address)
+    return len(addresses) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ranges", type=int, default=500000, help="number of IP ranges in the table")
+    parser.add_argument("--lookups", type=int, default=200000, help="number of lookups per run")
+    parser.add_argument("--hot-ips", type=int, default=1000, help="distinct addresses in the cached run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "ranges.csv")
+        db_path = os.path.join(tmp_dir, "ranges.bin")
+
+        write_synthetic_csv(csv_path, args.ranges)
+        started = time.perf_counter()
+        compile_geoip_csv(csv_path, db_path)
+        print(f"Compiled {args.ranges:,} ranges in {time.perf_counter() - started:.2f}s "
+              f"({os.path.getsize(db_path) / 1024 / 1024:.1f} MB)")
+
+        random_ips = [f"{random.randint(1, 254)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}"
+                      for _ in range(args.lookups)]
+        hot_pool = random_ips[:args.hot_ips]
+        hot_ips = [random.choice(hot_pool) for _ in range(args.lookups)]
+
+        uncached = GeoIPResolver(csv_path, db_path, cache_size=0)
+        uncached.open()
+        rate = run_lookups(uncached, random_ips)
+        print(f"Uncached bisect lookups: {rate:,.0f}/s ({1e6 / rate:.2f} us per lookup)")
+        uncached.close()
+
+        cached = GeoIPResolver(csv_path, db_path)
+        cached.open()
+        run_lookups(cached, hot_pool)
+        rate = run_lookups(cached, hot_ips)
+        print(f"LRU-cached lookups ({args.hot_ips:,} hot IPs): {rate:,.0f}/s ({1e6 / rate:.2f} us per lookup)")
+        cached.close()
+
+
+if __name__ == '__main__':
+    main()
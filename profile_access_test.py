@@ -211,6 +211,20 @@ def test_profile_access_control():
     response = requests.get(f"{API_URL}/teaser-session/{TEST_PERFORMER_ID}?user_id=teaser-test-user")
     session_data = response.json()
     print(f"Response: {json.dumps(session_data, indent=2)}")
+    
+    # Test 8: Bulk access check for a search results grid
+    bulk_request = {
+        "performer_ids": [TEST_PERFORMER_ID, "unrestricted-performer-000"],
+        "user_id": "blocked-user-999",
+        "location": us_location
+    }
+    
+    print("\nTest 8: Bulk access check (blocked user against two performers)")
+    response = requests.post(f"{API_URL}/check-profile-access/bulk", json=bulk_request)
+    bulk_data = response.json()
+    print(f"Response: {json.dumps(bulk_data, indent=2)}")
+    assert bulk_data["results"][TEST_PERFORMER_ID]["access_level"] == "blocked"
+    assert bulk_data["results"]["unrestricted-performer-000"]["access_level"] == "full"
 
 if __name__ == '__main__':
     test_profile_access_control()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import asyncio
+
+from api_key_models import PerformerProfile
+from facet_service import PerformerFacetCounts
+
+
+class _Cursor:
+    def __init__(self, results):
+        self.results = results
+
+    async def to_list(self, length):
+        return self.results
+
+
+class _Profiles:
+    """Returns the $facet buckets Mongo would produce for the stored (string) values"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def aggregate(self, pipeline):
+        return _Cursor([self.buckets])
+
+
+class _DB:
+    def __init__(self, buckets):
+        self.performer_profiles = _Profiles(buckets)
+
+
+def _profile(**overrides) -> PerformerProfile:
+    data = {
+        "user_id": "performer-1", "stage_name": "Jade", "age": 25, "gender": "female",
+        "sexual_preference": "bisexual", "ethnicity": "asian", "country": "United States", "city": "Austin"
+    }
+    data.update(overrides)
+    return PerformerProfile(**data)
+
+
+def test_created_profile_counts_under_stored_values():
+    facets = PerformerFacetCounts(_DB({"genders": [{"_id": "female", "count": 2}]}))
+    asyncio.run(facets.refresh())
+
+    facets.apply_change(None, _profile().dict())
+    options = asyncio.run(facets.get_options())
+
+    assert options["genders"] == ["female"]
+    assert options["facet_counts"]["genders"] == {"female": 3}
+    assert options["ethnicities"] == ["asian"]
+    assert options["sexual_preferences"] == ["bisexual"]
+
+
+def test_update_moves_counts_between_enum_values():
+    facets = PerformerFacetCounts(_DB({}))
+    asyncio.run(facets.refresh())
+    created = _profile().dict()
+    facets.apply_change(None, created)
+
+    facets.apply_change(created, {**created, "gender": _profile(gender="male").gender})
+    options = asyncio.run(facets.get_options())
+
+    assert options["facet_counts"]["genders"] == {"male": 1}
+
+
+def test_hidden_profiles_are_not_counted():
+    facets = PerformerFacetCounts(_DB({}))
+    asyncio.run(facets.refresh())
+
+    facets.apply_change(None, _profile(show_in_search=False).dict())
+
+    assert asyncio.run(facets.get_options())["genders"] == []
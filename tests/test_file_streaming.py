@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from file_streaming import parse_range_header, ranged_file_response
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "clip.bin"
+    path.write_bytes(CONTENT)
+    return str(path)
+
+
+def _body(response) -> bytes:
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-", (0, 1023)),
+    ("bytes=100-199", (100, 199)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-10", "bytes=-", "bytes=0-10,20-30"])
+def test_missing_or_unsupported_ranges_send_the_whole_file(header):
+    assert parse_range_header(header, len(CONTENT)) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=2000-3000", "bytes=20-10"])
+def test_unsatisfiable_ranges_raise(header):
+    with pytest.raises(ValueError):
+        parse_range_header(header, len(CONTENT))
+
+
+def test_open_ended_range_streams_everything_as_partial_content(media_file):
+    response = ranged_file_response(media_file, "bytes=0-")
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 0-1023/{len(CONTENT)}"
+    assert _body(response) == CONTENT
+
+
+def test_suffix_range_streams_the_tail(media_file):
+    response = ranged_file_response(media_file, "bytes=-10")
+    assert response.status_code == 206
+    assert response.headers["Content-Length"] == "10"
+    assert _body(response) == CONTENT[-10:]
+
+
+def test_no_range_streams_the_whole_file(media_file):
+    response = ranged_file_response(media_file, filename="clip.bin")
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert _body(response) == CONTENT
+
+
+def test_unsatisfiable_range_returns_416(media_file):
+    with pytest.raises(HTTPException) as raised:
+        ranged_file_response(media_file, "bytes=5000-")
+    assert raised.value.status_code == 416
+    assert raised.value.headers["Content-Range"] == f"bytes */{len(CONTENT)}"
@@ -0,0 +1,80 @@
+import pytest
+
+from geoip_service import GeoIPResolver, compile_geoip_csv
+
+HEADER = "start_ip,end_ip,country,country_code,state,state_code,city,zip_code,latitude,longitude\n"
+ROWS = [
+    "10.0.0.0,10.0.0.255,United States,US,California,CA,Los Angeles,90210,34.05,-118.24",
+    "10.0.1.0,10.0.1.255,Canada,CA,Ontario,ON,Toronto,,43.65,-79.38",
+    "2001:db8::,2001:db8::ffff,Germany,DE,Berlin,BE,Berlin,10115,52.52,13.40",
+    "2001:db8:0:1::,2001:db8:0:1:ffff:ffff:ffff:ffff,France,FR,,,Paris,,48.85,2.35",
+]
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(HEADER + "\n".join(ROWS) + "\n")
+    resolver = GeoIPResolver(str(csv_path), str(tmp_path / "ranges.bin"))
+    resolver.open()
+    yield resolver
+    resolver.close()
+
+
+def _country(resolver, ip_address):
+    location = resolver.resolve(ip_address)
+    return location.country_code if location else None
+
+
+def test_ipv4_lookup(resolver):
+    location = resolver.resolve("10.0.0.42")
+    assert location.city == "Los Angeles"
+    assert location.zip_code == "90210"
+    assert location.latitude == 34.05
+    assert _country(resolver, "10.0.1.7") == "CA"
+
+
+@pytest.mark.parametrize("ip_address, expected", [
+    ("10.0.0.0", "US"),
+    ("10.0.0.255", "US"),
+    ("10.0.1.0", "CA"),
+    ("10.0.1.255", "CA"),
+    ("9.255.255.255", None),
+    ("10.0.2.0", None),
+])
+def test_ipv4_range_boundaries(resolver, ip_address, expected):
+    assert _country(resolver, ip_address) == expected
+
+
+def test_ipv6_lookup(resolver):
+    assert resolver.resolve("2001:db8::1").city == "Berlin"
+    assert resolver.resolve("2001:db8:0:1::abcd").city == "Paris"
+
+
+@pytest.mark.parametrize("ip_address, expected", [
+    ("2001:db8::", "DE"),
+    ("2001:db8::ffff", "DE"),
+    ("2001:db8::1:0", None),
+    ("2001:db8:0:1::", "FR"),
+    ("2001:db8:0:1:ffff:ffff:ffff:ffff", "FR"),
+    ("2001:db8:0:2::", None),
+    ("2001:db7:ffff:ffff:ffff:ffff:ffff:ffff", None),
+])
+def test_ipv6_range_boundaries(resolver, ip_address, expected):
+    assert _country(resolver, ip_address) == expected
+
+
+def test_ipv4_mapped_ipv6_uses_the_ipv4_table(resolver):
+    assert _country(resolver, "::ffff:10.0.1.9") == "CA"
+
+
+def test_invalid_addresses_resolve_to_none(resolver):
+    assert resolver.resolve("not-an-ip") is None
+    assert resolver.resolve("") is None
+
+
+def test_overlapping_ranges_are_rejected(tmp_path):
+    csv_path = tmp_path / "overlap.csv"
+    csv_path.write_text(HEADER + ROWS[0] + "\n10.0.0.128,10.0.1.0,Mexico,MX,,,,,,\n")
+    with pytest.raises(ValueError):
+        compile_geoip_csv(str(csv_path), str(tmp_path / "overlap.bin"))
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+from pymongo import ASCENDING, DESCENDING
+
+from keyset_pagination import encode_cursor, decode_cursor, keyset_filter
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def _collection(docs):
+    collection = mongomock.MongoClient().db.items
+    collection.insert_many([dict(doc) for doc in docs])
+    return collection
+
+
+def _page_through(collection, sort_field, direction, page_size):
+    """Follow next-page cursors the way discovery does and return every id seen"""
+    sort = [(sort_field, direction), ("id", direction)]
+    seen, query = [], {}
+    while True:
+        page = list(collection.find(query).sort(sort).limit(page_size))
+        seen.extend(doc["id"] for doc in page)
+        if len(page) < page_size:
+            return seen
+        last = page[-1]
+        value, last_id = decode_cursor(encode_cursor(sort_field, last.get(sort_field), last["id"]), sort_field)
+        query = keyset_filter(sort_field, direction, value, last_id)
+
+
+@pytest.mark.parametrize("direction", [ASCENDING, DESCENDING])
+def test_missing_and_null_sort_values_are_not_skipped(direction):
+    docs = [{"id": f"e{i:02d}"} for i in range(4)]
+    docs += [{"id": f"n{i:02d}", "rate": None} for i in range(3)]
+    docs += [{"id": f"v{i:02d}", "rate": i % 3} for i in range(8)]
+    collection = _collection(docs)
+
+    expected = [doc["id"] for doc in collection.find().sort([("rate", direction), ("id", direction)])]
+    assert _page_through(collection, "rate", direction, 3) == expected
+
+
+@pytest.mark.parametrize("value", [4.5, "spanish", None, datetime(2024, 5, 1, 12, 30)])
+def test_cursor_round_trip(value):
+    assert decode_cursor(encode_cursor("rate", value, "e07"), "rate") == (value, "e07")
+
+
+def test_cursor_for_another_sort_order_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor("rate", 4.5, "e07"), "rating")
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "", "W10="])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "rate")
+
+
+@pytest.mark.parametrize("direction", [ASCENDING, DESCENDING])
+def test_ties_are_broken_on_the_id_field(direction):
+    collection = _collection([{"_id": f"k{i:02d}", "rate": i % 2} for i in range(10)])
+    sort = [("rate", direction), ("_id", direction)]
+    expected = [doc["_id"] for doc in collection.find().sort(sort)]
+
+    seen, query = [], {}
+    while True:
+        page = list(collection.find(query).sort(sort).limit(3))
+        seen.extend(doc["_id"] for doc in page)
+        if len(page) < 3:
+            break
+        value, last_id = decode_cursor(encode_cursor("rate", page[-1]["rate"], page[-1]["_id"]), "rate")
+        query = keyset_filter("rate", direction, value, last_id, id_field="_id")
+    assert seen == expected
+
+
+def test_sorting_on_the_id_field_bounds_only_the_id():
+    assert keyset_filter("id", ASCENDING, "e07", "e07") == {"id": {"$gt": "e07"}}
+    assert keyset_filter("id", DESCENDING, "e07", "e07") == {"id": {"$lt": "e07"}}
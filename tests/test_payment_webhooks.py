@@ -0,0 +1,44 @@
+import hashlib
+import hmac
+
+from payment_routes import verify_stripe_signature, verify_ccbill_secret
+
+SECRET = "whsec_test"
+BODY = b'{"id": "evt_1", "type": "checkout.session.completed"}'
+
+
+def _signature(timestamp: int, body: bytes = BODY, secret: str = SECRET) -> str:
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def test_valid_stripe_signature():
+    assert verify_stripe_signature(BODY, _signature(1000), SECRET, now=1010)
+
+
+def test_any_v1_signature_may_match_during_secret_rotation():
+    header = _signature(1000, secret="whsec_old") + "," + _signature(1000).split(",")[1]
+    assert verify_stripe_signature(BODY, header, SECRET, now=1000)
+
+
+def test_rejects_tampered_body_and_wrong_secret():
+    assert not verify_stripe_signature(BODY + b" ", _signature(1000), SECRET, now=1000)
+    assert not verify_stripe_signature(BODY, _signature(1000, secret="other"), SECRET, now=1000)
+
+
+def test_rejects_stale_or_malformed_headers():
+    assert not verify_stripe_signature(BODY, _signature(1000), SECRET, now=1000 + 301)
+    assert not verify_stripe_signature(BODY, None, SECRET)
+    assert not verify_stripe_signature(BODY, "v1=abc", SECRET)
+    assert not verify_stripe_signature(BODY, "t=abc,v1=abc", SECRET)
+
+
+def test_unconfigured_secret_rejects_everything():
+    assert not verify_stripe_signature(BODY, _signature(1000), None, now=1000)
+    assert not verify_ccbill_secret("anything", None)
+
+
+def test_ccbill_secret():
+    assert verify_ccbill_secret("s3cret", "s3cret")
+    assert not verify_ccbill_secret("s3cre", "s3cret")
+    assert not verify_ccbill_secret(None, "s3cret")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Replay payment webhooks against a running backend to load-test ingestion.
+
+Sends synthetic CCBill/Stripe events (with a share of provider-style duplicate
+deliveries), or events exported from a webhook_events collection, and reports
+throughput, latency and how many deliveries were acknowledged as duplicates.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+CCBILL_EVENT_TYPES = ["NewSaleSuccess", "Renewal", "Renewal", "Cancellation", "Chargeback"]
+STRIPE_EVENT_TYPES = ["checkout.session.completed", "invoice.payment_succeeded", "invoice.payment_succeeded"]
+
+
+def make_ccbill_event(subscription_id: str) -> dict:
+    return {
+        "provider": "ccbill",
+        "form": {
+            "eventType": random.choice(CCBILL_EVENT_TYPES),
+            "subscriptionId": subscription_id,
+            "transactionId": uuid.uuid4().hex,
+            "billedAmount": f"{random.choice([25, 100, 500]):.2f}"
+        }
+    }
+
+
+def make_stripe_event(subscription_id: str) -> dict:
+    return {
+        "provider": "stripe",
+        "json": {
+            "id": f"evt_{uuid.uuid4().hex}",
+            "type": random.choice(STRIPE_EVENT_TYPES),
+            "data": {"object": {"id": f"in_{uuid.uuid4().hex[:16]}", "subscription": subscription_id}}
+        }
+    }
+
+
+def synthetic_events(count: int, subscriptions: int, provider: str, duplicate_rate: float) -> list:
+    subscription_ids = [f"sub_{i:06d}" for i in range(subscriptions)]
+    events = []
+    for _ in range(count):
+        if events and random.random() < duplicate_rate:
+            # Providers redeliver the same event when an acknowledgement is slow or lost
+            events.append(random.choice(events))
+            continue
+        chosen = provider if provider != "mixed" else random.choice(["ccbill", "stripe"])
+        make_event = make_ccbill_event if chosen == "ccbill" else make_stripe_event
+        events.append(make_event(random.choice(subscription_ids)))
+    return events
+
+
+def load_events(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def export_events(path: str, limit: int):
+    """Dump stored webhook events as replayable JSON lines"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    written = 0
+    with open(path, "w") as f:
+        cursor = db.webhook_events.find({}, {"_id": 0}).sort("received_at", 1).limit(limit)
+        async for event in cursor:
+            body_key = "form" if event["provider"] == "ccbill" else "json"
+            f.write(json.dumps({"provider": event["provider"], body_key: event["payload"]}, default=str) + "\n")
+            written += 1
+    client.close()
+    print(f"Exported {written} events to {path}")
+
+
+async def replay(base_url: str, events: list, concurrency: int):
+    latencies = []
+    results = {"accepted": 0, "duplicate": 0, "error": 0}
+    queue: asyncio.Queue = asyncio.Queue()
+    for event in events:
+        queue.put_nowait(event)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def sender():
+            while not queue.empty():
+                event = queue.get_nowait()
+                url = f"/api/payments/webhooks/{event['provider']}"
+                started = time.perf_counter()
+                try:
+                    if "form" in event:
+                        response = await client.post(url, data=event["form"])
+                    else:
+                        response = await client.post(url, content=json.dumps(event["json"]),
+                                                     headers={"Content-Type": "application/json"})
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        results["error"] += 1
+                    elif response.json().get("duplicate"):
+                        results["duplicate"] += 1
+                    else:
+                        results["accepted"] += 1
+                except httpx.HTTPError:
+                    results["error"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Sent {len(events)} events in {elapsed:.2f}s ({len(events) / elapsed:.0f} events/s)")
+    print(f"  accepted={results['accepted']} duplicate={results['duplicate']} error={results['error']}")
+    if latencies:
+        p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+        print(f"  ack latency p50={statistics.median(latencies):.1f}ms p99={p99:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=os.environ.get("BACKEND_URL", "http://localhost:8001"))
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--subscriptions", type=int, default=500)
+    parser.add_argument("--provider", choices=["ccbill", "stripe", "mixed"], default="mixed")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--from-file", help="replay JSON lines previously written by --export")
+    parser.add_argument("--export", help="write stored webhook_events to this file and exit (needs MONGO_URL, DB_NAME)")
+    parser.add_argument("--export-limit", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.export:
+        asyncio.run(export_events(args.export, args.export_limit))
+        return 0
+
+    if args.from_file:
+        events = load_events(args.from_file)
+    else:
+        events = synthetic_events(args.events, args.subscriptions, args.provider, args.duplicate_rate)
+    asyncio.run(replay(args.url, events, args.concurrency))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())